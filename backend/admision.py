@@ -0,0 +1,141 @@
+"""Control de admisión: límites por cliente y ruta y tope de peticiones simultáneas
+
+Cada cliente (IP) tiene un cubo de tokens por grupo de rutas (GRUPOS): cada
+petición gasta un token y los tokens se reponen a `ritmo` por segundo hasta
+`rafaga`. Sin tokens, la petición se rechaza al momento con 429 y Retry-After.
+
+Además, cada worker atiende como mucho MAX_CONCURRENTES peticiones a la vez y
+rechaza el resto con 503 y Retry-After, en lugar de encolarlas en el event loop
+y el pool de MongoDB. Las últimas RESERVADAS_PRIORITARIAS plazas quedan para
+crear reservas, para que el tráfico abusivo de lecturas no las retrase. Los
+flujos SSE (/eventos) solo gastan su token al conectarse y no ocupan plaza:
+durarían lo que la conexión.
+
+Los límites se reparten entre los workers: con WORKERS procesos, cada uno
+aplica 1/WORKERS del ritmo de cada cliente.
+"""
+from collections import OrderedDict
+import math
+import time
+
+from idempotencia import responder_error
+
+# (grupo, método o None para todos, prefijo de la ruta, ritmo por segundo, ráfaga); gana el primero
+GRUPOS = [
+    ("reservas", "POST", "/api/reservas", 0.5, 5),
+    ("horarios", None, "/api/horarios-disponibles", 5, 30),
+    ("disponibilidad", None, "/api/disponibilidad", 2, 10),
+    ("api", None, "/api/", 20, 60),
+]
+PRIORITARIOS = ("reservas",)
+MAX_CONCURRENTES = 200
+RESERVADAS_PRIORITARIAS = 20
+MAX_CUBOS = 10000
+SUFIJO_FLUJOS = "/eventos"
+
+
+class CuboTokens:
+    def __init__(self, ritmo: float, rafaga: float):
+        self.ritmo = ritmo
+        self.rafaga = rafaga
+        self.tokens = rafaga
+        self.ultimo = time.monotonic()
+
+    def tomar(self) -> float:
+        """Gasta un token; devuelve 0 si lo había o los segundos hasta el próximo"""
+        ahora = time.monotonic()
+        self.tokens = min(self.rafaga, self.tokens + (ahora - self.ultimo) * self.ritmo)
+        self.ultimo = ahora
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.ritmo
+
+
+def grupo_ruta(metodo: str, ruta: str):
+    for grupo, metodo_grupo, prefijo, ritmo, rafaga in GRUPOS:
+        if (metodo_grupo is None or metodo_grupo == metodo) and ruta.startswith(prefijo):
+            return grupo, ritmo, rafaga
+    return None
+
+
+def cliente(scope) -> str:
+    # Detrás de un proxy, uvicorn --proxy-headers ya pone aquí la IP real
+    return scope["client"][0] if scope.get("client") else "desconocido"
+
+
+class ControlAdmision:
+    """Cubos de tokens, plazas ocupadas y métricas de rechazos de un worker"""
+
+    def __init__(self, workers: int = 1):
+        self.workers = max(1, workers)
+        self.cubos = OrderedDict()  # (cliente, grupo) -> CuboTokens, LRU
+        self.en_curso = 0
+        self.admitidas = 0
+        self.rechazadas = {"limite": {}, "saturacion": {}}
+
+    def cubo(self, clave: tuple, ritmo: float, rafaga: float) -> CuboTokens:
+        cubo = self.cubos.get(clave)
+        if cubo is None:
+            # Un cliente olvidado vuelve con el cubo lleno: solo le regala una ráfaga
+            cubo = self.cubos[clave] = CuboTokens(ritmo / self.workers, max(1, rafaga / self.workers))
+            while len(self.cubos) > MAX_CUBOS:
+                self.cubos.popitem(last=False)
+        else:
+            self.cubos.move_to_end(clave)
+        return cubo
+
+    def rechazar(self, motivo: str, grupo: str):
+        self.rechazadas[motivo][grupo] = self.rechazadas[motivo].get(grupo, 0) + 1
+
+    def estadisticas(self) -> dict:
+        return {
+            "en_curso": self.en_curso,
+            "max_concurrentes": MAX_CONCURRENTES,
+            "admitidas": self.admitidas,
+            "rechazadas": {motivo: dict(grupos) for motivo, grupos in self.rechazadas.items()},
+            "clientes": len(self.cubos)
+        }
+
+
+class MiddlewareAdmision:
+    """Middleware ASGI que aplica los límites de `control` a cada petición"""
+
+    def __init__(self, app, control: ControlAdmision):
+        self.app = app
+        self.control = control
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encontrado = grupo_ruta(scope["method"], scope["path"])
+        if encontrado is None:
+            return await self.app(scope, receive, send)
+        grupo, ritmo, rafaga = encontrado
+        control = self.control
+
+        espera = control.cubo((cliente(scope), grupo), ritmo, rafaga).tomar()
+        if espera:
+            control.rechazar("limite", grupo)
+            return await responder_error(
+                send, 429, "Demasiadas peticiones, inténtalo más tarde",
+                [(b"retry-after", str(math.ceil(espera)).encode())]
+            )
+
+        if scope["path"].endswith(SUFIJO_FLUJOS):
+            control.admitidas += 1
+            return await self.app(scope, receive, send)
+
+        tope = MAX_CONCURRENTES if grupo in PRIORITARIOS else MAX_CONCURRENTES - RESERVADAS_PRIORITARIAS
+        if control.en_curso >= tope:
+            control.rechazar("saturacion", grupo)
+            return await responder_error(
+                send, 503, "Servidor saturado, inténtalo más tarde", [(b"retry-after", b"1")]
+            )
+
+        control.admitidas += 1
+        control.en_curso += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            control.en_curso -= 1
@@ -0,0 +1,128 @@
+"""Analítica de ingresos y ocupación calculada con pipelines de agregación
+
+Las reservas se agrupan en MongoDB por (dimensión, servicio), se cruzan con el
+catálogo de servicios mediante $lookup y se vuelven a agrupar por dimensión,
+de modo que a Python solo llega una fila por punto de la serie. La capacidad
+(minutos de apertura) se calcula a partir de las rejillas de la agenda.
+"""
+from datetime import date, datetime, timedelta
+from pymongo import ReplaceOne
+
+from configuracion import PELUQUEROS, SERVICIOS
+from database import db, FILTRO_RESERVA_ACTIVA
+from disponibilidad import DIAS_SEMANA, SLOT_MINUTOS
+
+servicios_collection = db.servicios
+
+# Expresión de agrupación de cada dimensión
+DIMENSIONES = {
+    "peluquero": "$peluquero",
+    "servicio": "$servicio",
+    "dia_semana": {"$isoDayOfWeek": "$momento"},
+    "hora": "$hora",
+    "dia": "$fecha",
+    "mes": {"$substrCP": ["$fecha", 0, 7]},
+}
+
+
+async def sincronizar_catalogo():
+    """Copia SERVICIOS a la colección `servicios` para poder usarla en $lookup"""
+    await servicios_collection.bulk_write(
+        [ReplaceOne({"nombre": s["nombre"]}, dict(s), upsert=True) for s in SERVICIOS],
+        ordered=False
+    )
+    await servicios_collection.delete_many({"nombre": {"$nin": [s["nombre"] for s in SERVICIOS]}})
+
+
+def pipeline_analitica(dimension: str, desde: date, hasta: date) -> list:
+    inicio = datetime.combine(desde, datetime.min.time())
+    fin = datetime.combine(hasta + timedelta(days=1), datetime.min.time())
+    etapas = [{"$match": {"momento": {"$gte": inicio, "$lt": fin}, **FILTRO_RESERVA_ACTIVA}}]
+    if dimension == "hora":
+        # Cada reserva ocupa SLOT_MINUTOS en cada una de sus franjas, no toda su
+        # duración en la hora de inicio; la reserva y sus ingresos cuentan en la primera
+        etapas += [
+            {"$unwind": {"path": "$franjas", "includeArrayIndex": "posicion"}},
+            {"$group": {
+                "_id": {"clave": "$franjas", "servicio": "$servicio"},
+                "reservas": {"$sum": {"$cond": [{"$eq": ["$posicion", 0]}, 1, 0]}},
+                "franjas": {"$sum": 1}
+            }},
+        ]
+        minutos = {"$multiply": ["$franjas", SLOT_MINUTOS]}
+    else:
+        etapas.append({"$group": {
+            "_id": {"clave": DIMENSIONES[dimension], "servicio": "$servicio"},
+            "reservas": {"$sum": 1}
+        }})
+        minutos = {"$multiply": ["$reservas", {"$ifNull": ["$catalogo.duracion", 0]}]}
+    return etapas + [
+        {"$lookup": {
+            "from": "servicios",
+            "localField": "_id.servicio",
+            "foreignField": "nombre",
+            "as": "catalogo"
+        }},
+        {"$unwind": {"path": "$catalogo", "preserveNullAndEmptyArrays": True}},
+        {"$group": {
+            "_id": "$_id.clave",
+            "reservas": {"$sum": "$reservas"},
+            "ingresos": {"$sum": {"$multiply": ["$reservas", {"$ifNull": ["$catalogo.precio", 0]}]}},
+            "minutos": {"$sum": minutos}
+        }},
+        {"$sort": {"_id": 1}}
+    ]
+
+
+def nombre_clave(dimension: str, clave):
+    if dimension == "dia_semana":
+        return DIAS_SEMANA[clave - 1]
+    return clave
+
+
+def capacidad(agenda, dimension: str, desde: date, hasta: date) -> dict:
+    """Minutos de apertura de cada punto de la serie (None para `servicio`)"""
+    if dimension == "servicio":
+        return {s["nombre"]: None for s in SERVICIOS}
+
+    minutos = {}
+    dia = desde
+    while dia <= hasta:
+        rejilla = agenda.rejillas.get(dia.weekday())
+        if dimension == "peluquero":
+            for p in PELUQUEROS:
+                minutos[p] = minutos.get(p, 0) + (len(rejilla.horas) * SLOT_MINUTOS if rejilla else 0)
+        elif dimension == "hora":
+            for hora in (rejilla.horas if rejilla else ()):
+                minutos[hora] = minutos.get(hora, 0) + SLOT_MINUTOS * len(PELUQUEROS)
+        else:
+            if dimension == "dia_semana":
+                clave = DIAS_SEMANA[dia.weekday()]
+            elif dimension == "dia":
+                clave = dia.isoformat()
+            else:
+                clave = dia.isoformat()[:7]
+            total = len(rejilla.horas) * SLOT_MINUTOS * len(PELUQUEROS) if rejilla else 0
+            minutos[clave] = minutos.get(clave, 0) + total
+        dia += timedelta(days=1)
+    if dimension == "dia_semana":
+        return {d: minutos[d] for d in DIAS_SEMANA if d in minutos}
+    return minutos
+
+
+def construir_serie(dimension: str, grupos: list, capacidades: dict) -> list:
+    """Une los grupos agregados con la capacidad, incluyendo los puntos sin reservas"""
+    por_clave = {nombre_clave(dimension, g["_id"]): g for g in grupos}
+    serie = []
+    for clave in list(capacidades) + sorted((k for k in por_clave if k not in capacidades), key=str):
+        grupo = por_clave.get(clave, {})
+        minutos = grupo.get("minutos", 0)
+        disponibles = capacidades.get(clave)
+        serie.append({
+            "clave": clave,
+            "reservas": grupo.get("reservas", 0),
+            "ingresos": grupo.get("ingresos", 0),
+            "minutos_reservados": minutos,
+            "ocupacion": round(minutos / disponibles, 4) if disponibles else None
+        })
+    return serie
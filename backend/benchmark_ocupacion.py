@@ -0,0 +1,94 @@
+"""Mide el informe de ocupación (/api/reportes/ocupacion) sobre reservas sintéticas
+
+Inserta las reservas en una base de datos aparte (MONGO_URL, base
+peluqueria_benchmark), mide la carga agregada en MongoDB y el cálculo
+vectorizado, y la borra al terminar. El objetivo es que el informe completo
+tarde menos de un segundo con cientos de miles de reservas.
+
+    python benchmark_ocupacion.py [reservas] [repeticiones]
+"""
+from datetime import date, datetime, timedelta
+import asyncio
+import sys
+import time
+import uuid
+
+from configuracion import PELUQUEROS, SERVICIOS, HORARIOS
+from database import client
+from disponibilidad import Agenda
+from reportes import cargar_reservas, informe_ocupacion
+
+OBJETIVO_SEGUNDOS = 1.0
+TAMANO_LOTE = 10000
+
+
+def reservas_sinteticas(agenda: Agenda, total: int):
+    """Genera `total` reservas en franjas distintas, de hoy hacia atrás; devuelve también el primer día"""
+    dia = date.today()
+    generadas = 0
+    while True:
+        dia -= timedelta(days=1)
+        rejilla = agenda.rejillas.get(dia.weekday())
+        if rejilla is None:
+            continue
+        for hora in rejilla.horas:
+            for peluquero in PELUQUEROS:
+                if generadas == total:
+                    return
+                servicio = SERVICIOS[generadas % len(SERVICIOS)]["nombre"]
+                yield {
+                    "id": str(uuid.uuid4()),
+                    "peluquero": peluquero,
+                    "servicio": servicio,
+                    "fecha": dia.isoformat(),
+                    "hora": hora,
+                    "estado": "cancelada" if generadas % 10 == 0 else "confirmada",
+                    "momento": datetime.strptime(f"{dia.isoformat()} {hora}", "%Y-%m-%d %H:%M")
+                }
+                generadas += 1
+
+
+async def main(total: int, repeticiones: int) -> int:
+    agenda = Agenda(HORARIOS, SERVICIOS)
+    base = client.peluqueria_benchmark
+    coleccion = base.reservas
+    await coleccion.drop()
+    try:
+        lote = []
+        desde = datetime.now()
+        for reserva in reservas_sinteticas(agenda, total):
+            desde = min(desde, reserva["momento"])
+            lote.append(reserva)
+            if len(lote) == TAMANO_LOTE:
+                await coleccion.insert_many(lote, ordered=False)
+                lote = []
+        if lote:
+            await coleccion.insert_many(lote, ordered=False)
+        await coleccion.create_index("momento")
+        hasta = datetime.combine(date.today(), datetime.min.time())
+
+        mejor_carga = mejor_calculo = float("inf")
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            historico, recientes = await cargar_reservas(desde, hasta, coleccion=coleccion)
+            cargado = time.perf_counter()
+            informe = informe_ocupacion(historico, recientes, agenda, desde, hasta)
+            fin = time.perf_counter()
+            mejor_carga = min(mejor_carga, cargado - inicio)
+            mejor_calculo = min(mejor_calculo, fin - cargado)
+    finally:
+        await client.drop_database(base.name)
+
+    total_segundos = mejor_carga + mejor_calculo
+    print(f"reservas analizadas      {informe['reservas_analizadas']:>9}")
+    print(f"grupos cargados          {len(historico) + len(recientes):>9}")
+    print(f"carga (agregación)       {mejor_carga * 1000:9.1f} ms")
+    print(f"cálculo (NumPy)          {mejor_calculo * 1000:9.1f} ms")
+    print(f"total                    {total_segundos * 1000:9.1f} ms  (objetivo < {OBJETIVO_SEGUNDOS * 1000:.0f} ms)")
+    return 0 if total_segundos < OBJETIVO_SEGUNDOS else 1
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    sys.exit(asyncio.run(main(total, repeticiones)))
@@ -0,0 +1,83 @@
+"""Compara la serialización de un listado grande de reservas
+
+Ruta anterior: jsonable_encoder + json de la biblioteca estándar (la de
+JSONResponse por defecto en FastAPI). Ruta actual: ORJSONResponse construida
+en el handler, y el streaming documento a documento de paginacion.py.
+
+    python benchmark_respuestas.py [reservas] [repeticiones]
+"""
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from datetime import date, timedelta
+import asyncio
+import sys
+import time
+import uuid
+
+from configuracion import PELUQUEROS, SERVICIOS
+from paginacion import json_en_streaming
+
+
+def reservas_sinteticas(total: int) -> list:
+    inicio = date.today()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "cliente_nombre": f"Cliente {i}",
+            "cliente_telefono": f"6{i:08d}",
+            "cliente_email": f"cliente{i}@ejemplo.com",
+            "servicio": SERVICIOS[i % len(SERVICIOS)]["nombre"],
+            "peluquero": PELUQUEROS[i % len(PELUQUEROS)],
+            "fecha": (inicio + timedelta(days=i % 365)).isoformat(),
+            "hora": f"{10 + i % 9:02d}:{30 * (i % 2):02d}",
+            "estado": "confirmada",
+            "fecha_creacion": "2025-01-01T10:00:00",
+            "version": i,
+            "actualizado": "2025-01-01T10:00:00"
+        }
+        for i in range(total)
+    ]
+
+
+def ruta_anterior(contenido: dict) -> bytes:
+    return JSONResponse(jsonable_encoder(contenido)).body
+
+
+def ruta_orjson(contenido: dict) -> bytes:
+    return ORJSONResponse(contenido).body
+
+
+def ruta_streaming(contenido: dict) -> bytes:
+    async def documentos():
+        for documento in contenido["reservas"]:
+            yield documento
+
+    async def consumir():
+        return b"".join([trozo async for trozo in json_en_streaming("reservas", documentos())])
+
+    return asyncio.run(consumir())
+
+
+def medir(funcion, contenido: dict, repeticiones: int):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        cuerpo = funcion(contenido)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, len(cuerpo)
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    contenido = {"reservas": reservas_sinteticas(total)}
+
+    base = None
+    for nombre, funcion in [
+        ("jsonable_encoder + json", ruta_anterior),
+        ("ORJSONResponse", ruta_orjson),
+        ("streaming orjson", ruta_streaming)
+    ]:
+        segundos, tamano = medir(funcion, contenido, repeticiones)
+        base = base or segundos
+        print(f"{nombre:<25} {segundos * 1000:9.1f} ms  {tamano / 1e6:6.2f} MB  x{base / segundos:.1f}")
@@ -0,0 +1,107 @@
+"""Caché de lecturas en memoria con LRU, TTL e invalidación desde las escrituras
+
+Las entradas se pueden invalidar por clave (p. ej. la ocupación de un
+(fecha, peluquero) concreto) o por las colecciones de las que dependen.
+
+Las peticiones concurrentes que fallan sobre la misma clave comparten un único
+cálculo. Invalidar una clave también descarta su cálculo en curso: como pudo
+leer datos anteriores a la escritura, su resultado no llega a guardarse.
+"""
+from collections import OrderedDict
+import asyncio
+import time
+
+CAPACIDAD = 2048
+TTL_SEGUNDOS = 30
+
+
+class CacheTTL:
+    def __init__(self, capacidad: int = CAPACIDAD, ttl: float = TTL_SEGUNDOS):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self.entradas = OrderedDict()   # clave -> (caduca, valor)
+        self.dependencias = {}          # colección -> claves que dependen de ella
+        self.en_curso = {}              # clave -> Future del cálculo en marcha
+        self.aciertos = 0
+        self.fallos = 0
+
+    async def obtener(self, clave, calcular, dependencias=(), ttl=None):
+        """Valor de `clave`, calculándolo con `calcular()` (corrutina) si no está o ha caducado"""
+        entrada = self.entradas.get(clave)
+        if entrada is not None and entrada[0] > time.monotonic():
+            self.entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[1]
+
+        self.fallos += 1
+        if clave in self.en_curso:
+            return await asyncio.shield(self.en_curso[clave])
+
+        # Las dependencias se registran antes de calcular para que una escritura
+        # durante el cálculo también lo deje huérfano
+        for coleccion in dependencias:
+            self.dependencias.setdefault(coleccion, set()).add(clave)
+        futuro = asyncio.get_running_loop().create_future()
+        self.en_curso[clave] = futuro
+        try:
+            valor = await calcular()
+        except Exception as e:
+            futuro.set_exception(e)
+            # Evita el aviso de "excepción nunca recuperada" si nadie más esperaba
+            futuro.exception()
+            raise
+        except BaseException:
+            futuro.cancel()
+            raise
+        finally:
+            vigente = self.en_curso.get(clave) is futuro
+            if vigente:
+                del self.en_curso[clave]
+
+        futuro.set_result(valor)
+        if vigente:
+            self.guardar(clave, valor, ttl)
+        return valor
+
+    def leer(self, clave, defecto=None):
+        """Valor guardado de `clave` si no ha caducado, sin calcularlo"""
+        entrada = self.entradas.get(clave)
+        if entrada is None or entrada[0] <= time.monotonic():
+            self.fallos += 1
+            return defecto
+        self.entradas.move_to_end(clave)
+        self.aciertos += 1
+        return entrada[1]
+
+    def guardar(self, clave, valor, ttl=None):
+        self.entradas[clave] = (time.monotonic() + (ttl or self.ttl), valor)
+        self.entradas.move_to_end(clave)
+        while len(self.entradas) > self.capacidad:
+            self.entradas.popitem(last=False)
+
+    def invalidar(self, clave):
+        self.entradas.pop(clave, None)
+        # El cálculo en curso queda huérfano: ni se guarda ni se une nadie más a él
+        self.en_curso.pop(clave, None)
+
+    def invalidar_dependientes(self, coleccion: str):
+        for clave in self.dependencias.pop(coleccion, ()):
+            self.invalidar(clave)
+
+    def vaciar(self):
+        self.entradas.clear()
+        self.dependencias.clear()
+        self.en_curso.clear()
+
+    def estadisticas(self) -> dict:
+        consultas = self.aciertos + self.fallos
+        return {
+            "entradas": len(self.entradas),
+            "capacidad": self.capacidad,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else None
+        }
+
+
+cache = CacheTTL()
@@ -0,0 +1,23 @@
+"""Datos de configuración de la peluquería: peluqueros, servicios y horarios"""
+
+PELUQUEROS = ["Andrés", "Alejandro", "Adrián"]
+SERVICIOS = [
+    {"nombre": "Corte de cabello", "duracion": 30, "precio": 15},
+    {"nombre": "Arreglo de barba", "duracion": 20, "precio": 10},
+    {"nombre": "Tinte", "duracion": 90, "precio": 45},
+    {"nombre": "Corte mujer", "duracion": 45, "precio": 25},
+    {"nombre": "Peinado", "duracion": 30, "precio": 20},
+    {"nombre": "Mechas", "duracion": 120, "precio": 60}
+]
+
+HORARIOS = {
+    "lunes": {"inicio": "10:00", "fin": "19:00"},
+    "martes": {"inicio": "10:00", "fin": "19:00"},
+    "miercoles": {"inicio": "10:00", "fin": "19:00"},
+    "jueves": {"inicio": "10:00", "fin": "19:00"},
+    "viernes": {"inicio": "10:00", "fin": "19:00"},
+    "sabado": {"inicio": "10:00", "fin": "14:00"}
+}
+
+# Precio de cada servicio, para calcular ingresos
+PRECIOS = {s["nombre"]: s["precio"] for s in SERVICIOS}
@@ -0,0 +1,298 @@
+"""Capa de acceso a datos asíncrona (Motor) para la API de la peluquería"""
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+import os
+
+from invalidaciones import notificar_escritura
+from paginacion import filtro_keyset
+
+# Configuración de MongoDB
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017/')
+client = AsyncIOMotorClient(MONGO_URL)
+db = client.peluqueria
+
+contadores_collection = db.contadores
+# Lápidas de documentos borrados, para que /api/sync pueda comunicar las eliminaciones
+eliminados_collection = db.eliminados
+# Canal capado de invalidaciones entre workers (ver invalidaciones.py)
+invalidaciones_collection = db.invalidaciones
+# Respuestas guardadas por Idempotency-Key (ver idempotencia.py)
+idempotencia_collection = db.idempotencia
+# Importaciones CSV en curso, una como mucho por colección (ver importacion.py)
+importaciones_collection = db.importaciones
+
+# Solo las reservas confirmadas ocupan horario; las canceladas liberan sus franjas
+FILTRO_RESERVA_ACTIVA = {"estado": "confirmada"}
+# margen_stock = stock_actual - stock_minimo, mantenido en cada escritura del
+# inventario para que el bajo stock se consulte con un índice (ver stock.py)
+FILTRO_BAJO_STOCK = {"margen_stock": {"$lte": 0}}
+# Claves naturales por las que las importaciones CSV emparejan los documentos
+# (sin índice único: se puede dar de alta a mano un segundo producto con el mismo nombre)
+CLAVES_NATURALES = {
+    "proveedores": ("nombre",),
+    "inventario": ("nombre",),
+    "empleados": ("nombre", "telefono"),
+}
+# Segundos tras los que una versión reservada y no liberada se da por abandonada
+ABANDONO_VERSIONES = 60
+
+
+async def reservar_versiones(cantidad: int) -> int:
+    """Reserva `cantidad` versiones consecutivas del contador global y devuelve la primera
+
+    Las versiones quedan "en curso" en el propio contador, en la misma
+    actualización atómica que las reserva, hasta liberar_versiones. Una
+    escritura con una versión menor puede terminar después que otra con una
+    mayor; versiones_confirmadas no pasa de la primera en curso para que
+    /api/sync no dé un token que se salte esa escritura.
+    """
+    contador = await contadores_collection.find_one_and_update(
+        {"_id": "cambios"},
+        [
+            {"$set": {"valor": {"$add": [{"$ifNull": ["$valor", 0]}, cantidad]}}},
+            {"$set": {"en_curso": {"$concatArrays": [
+                # De paso se descartan las reservas abandonadas
+                {"$filter": {
+                    "input": {"$ifNull": ["$en_curso", []]},
+                    "cond": {"$gt": ["$$this.inicio", {"$subtract": ["$$NOW", ABANDONO_VERSIONES * 1000]}]}
+                }},
+                [{"desde": {"$subtract": ["$valor", cantidad - 1]}, "inicio": "$$NOW"}]
+            ]}}}
+        ],
+        projection={"valor": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return contador["valor"] - cantidad + 1
+
+
+async def liberar_versiones(primera: int):
+    await contadores_collection.update_one({"_id": "cambios"}, {"$pull": {"en_curso": {"desde": primera}}})
+
+
+@asynccontextmanager
+async def versiones(cantidad: int):
+    """Reserva `cantidad` versiones para las escrituras del bloque y las libera al terminar"""
+    primera = await reservar_versiones(cantidad)
+    try:
+        yield primera
+    finally:
+        await liberar_versiones(primera)
+
+
+@asynccontextmanager
+async def marca_cambio():
+    async with versiones(1) as version:
+        yield {"version": version, "actualizado": datetime.now().isoformat()}
+
+
+async def versiones_confirmadas() -> int:
+    """Versión más alta por debajo de la cual todas las escrituras han terminado
+
+    Una reserva en curso desde hace más de ABANDONO_VERSIONES se da por
+    abandonada (el proceso cayó a mitad de la escritura).
+    """
+    contador = await contadores_collection.find_one({"_id": "cambios"})
+    if contador is None:
+        return 0
+    # Motor devuelve las fechas BSON en UTC sin zona horaria
+    limite = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=ABANDONO_VERSIONES)
+    en_curso = [e["desde"] for e in contador.get("en_curso", []) if e["inicio"] > limite]
+    return min(en_curso, default=contador["valor"] + 1) - 1
+
+
+class Repositorio:
+    """Operaciones asíncronas sobre una colección
+
+    Las lecturas nunca devuelven _id ni los campos internos de `ocultos`
+    (salvo que se pidan explícitamente en la proyección). Cada escritura hecha
+    a través del repositorio recibe una `version` nueva y los borrados dejan
+    una lápida en `eliminados`.
+    """
+
+    def __init__(self, coleccion, ocultos=()):
+        self.coleccion = coleccion
+        self.ocultos = ocultos
+
+    def campos(self, proyeccion=None):
+        if proyeccion:
+            return {"_id": 0, **proyeccion}
+        return {"_id": 0, **{campo: 0 for campo in self.ocultos}}
+
+    def publico(self, documento: dict) -> dict:
+        """El documento tal como lo devuelven las lecturas (sin los campos de `ocultos`)"""
+        if not self.ocultos:
+            return documento
+        return {campo: valor for campo, valor in documento.items() if campo not in self.ocultos}
+
+    def buscar(self, filtro=None, orden=None, proyeccion=None, despues=None, limite=None):
+        """Cursor de Motor; `despues` son los valores de `orden` del último documento ya entregado"""
+        if despues is not None:
+            filtro = {"$and": [filtro or {}, filtro_keyset(orden, despues)]}
+        cursor = self.coleccion.find(filtro or {}, self.campos(proyeccion))
+        if orden:
+            cursor = cursor.sort(orden)
+        if limite:
+            cursor = cursor.limit(limite)
+        return cursor
+
+    async def listar(self, filtro=None, orden=None, proyeccion=None, despues=None, limite=None):
+        return await self.buscar(filtro, orden, proyeccion, despues, limite).to_list(length=None)
+
+    async def recorrer(self, filtro=None, orden=None, proyeccion=None, despues=None, limite=None):
+        """Itera los documentos según los entrega el cursor, sin cargarlos todos"""
+        async for documento in self.buscar(filtro, orden, proyeccion, despues, limite):
+            yield documento
+
+    async def agregar(self, pipeline: list):
+        return await self.coleccion.aggregate(pipeline).to_list(length=None)
+
+    async def contar(self, filtro=None):
+        return await self.coleccion.count_documents(filtro or {})
+
+    # Tras cada escritura se invalida la caché de la colección (nunca antes: un
+    # lector concurrente podría guardar datos viejos como nuevos)
+
+    async def insertar(self, documento: dict):
+        # Se inserta una copia para que el dict del llamador no reciba el ObjectId
+        async with marca_cambio() as marca:
+            resultado = await self.coleccion.insert_one({**documento, **marca})
+        await notificar_escritura(self.coleccion.name)
+        return resultado
+
+    async def insertar_lote(self, documentos: list, ordenado: bool = False) -> dict:
+        """Inserta `documentos` en una sola operación; devuelve {índice: error} de los que fallaron
+
+        Con `ordenado` la inserción se detiene en el primer error y los
+        documentos posteriores quedan sin insertar (sin error propio).
+        """
+        if not documentos:
+            return {}
+        actualizado = datetime.now().isoformat()
+        try:
+            async with versiones(len(documentos)) as primera:
+                await self.coleccion.insert_many(
+                    [
+                        {**documento, "version": primera + i, "actualizado": actualizado}
+                        for i, documento in enumerate(documentos)
+                    ],
+                    ordered=ordenado
+                )
+            return {}
+        except BulkWriteError as e:
+            return {error["index"]: error for error in e.details.get("writeErrors", [])}
+        finally:
+            await notificar_escritura(self.coleccion.name)
+
+    async def fusionar_lote(self, documentos: list, clave: tuple, solo_al_crear=("id", "fecha_creacion")):
+        """Inserta o actualiza cada documento según los campos de `clave` (sin orden)
+
+        Los campos de `solo_al_crear` solo se escriben si el documento es nuevo.
+        Devuelve los índices de los documentos creados y {índice: error} de los
+        que fallaron; el resto se actualizó.
+        """
+        if not documentos:
+            return set(), {}
+        actualizado = datetime.now().isoformat()
+        try:
+            async with versiones(len(documentos)) as primera:
+                operaciones = []
+                for i, documento in enumerate(documentos):
+                    cambios = {c: v for c, v in documento.items() if c not in solo_al_crear}
+                    operaciones.append(UpdateOne(
+                        {c: documento[c] for c in clave},
+                        {
+                            "$set": {**cambios, "version": primera + i, "actualizado": actualizado},
+                            "$setOnInsert": {c: documento[c] for c in solo_al_crear if c in documento}
+                        },
+                        upsert=True
+                    ))
+                resultado = await self.coleccion.bulk_write(operaciones, ordered=False)
+            return set(resultado.upserted_ids), {}
+        except BulkWriteError as e:
+            return (
+                {u["index"] for u in e.details.get("upserted", [])},
+                {error["index"]: error for error in e.details.get("writeErrors", [])}
+            )
+        finally:
+            await notificar_escritura(self.coleccion.name)
+
+    async def actualizar(self, documento_id: str, cambios: dict):
+        async with marca_cambio() as marca:
+            resultado = await self.coleccion.update_one({"id": documento_id}, {"$set": {**cambios, **marca}})
+        await notificar_escritura(self.coleccion.name)
+        return resultado
+
+    async def eliminar(self, documento_id: str):
+        resultado = await self.coleccion.delete_one({"id": documento_id})
+        if resultado.deleted_count:
+            await self.registrar_eliminacion(documento_id)
+        await notificar_escritura(self.coleccion.name)
+        return resultado
+
+    async def modificar(self, documento_id: str, cambios: dict, condicion=None):
+        """Aplica `cambios` si se cumple `condicion` y devuelve el documento anterior (o None)"""
+        async with marca_cambio() as marca:
+            anterior = await self.coleccion.find_one_and_update(
+                {"id": documento_id, **(condicion or {})},
+                {"$set": {**cambios, **marca}},
+                projection={"_id": 0}
+            )
+        await notificar_escritura(self.coleccion.name)
+        return anterior
+
+    async def transformar(self, documento_id: str, actualizacion: dict, condicion=None):
+        """Aplica operadores de actualización ($inc, $max...) si se cumple `condicion`
+
+        Devuelve el documento ya actualizado, o None si no existe o no cumple la condición.
+        """
+        async with marca_cambio() as marca:
+            documento = await self.coleccion.find_one_and_update(
+                {"id": documento_id, **(condicion or {})},
+                {**actualizacion, "$set": {**actualizacion.get("$set", {}), **marca}},
+                projection=self.campos(),
+                return_document=ReturnDocument.AFTER
+            )
+        await notificar_escritura(self.coleccion.name)
+        return documento
+
+    async def extraer(self, documento_id: str):
+        """Elimina el documento y lo devuelve (o None si no existía)"""
+        documento = await self.coleccion.find_one_and_delete(
+            {"id": documento_id}, projection={"_id": 0}
+        )
+        if documento is not None:
+            await self.registrar_eliminacion(documento_id)
+        await notificar_escritura(self.coleccion.name)
+        return documento
+
+    async def registrar_eliminacion(self, documento_id: str):
+        async with marca_cambio() as marca:
+            await eliminados_collection.insert_one({"coleccion": self.coleccion.name, "id": documento_id, **marca})
+
+    async def actualizar_ocultos(self, filtro: dict, actualizacion: dict):
+        """Cambia solo campos de `ocultos`: sin versión nueva ni aviso, las lecturas no cambian"""
+        return await self.coleccion.update_many(filtro, actualizacion)
+
+    async def escribir_lote(self, operaciones: list, ordenado: bool = True):
+        try:
+            return await self.coleccion.bulk_write(operaciones, ordered=ordenado)
+        finally:
+            # Un lote que falla a medias puede haber escrito parte de las operaciones
+            await notificar_escritura(self.coleccion.name)
+
+
+reservas_repo = Repositorio(db.reservas, ocultos=("franjas", "momento"))
+proveedores_repo = Repositorio(db.proveedores)
+gastos_repo = Repositorio(db.gastos, ocultos=("momento",))
+# movimientos_pendientes: aplicados al stock y aún sin registrar; margen_stock: campo derivado indexado (ver stock.py)
+inventario_repo = Repositorio(db.inventario, ocultos=("movimientos_pendientes", "margen_stock"))
+empleados_repo = Repositorio(db.empleados)
+movimientos_repo = Repositorio(db.movimientos, ocultos=("momento",))
+
+
+def cerrar_conexion():
+    client.close()
@@ -0,0 +1,100 @@
+"""Motor de disponibilidad de horarios basado en mapas de bits
+
+Las rejillas de cada día de la semana se calculan una sola vez al arrancar.
+La ocupación de un (peluquero, fecha) se representa como un entero en el que
+el bit i indica que el slot i de la rejilla está ocupado, teniendo en cuenta
+la duración del servicio reservado.
+"""
+from datetime import date
+from typing import NamedTuple, Optional, Tuple, Dict
+
+SLOT_MINUTOS = 30
+DIAS_SEMANA = ("lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo")
+
+
+def a_minutos(hora: str) -> int:
+    horas, minutos = hora.split(":")
+    return int(horas) * 60 + int(minutos)
+
+
+class Rejilla(NamedTuple):
+    inicio: int               # minuto del día en que empieza el primer slot
+    horas: Tuple[str, ...]    # "HH:MM" de cada slot
+    indices: Dict[str, int]   # "HH:MM" -> posición del bit
+
+    @property
+    def completa(self) -> int:
+        return (1 << len(self.horas)) - 1
+
+
+class Agenda:
+    """Rejillas precalculadas por día de la semana y operaciones de ocupación"""
+
+    def __init__(self, horarios: dict, servicios: list):
+        self.rejillas = {}
+        for dia, horario in horarios.items():
+            inicio = a_minutos(horario["inicio"])
+            fin = a_minutos(horario["fin"])
+            horas = tuple(
+                f"{m // 60:02d}:{m % 60:02d}" for m in range(inicio, fin, SLOT_MINUTOS)
+            )
+            self.rejillas[DIAS_SEMANA.index(dia)] = Rejilla(
+                inicio, horas, {h: i for i, h in enumerate(horas)}
+            )
+        # Número de slots que ocupa cada servicio (redondeando hacia arriba)
+        self.slots_servicio = {
+            s["nombre"]: max(1, -(-s["duracion"] // SLOT_MINUTOS)) for s in servicios
+        }
+
+    def rejilla(self, fecha: str) -> Optional[Rejilla]:
+        """Rejilla del día de la semana de `fecha`, o None si cierra o la fecha no es válida"""
+        try:
+            return self.rejillas.get(date.fromisoformat(fecha).weekday())
+        except ValueError:
+            return None
+
+    def slots(self, servicio: Optional[str]) -> int:
+        return self.slots_servicio.get(servicio, 1)
+
+    def mascara_ocupacion(self, rejilla: Rejilla, reservas) -> int:
+        """Mapa de bits de los slots ocupados por `reservas` (con `hora` y `servicio`)"""
+        mascara = 0
+        for r in reservas:
+            try:
+                desde = (a_minutos(r["hora"]) - rejilla.inicio) // SLOT_MINUTOS
+            except (KeyError, ValueError):
+                continue
+            hasta = desde + self.slots(r.get("servicio"))
+            desde = max(desde, 0)
+            hasta = min(hasta, len(rejilla.horas))
+            if hasta > desde:
+                mascara |= ((1 << (hasta - desde)) - 1) << desde
+        return mascara
+
+    def inicios_libres(self, rejilla: Rejilla, mascara: int, slots: int) -> int:
+        """Mapa de bits de los slots donde cabe un servicio de `slots` slots"""
+        n = len(rejilla.horas)
+        if slots > n:
+            return 0
+        # Bit i de `bloqueados` activo si algún slot entre i e i+slots-1 está ocupado
+        bloqueados = mascara
+        for desplazamiento in range(1, slots):
+            bloqueados |= mascara >> desplazamiento
+        validos = (1 << (n - slots + 1)) - 1
+        return validos & ~bloqueados
+
+    def desde_minuto(self, rejilla: Rejilla, minuto: int) -> int:
+        """Mapa de bits de los slots que empiezan en `minuto` o más tarde"""
+        primero = max(0, -(-(minuto - rejilla.inicio) // SLOT_MINUTOS))
+        return rejilla.completa >> primero << primero
+
+    def horas_libres(self, rejilla: Rejilla, mascara: int, slots: int = 1):
+        libres = self.inicios_libres(rejilla, mascara, slots)
+        return [h for i, h in enumerate(rejilla.horas) if libres >> i & 1]
+
+    def franjas(self, rejilla: Rejilla, hora: str, slots: int = 1):
+        """Horas de los slots que ocupa un servicio que empieza en `hora`, o None si no cabe"""
+        indice = rejilla.indices.get(hora)
+        if indice is None or indice + slots > len(rejilla.horas):
+            return None
+        return list(rejilla.horas[indice:indice + slots])
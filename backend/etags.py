@@ -0,0 +1,52 @@
+"""GET condicionales (ETag / If-None-Match)
+
+El ETag de un listado combina la versión confirmada del contador global de
+cambios (versiones_confirmadas, la misma que usa /api/sync) con los parámetros
+de la petición. La versión está en MongoDB, así que todos los workers dan el
+mismo ETag a la misma respuesta: un cliente recibe 304 caiga en el worker que
+caiga, y el ETag sobrevive a los reinicios. Comprobarlo cuesta una lectura por
+_id del contador, no la del listado.
+
+Se lee antes que los documentos: todo lo escrito hasta esa versión está en la
+respuesta. Una escritura que aún no ha terminado cambia el ETag en cuanto
+termina.
+"""
+from fastapi import Request, Response
+import hashlib
+import json
+
+
+def huella(texto: str) -> str:
+    return hashlib.blake2b(texto.encode(), digest_size=8).hexdigest()
+
+
+def etag_coleccion(coleccion: str, request: Request, version: int) -> str:
+    """ETag del listado de `coleccion` con `version` = versiones_confirmadas() leída antes que los datos"""
+    # La misma versión da respuestas distintas según query string y formato
+    variante = huella(f"{request.url.query}|{request.headers.get('accept', '')}")
+    return f'W/"{coleccion}-{version}-{variante}"'
+
+
+def etag_contenido(contenido) -> str:
+    """ETag fijo para datos de configuración que no cambian mientras corre el proceso"""
+    return f'"{huella(json.dumps(contenido, sort_keys=True))}"'
+
+
+def no_modificado(request: Request, etiqueta: str) -> bool:
+    cabecera = request.headers.get("if-none-match")
+    if not cabecera:
+        return False
+    candidatos = [c.strip() for c in cabecera.split(",")]
+    return "*" in candidatos or etiqueta in candidatos
+
+
+def respuesta_304(etiqueta: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etiqueta, "Cache-Control": "no-cache"})
+
+
+def con_etag(respuesta, etiqueta: str, response: Response):
+    """Añade ETag a una respuesta ya construida o a la que FastAPI construirá con `response`"""
+    destino = respuesta if isinstance(respuesta, Response) else response
+    destino.headers["ETag"] = etiqueta
+    destino.headers["Cache-Control"] = "no-cache"
+    return respuesta
@@ -0,0 +1,76 @@
+"""Eventos de disponibilidad en tiempo real (Server-Sent Events)
+
+Los clientes que miran el día de un peluquero se suscriben a
+`(fecha, peluquero)` y reciben un evento cada vez que una reserva ocupa o
+libera franjas, en lugar de volver a pedir los horarios periódicamente. Los
+eventos que llevan `canal` (p. ej. los avisos de stock, canal ["stock"]) se
+entregan a los suscritos a ese canal.
+
+Cada suscripción es una cola en memoria; una conexión inactiva solo cuesta una
+corrutina esperando en su cola, así que un worker mantiene cientos sin carga.
+Los eventos de otros workers llegan por el canal de invalidaciones.
+"""
+import asyncio
+import json
+
+TAMANO_COLA = 64
+LATIDO_SEGUNDOS = 15
+
+suscriptores = {}  # canal, p. ej. (fecha, peluquero) -> colas de las conexiones abiertas
+
+
+def canal_evento(evento: dict) -> tuple:
+    if "canal" in evento:
+        return tuple(evento["canal"])
+    return (evento["fecha"], evento["peluquero"])
+
+
+def suscribir(canal: tuple) -> asyncio.Queue:
+    cola = asyncio.Queue(maxsize=TAMANO_COLA)
+    suscriptores.setdefault(canal, set()).add(cola)
+    return cola
+
+
+def cancelar_suscripcion(canal: tuple, cola: asyncio.Queue):
+    colas = suscriptores.get(canal)
+    if colas is not None:
+        colas.discard(cola)
+        if not colas:
+            del suscriptores[canal]
+
+
+def emitir(evento: dict):
+    """Entrega `evento` a las conexiones suscritas a su canal"""
+    for cola in suscriptores.get(canal_evento(evento), ()):
+        try:
+            cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Cliente demasiado lento: en vez de eventos sueltos, que recargue el día
+            # (o la lista de su canal)
+            while not cola.empty():
+                cola.get_nowait()
+            cola.put_nowait({**evento, "tipo": "recargar"})
+
+
+def formato_sse(evento: dict) -> str:
+    return f"event: {evento['tipo']}\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+
+
+async def flujo_eventos(request, canal: tuple, conectado: dict):
+    """Genera el flujo SSE de una conexión hasta que el cliente se desconecta
+
+    `conectado` son los datos del primer evento, que confirma la suscripción.
+    """
+    cola = suscribir(canal)
+    try:
+        yield formato_sse({"tipo": "conectado", **conectado})
+        while not await request.is_disconnected():
+            try:
+                evento = await asyncio.wait_for(cola.get(), LATIDO_SEGUNDOS)
+            except asyncio.TimeoutError:
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                yield ": latido\n\n"
+                continue
+            yield formato_sse(evento)
+    finally:
+        cancelar_suscripcion(canal, cola)
@@ -0,0 +1,173 @@
+"""Exportación de reservas y gastos a CSV y Parquet en streaming
+
+Los documentos se leen de un cursor de MongoDB con proyección y filtro por
+`momento` y se escriben en trozos a medida que llegan, así que la memoria no
+depende del tamaño del rango exportado:
+
+- CSV: un trozo cada TAMANO_TROZO filas.
+- Parquet: un row group cada TAMANO_TROZO filas; los bytes de cada row group
+  se entregan en cuanto se escriben y el pie del fichero al final.
+
+Desde la línea de comandos:
+
+    python exportacion.py gastos --formato parquet --desde 2024-01-01 --hasta 2024-12-31 -o gastos.parquet
+"""
+import argparse
+import asyncio
+import csv
+import io
+import sys
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from database import reservas_repo, gastos_repo
+from fechas import rango_fechas
+
+TAMANO_TROZO = 10000
+FORMATOS = {"csv": "text/csv; charset=utf-8", "parquet": "application/vnd.apache.parquet"}
+
+# Columnas exportadas de cada colección y su tipo en Parquet
+ESQUEMAS = {
+    "reservas": pa.schema([
+        ("id", pa.string()),
+        ("fecha", pa.string()),
+        ("hora", pa.string()),
+        ("peluquero", pa.string()),
+        ("servicio", pa.string()),
+        ("estado", pa.string()),
+        ("cliente_nombre", pa.string()),
+        ("cliente_telefono", pa.string()),
+        ("cliente_email", pa.string()),
+        ("fecha_creacion", pa.string())
+    ]),
+    "gastos": pa.schema([
+        ("id", pa.string()),
+        ("fecha", pa.string()),
+        ("concepto", pa.string()),
+        ("categoria", pa.string()),
+        ("monto", pa.float64()),
+        ("metodo_pago", pa.string()),
+        ("proveedor_id", pa.string()),
+        ("descripcion", pa.string()),
+        ("fecha_creacion", pa.string())
+    ])
+}
+REPOS = {"reservas": reservas_repo, "gastos": gastos_repo}
+
+
+def documentos(coleccion: str, desde=None, hasta=None):
+    """Cursor ordenado por `momento` con solo las columnas exportadas; ValueError si las fechas no son válidas"""
+    rango = rango_fechas(desde, hasta)
+    return REPOS[coleccion].recorrer(
+        {"momento": rango} if rango else None,
+        orden=[("momento", 1)],
+        proyeccion={campo: 1 for campo in ESQUEMAS[coleccion].names}
+    )
+
+
+async def trozos(documentos, tamano: int = TAMANO_TROZO):
+    """Agrupa un iterador asíncrono de documentos en listas de como mucho `tamano`"""
+    trozo = []
+    async for documento in documentos:
+        trozo.append(documento)
+        if len(trozo) >= tamano:
+            yield trozo
+            trozo = []
+    if trozo:
+        yield trozo
+
+
+async def csv_en_streaming(documentos, campos: list):
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=campos, extrasaction="ignore")
+    escritor.writeheader()
+    async for trozo in trozos(documentos):
+        escritor.writerows(trozo)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class SalidaIncremental:
+    """Fichero de solo escritura que guarda los bytes hasta que se recogen
+
+    ParquetWriter necesita `tell()` con la posición absoluta para el pie del
+    fichero, así que se lleva la cuenta aparte de lo ya entregado.
+    """
+
+    def __init__(self):
+        self.pendiente = []
+        self.posicion = 0
+        self.closed = False
+
+    def write(self, datos) -> int:
+        datos = bytes(datos)
+        self.pendiente.append(datos)
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self) -> int:
+        return self.posicion
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def recoger(self) -> bytes:
+        datos = b"".join(self.pendiente)
+        self.pendiente = []
+        return datos
+
+
+async def parquet_en_streaming(documentos, esquema: pa.Schema):
+    salida = SalidaIncremental()
+    escritor = pq.ParquetWriter(salida, esquema, compression="zstd")
+    try:
+        async for trozo in trozos(documentos):
+            escritor.write_table(pa.Table.from_pylist(trozo, schema=esquema))
+            yield salida.recoger()
+    finally:
+        escritor.close()
+    yield salida.recoger()
+
+
+def exportar(coleccion: str, formato: str, desde=None, hasta=None):
+    """Generador asíncrono de bytes del fichero; ValueError si las fechas no son válidas"""
+    cursor = documentos(coleccion, desde, hasta)
+    if formato == "parquet":
+        return parquet_en_streaming(cursor, ESQUEMAS[coleccion])
+    return csv_en_streaming(cursor, ESQUEMAS[coleccion].names)
+
+
+async def main(argumentos=None) -> int:
+    parser = argparse.ArgumentParser(description="Exporta reservas o gastos a CSV o Parquet")
+    parser.add_argument("coleccion", choices=sorted(ESQUEMAS))
+    parser.add_argument("--formato", choices=sorted(FORMATOS), default="csv")
+    parser.add_argument("--desde", help="YYYY-MM-DD (incluido)")
+    parser.add_argument("--hasta", help="YYYY-MM-DD (incluido)")
+    parser.add_argument("-o", "--salida", help="fichero de salida (por defecto, la salida estándar)")
+    args = parser.parse_args(argumentos)
+
+    try:
+        contenido = exportar(args.coleccion, args.formato, args.desde, args.hasta)
+    except ValueError:
+        print("Fecha no válida, formato YYYY-MM-DD", file=sys.stderr)
+        return 1
+
+    destino = open(args.salida, "wb") if args.salida else sys.stdout.buffer
+    try:
+        async for trozo in contenido:
+            destino.write(trozo)
+    finally:
+        if args.salida:
+            destino.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
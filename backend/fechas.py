@@ -0,0 +1,35 @@
+"""Conversión entre las fechas en texto de la API y las fechas BSON almacenadas
+
+La API sigue recibiendo y devolviendo `fecha` ("YYYY-MM-DD") y `hora` ("HH:MM")
+como texto; cada documento guarda además `momento`, un datetime indexable que
+permite filtrar días y meses con rangos $gte/$lt.
+"""
+from datetime import date, datetime, timedelta
+
+
+def momento_reserva(fecha: str, hora: str) -> datetime:
+    return datetime.strptime(f"{fecha} {hora}", "%Y-%m-%d %H:%M")
+
+
+def momento_gasto(fecha: str) -> datetime:
+    return datetime.fromisoformat(fecha)
+
+
+def rango_mes(mes: str) -> dict:
+    """Rango [inicio de mes, inicio del mes siguiente); ValueError si `mes` no es YYYY-MM"""
+    inicio = datetime.strptime(mes, "%Y-%m")
+    if inicio.month == 12:
+        fin = inicio.replace(year=inicio.year + 1, month=1)
+    else:
+        fin = inicio.replace(month=inicio.month + 1)
+    return {"$gte": inicio, "$lt": fin}
+
+
+def rango_fechas(desde: str = None, hasta: str = None) -> dict:
+    """Rango [desde, hasta] por días completos; cualquiera de los extremos puede faltar"""
+    rango = {}
+    if desde:
+        rango["$gte"] = datetime.combine(date.fromisoformat(desde), datetime.min.time())
+    if hasta:
+        rango["$lt"] = datetime.combine(date.fromisoformat(hasta), datetime.min.time()) + timedelta(days=1)
+    return rango
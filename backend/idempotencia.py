@@ -0,0 +1,169 @@
+"""Claves de idempotencia para los POST de creación
+
+Un cliente que reintenta un POST (p. ej. el móvil tras un timeout) envía la
+misma cabecera `Idempotency-Key`: la primera petición se ejecuta y se guarda su
+respuesta, y los reintentos reciben esa misma respuesta sin volver a validar,
+consultar la disponibilidad ni escribir.
+
+Las respuestas se guardan en la colección `idempotencia` (índice TTL de
+CADUCIDAD_SEGUNDOS) y, una vez completadas, también en una caché en memoria
+delante de ella. Mientras la primera petición sigue en curso, un reintento
+recibe 409 con Retry-After; reutilizar la clave con otro cuerpo da 422. Las
+respuestas 5xx no se guardan: el reintento vuelve a ejecutar la petición.
+"""
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta, timezone
+import hashlib
+import orjson
+
+from cache import CacheTTL
+from database import idempotencia_collection
+
+CABECERA = b"idempotency-key"
+MAX_CLAVE = 255
+CADUCIDAD_SEGUNDOS = 24 * 3600
+# Una petición en curso más antigua que esto se da por abandonada (proceso caído)
+ABANDONO_SEGUNDOS = 120
+# Subidas de ficheros: no se cargan enteras en memoria para calcular la huella
+EXCLUIDAS = ("/api/importar/",)
+
+# Las respuestas completadas no cambian, así que la caché no necesita invalidaciones
+respuestas = CacheTTL(capacidad=1024, ttl=600)
+
+
+async def leer_cuerpo(receive):
+    """Lee el cuerpo entero de la petición; devuelve el cuerpo y un `receive` que lo repite"""
+    trozos = []
+    while True:
+        mensaje = await receive()
+        if mensaje["type"] != "http.request":
+            return b"".join(trozos), receive
+        trozos.append(mensaje.get("body", b""))
+        if not mensaje.get("more_body"):
+            break
+    cuerpo = b"".join(trozos)
+    entregado = False
+
+    async def repetir():
+        nonlocal entregado
+        if entregado:
+            return await receive()
+        entregado = True
+        return {"type": "http.request", "body": cuerpo, "more_body": False}
+
+    return cuerpo, repetir
+
+
+async def reservar(clave: str, huella: str):
+    """Registra la petición como en curso; devuelve None si le toca ejecutarla o el registro existente"""
+    while True:
+        ahora = datetime.now(timezone.utc)
+        try:
+            await idempotencia_collection.insert_one(
+                {"_id": clave, "huella": huella, "estado": "en_curso", "creado": ahora}
+            )
+            return None
+        except DuplicateKeyError:
+            pass
+
+        retomada = await idempotencia_collection.update_one(
+            {
+                "_id": clave,
+                "huella": huella,
+                "estado": "en_curso",
+                "creado": {"$lt": ahora - timedelta(seconds=ABANDONO_SEGUNDOS)}
+            },
+            {"$set": {"creado": ahora}}
+        )
+        if retomada.modified_count:
+            return None
+
+        registro = await idempotencia_collection.find_one({"_id": clave})
+        if registro is not None:
+            return registro
+        # Caducó entre la inserción y la lectura: se vuelve a intentar
+
+
+async def responder(send, status: int, cuerpo: bytes, cabeceras: list):
+    await send({"type": "http.response.start", "status": status, "headers": cabeceras})
+    await send({"type": "http.response.body", "body": cuerpo})
+
+
+async def responder_error(send, status: int, detalle: str, cabeceras=()):
+    cuerpo = orjson.dumps({"detail": detalle})
+    await responder(send, status, cuerpo, [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(cuerpo)).encode()),
+        *cabeceras
+    ])
+
+
+class MiddlewareIdempotencia:
+    """Middleware ASGI que aplica las claves de idempotencia a los POST"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"].startswith(EXCLUIDAS):
+            return await self.app(scope, receive, send)
+        valor = dict(scope["headers"]).get(CABECERA)
+        if valor is None:
+            return await self.app(scope, receive, send)
+        if not 0 < len(valor) <= MAX_CLAVE:
+            return await responder_error(send, 400, f"Idempotency-Key debe tener entre 1 y {MAX_CLAVE} caracteres")
+
+        cuerpo, receive = await leer_cuerpo(receive)
+        clave = f"{scope['path']}:{valor.decode('latin-1')}"
+        huella = hashlib.sha256(scope.get("query_string", b"") + b"?" + cuerpo).hexdigest()
+
+        guardada = respuestas.leer(clave) or await reservar(clave, huella)
+        if guardada is not None:
+            if guardada["huella"] != huella:
+                return await responder_error(send, 422, "La Idempotency-Key ya se usó con otra petición")
+            if guardada["estado"] == "en_curso":
+                return await responder_error(
+                    send, 409, "Petición con esta Idempotency-Key en curso", [(b"retry-after", b"1")]
+                )
+            respuestas.guardar(clave, guardada)
+            return await responder(send, guardada["status"], guardada["cuerpo"], [
+                *((n.encode("latin-1"), v.encode("latin-1")) for n, v in guardada["cabeceras"]),
+                (b"idempotent-replayed", b"true")
+            ])
+
+        inicio = {}
+        trozos = []
+        completa = False
+
+        async def capturar(mensaje):
+            nonlocal completa
+            if mensaje["type"] == "http.response.start":
+                inicio.update(mensaje)
+            elif mensaje["type"] == "http.response.body":
+                trozos.append(mensaje.get("body", b""))
+                # Completa aunque el cliente se desconecte al enviarla: el trabajo ya está hecho
+                completa = not mensaje.get("more_body", False)
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, capturar)
+        finally:
+            await self.guardar(clave, huella, inicio.get("status", 500) if completa else 500, inicio, trozos)
+
+    async def guardar(self, clave: str, huella: str, status: int, inicio: dict, trozos: list):
+        try:
+            if status >= 500:
+                await idempotencia_collection.delete_one({"_id": clave, "estado": "en_curso"})
+                return
+            guardada = {
+                "huella": huella,
+                "estado": "completada",
+                "status": status,
+                "cabeceras": [[n.decode("latin-1"), v.decode("latin-1")] for n, v in inicio.get("headers", [])],
+                "cuerpo": b"".join(trozos)
+            }
+            await idempotencia_collection.update_one({"_id": clave}, {"$set": guardada})
+            respuestas.guardar(clave, guardada)
+        except Exception as e:
+            # El registro en curso acaba dándose por abandonado (ABANDONO_SEGUNDOS)
+            print(f"Error guardando la respuesta idempotente {clave}: {str(e)}")
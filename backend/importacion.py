@@ -0,0 +1,130 @@
+"""Importación masiva desde CSV (proveedores, inventario, empleados)
+
+El fichero subido se lee fila a fila desde el temporal de la subida (en un
+hilo, para no bloquear el event loop) y se procesa en lotes de TAMANO_LOTE:
+cada fila se valida con el modelo de la API y las válidas se insertan o
+actualizan por su clave natural con un solo bulk_write por lote. La memoria
+no depende del tamaño del fichero.
+
+Las claves naturales no tienen índice único (se pueden dar de alta a mano dos
+productos con el mismo nombre), así que dos importaciones simultáneas de la
+misma colección podrían crear dos veces un documento nuevo. Por eso solo puede
+haber una importación en curso por colección, entre todos los workers
+(importacion_exclusiva).
+"""
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from pydantic import ValidationError
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import csv
+import io
+import uuid
+
+from database import importaciones_collection
+
+TAMANO_LOTE = 1000
+# Una importación más antigua que esto se da por abandonada (proceso caído)
+ABANDONO_SEGUNDOS = 3600
+
+
+class ImportacionEnCurso(Exception):
+    """Ya hay otra importación de la misma colección en curso"""
+
+
+@asynccontextmanager
+async def importacion_exclusiva(coleccion: str):
+    """Reserva la importación de `coleccion`; ImportacionEnCurso si otra la tiene"""
+    ahora = datetime.now(timezone.utc)
+    turno = uuid.uuid4().hex
+    try:
+        await importaciones_collection.insert_one({"_id": coleccion, "turno": turno, "inicio": ahora})
+    except DuplicateKeyError:
+        retomada = await importaciones_collection.update_one(
+            {"_id": coleccion, "inicio": {"$lt": ahora - timedelta(seconds=ABANDONO_SEGUNDOS)}},
+            {"$set": {"turno": turno, "inicio": ahora}}
+        )
+        if not retomada.modified_count:
+            raise ImportacionEnCurso(f"Ya hay una importación de {coleccion} en curso")
+    try:
+        yield
+    finally:
+        await importaciones_collection.delete_one({"_id": coleccion, "turno": turno})
+
+
+def leer_lote(lector, tamano: int) -> list:
+    return list(islice(lector, tamano))
+
+
+def limpiar_fila(fila: dict) -> dict:
+    """Quita espacios y convierte las celdas vacías en None (campos opcionales)"""
+    return {
+        (campo or "").strip(): (valor.strip() or None) if isinstance(valor, str) else valor
+        for campo, valor in fila.items()
+        if campo
+    }
+
+
+async def importar_csv(
+    archivo,
+    repo,
+    modelo,
+    construir,
+    clave: tuple,
+    solo_al_crear=("id", "fecha_creacion"),
+    tamano: int = TAMANO_LOTE
+) -> dict:
+    """Importa el CSV `archivo` (fichero binario) y devuelve el informe por filas
+
+    `construir` convierte una fila validada en el documento que se guarda; las
+    filas con la misma clave que una posterior del mismo lote se descartan
+    ("sustituida"), porque el bulk_write sin orden no garantiza cuál gana.
+    """
+    texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+    lector = csv.DictReader(texto)
+    informe = {"filas": 0, "creados": 0, "actualizados": 0, "errores": []}
+    try:
+        while True:
+            filas = await asyncio.to_thread(leer_lote, lector, tamano)
+            if not filas:
+                break
+            primera_fila = informe["filas"] + 2  # la fila 1 es la cabecera
+            informe["filas"] += len(filas)
+
+            por_clave = {}
+            for posicion, fila in enumerate(filas):
+                numero = primera_fila + posicion
+                try:
+                    documento = construir(modelo.model_validate(limpiar_fila(fila)))
+                except ValidationError as e:
+                    informe["errores"].append({
+                        "fila": numero,
+                        "detalle": e.errors(include_url=False, include_context=False)
+                    })
+                    continue
+                except ValueError as e:
+                    informe["errores"].append({"fila": numero, "detalle": str(e)})
+                    continue
+                valor_clave = tuple(documento[c] for c in clave)
+                if valor_clave in por_clave:
+                    informe["errores"].append({
+                        "fila": por_clave[valor_clave][0],
+                        "detalle": f"sustituida por la fila {numero} con la misma clave"
+                    })
+                por_clave[valor_clave] = (numero, documento)
+
+            lote = list(por_clave.values())
+            creados, errores = await repo.fusionar_lote([d for _, d in lote], clave, solo_al_crear)
+            for indice, error in errores.items():
+                informe["errores"].append({"fila": lote[indice][0], "detalle": error.get("errmsg")})
+            informe["creados"] += len(creados)
+            informe["actualizados"] += len(lote) - len(creados) - len(errores)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ValueError(f"CSV no válido cerca de la fila {informe['filas'] + 2}: {e}")
+    finally:
+        # No cerrar el fichero de la subida al liberar el TextIOWrapper
+        texto.detach()
+
+    informe["errores"].sort(key=lambda error: error["fila"])
+    return informe
@@ -0,0 +1,163 @@
+"""Gestor de índices de MongoDB
+
+Declara los índices que necesita cada colección, los crea al arrancar la API y
+permite comprobar que ninguna consulta de los endpoints acaba en un COLLSCAN:
+
+    python indices.py     # crea los índices y sale con código 1 si hay COLLSCAN
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from datetime import datetime
+import asyncio
+import sys
+
+from database import db, FILTRO_RESERVA_ACTIVA, FILTRO_BAJO_STOCK
+from idempotencia import CADUCIDAD_SEGUNDOS
+from paginacion import filtro_keyset
+
+INDICES = {
+    "reservas": [
+        IndexModel([("id", ASCENDING)], name="id_unico", unique=True),
+        IndexModel([("version", ASCENDING)], name="version"),
+        IndexModel([("fecha", ASCENDING), ("peluquero", ASCENDING), ("hora", ASCENDING)],
+                   name="fecha_peluquero_hora"),
+        IndexModel([("fecha", ASCENDING), ("hora", ASCENDING), ("id", ASCENDING)], name="fecha_hora_id"),
+        IndexModel([("momento", ASCENDING)], name="momento"),
+        # Un slot (fecha, peluquero, franja) solo puede pertenecer a una reserva activa:
+        # el índice único multiclave convierte la reserva en una única inserción atómica
+        IndexModel([("fecha", ASCENDING), ("peluquero", ASCENDING), ("franjas", ASCENDING)],
+                   name="reserva_franja_unica", unique=True,
+                   partialFilterExpression={**FILTRO_RESERVA_ACTIVA, "franjas": {"$exists": True}}),
+    ],
+    "servicios": [
+        IndexModel([("nombre", ASCENDING)], name="nombre_unico", unique=True),
+    ],
+    "eliminados": [
+        IndexModel([("version", ASCENDING)], name="version"),
+    ],
+    "proveedores": [
+        IndexModel([("id", ASCENDING)], name="id_unico", unique=True),
+        IndexModel([("version", ASCENDING)], name="version"),
+        IndexModel([("nombre", ASCENDING), ("id", ASCENDING)], name="nombre_id"),
+    ],
+    "gastos": [
+        IndexModel([("id", ASCENDING)], name="id_unico", unique=True),
+        IndexModel([("version", ASCENDING)], name="version"),
+        IndexModel([("fecha", DESCENDING), ("id", DESCENDING)], name="fecha_id"),
+        IndexModel([("momento", DESCENDING)], name="momento"),
+    ],
+    "inventario": [
+        IndexModel([("id", ASCENDING)], name="id_unico", unique=True),
+        IndexModel([("version", ASCENDING)], name="version"),
+        IndexModel([("nombre", ASCENDING), ("id", ASCENDING)], name="nombre_id"),
+        # Solo contiene los productos en bajo stock: listarlos y contarlos cuesta
+        # lo que el número de productos en bajo stock, no el tamaño del catálogo
+        IndexModel([("stock_actual", ASCENDING)], name="bajo_stock",
+                   partialFilterExpression=FILTRO_BAJO_STOCK),
+    ],
+    "empleados": [
+        IndexModel([("id", ASCENDING)], name="id_unico", unique=True),
+        IndexModel([("version", ASCENDING)], name="version"),
+        IndexModel([("estado", ASCENDING)], name="estado"),
+        IndexModel([("nombre", ASCENDING), ("id", ASCENDING)], name="nombre_id"),
+    ],
+    "idempotencia": [
+        IndexModel([("creado", ASCENDING)], name="caducidad", expireAfterSeconds=CADUCIDAD_SEGUNDOS),
+    ],
+    "movimientos": [
+        IndexModel([("id", ASCENDING)], name="id_unico", unique=True),
+        IndexModel(
+            [("producto_id", ASCENDING), ("fecha_creacion", DESCENDING), ("id", DESCENDING)],
+            name="producto_fecha_id"
+        ),
+    ],
+}
+
+# Consultas representativas de cada endpoint: (colección, filtro, orden)
+CONSULTAS = [
+    ("reservas", {"id": ""}, None),
+    ("reservas", {}, [("fecha", 1), ("hora", 1), ("id", 1)]),
+    ("reservas", {"fecha": "2000-01-01"}, [("hora", 1)]),
+    ("reservas", filtro_keyset([("fecha", 1), ("hora", 1), ("id", 1)], ["2000-01-01", "10:00", ""]),
+     [("fecha", 1), ("hora", 1), ("id", 1)]),
+    ("reservas", {"momento": {"$gte": datetime(2000, 1, 1), "$lt": datetime(2000, 2, 1)}}, None),
+    ("reservas", {"fecha": "2000-01-01", "peluquero": "", **FILTRO_RESERVA_ACTIVA}, None),
+    ("reservas", {"fecha": {"$gte": "2000-01-01", "$lte": "2000-01-31"},
+                  "peluquero": {"$in": [""]}, **FILTRO_RESERVA_ACTIVA}, None),
+    ("proveedores", {"id": ""}, None),
+    ("proveedores", {}, [("nombre", 1), ("id", 1)]),
+    ("gastos", {"id": ""}, None),
+    ("gastos", {}, [("fecha", -1), ("id", -1)]),
+    ("gastos", {"momento": {"$gte": datetime(2000, 1, 1), "$lt": datetime(2000, 2, 1)}},
+     [("momento", -1)]),
+    ("inventario", {"id": ""}, None),
+    ("inventario", {}, [("nombre", 1), ("id", 1)]),
+    ("inventario", FILTRO_BAJO_STOCK, [("stock_actual", 1)]),
+    ("movimientos", {"producto_id": ""}, [("fecha_creacion", -1), ("id", -1)]),
+    ("empleados", {"id": ""}, None),
+    ("empleados", {"estado": "activo"}, None),
+    ("empleados", {}, [("nombre", 1), ("id", 1)]),
+] + [
+    (coleccion, {"version": {"$gt": 0}}, [("version", 1)])
+    for coleccion in ("reservas", "proveedores", "gastos", "inventario", "empleados", "eliminados")
+]
+
+
+class IndiceNoCreado(RuntimeError):
+    """No se pudo crear un índice único: la garantía que da no se cumpliría"""
+
+
+async def asegurar_indices():
+    """Crea los índices declarados; un índice que falla no impide crear los demás
+
+    Si falla algún índice único (p. ej. `reserva_franja_unica` con datos
+    duplicados) lanza IndiceNoCreado al terminar.
+    """
+    fallidos = []
+    for coleccion, indices in INDICES.items():
+        for indice in indices:
+            try:
+                await db[coleccion].create_indexes([indice])
+            except OperationFailure as e:
+                print(f"No se pudo crear el índice {indice.document['name']} en {coleccion}: {str(e)}")
+                if indice.document.get("unique"):
+                    fallidos.append(f"{coleccion}.{indice.document['name']}")
+    if fallidos:
+        raise IndiceNoCreado(f"Índices únicos sin crear: {', '.join(fallidos)}")
+
+
+def etapas_plan(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for valor in plan.values():
+            yield from etapas_plan(valor)
+    elif isinstance(plan, list):
+        for valor in plan:
+            yield from etapas_plan(valor)
+
+
+async def verificar_planes():
+    """Devuelve las consultas cuyo plan ganador incluye un COLLSCAN"""
+    problemas = []
+    for coleccion, filtro, orden in CONSULTAS:
+        cursor = db[coleccion].find(filtro)
+        if orden:
+            cursor = cursor.sort(orden)
+        explicacion = await cursor.explain()
+        if "COLLSCAN" in etapas_plan(explicacion["queryPlanner"]["winningPlan"]):
+            problemas.append({"coleccion": coleccion, "filtro": filtro, "orden": orden})
+    return problemas
+
+
+async def main():
+    await asegurar_indices()
+    problemas = await verificar_planes()
+    for p in problemas:
+        print(f"COLLSCAN en {p['coleccion']}: filtro={p['filtro']} orden={p['orden']}")
+    print(f"{len(CONSULTAS) - len(problemas)}/{len(CONSULTAS)} consultas usan índice")
+    return 1 if problemas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,97 @@
+"""Invalidaciones de caché compartidas entre workers
+
+Cada worker de uvicorn conserva su caché local (cache.py). Con varios workers,
+cada escritura se publica además en una colección capada de MongoDB que todos
+los workers leen con un cursor tailable (funciona en un mongod independiente,
+sin replica set), y cada uno aplica las invalidaciones que han publicado los
+demás.
+
+Si el cursor se pierde, el worker no sabe qué avisos se ha saltado: vacía su
+caché antes de volver a escuchar. Los ETags (etags.py) no necesitan avisos:
+salen de la versión confirmada en MongoDB, común a todos los workers.
+"""
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, OperationFailure
+import asyncio
+import uuid
+
+from cache import cache
+import eventos
+
+ORIGEN = uuid.uuid4().hex
+TAMANO_CANAL = 16 * 1024 * 1024
+MAX_AVISOS = 50000
+ESPERA_RECONEXION = 1
+
+# Colección capada por la que se publican los avisos; None en un solo proceso
+canal = None
+
+
+def aplicar(coleccion: str, clave=None, evento=None):
+    """Invalida una clave concreta de la caché o, sin clave, todo lo que depende de `coleccion`
+
+    Si el aviso lleva un evento de disponibilidad, se entrega a los suscriptores.
+    """
+    if clave is None:
+        cache.invalidar_dependientes(coleccion)
+    else:
+        cache.invalidar(tuple(clave))
+    if evento is not None:
+        eventos.emitir(evento)
+
+
+async def notificar_escritura(coleccion: str, clave=None, evento=None):
+    """Aplica la invalidación en este proceso y la publica para los demás workers"""
+    aplicar(coleccion, clave, evento)
+    if canal is None:
+        return
+    try:
+        await canal.insert_one({
+            "origen": ORIGEN,
+            "coleccion": coleccion,
+            "clave": list(clave) if clave is not None else None,
+            "evento": evento
+        })
+    except Exception as e:
+        # Los demás workers se corrigen al caducar el TTL de sus entradas
+        print(f"Error publicando invalidación de {coleccion}: {str(e)}")
+
+
+async def activar_canal(coleccion):
+    """Crea el canal si hace falta y arranca la escucha; devuelve la tarea"""
+    global canal
+    try:
+        await coleccion.database.create_collection(
+            coleccion.name, capped=True, size=TAMANO_CANAL, max=MAX_AVISOS
+        )
+    except CollectionInvalid:
+        pass  # ya existe
+    except OperationFailure as e:
+        # NamespaceExists: otro worker que arrancaba a la vez la creó entre la
+        # comprobación y la creación
+        if e.code != 48:
+            raise
+    canal = coleccion
+    return asyncio.create_task(escuchar())
+
+
+async def escuchar():
+    while True:
+        try:
+            # Marca propia desde la que empezar a aplicar avisos: lo anterior ya
+            # está reflejado en lo que este worker lea a partir de ahora
+            marca = (await canal.insert_one({"origen": ORIGEN, "marca": True})).inserted_id
+            cache.vaciar()
+            alcanzada = False
+            cursor = canal.find({}, cursor_type=CursorType.TAILABLE_AWAIT)
+            while cursor.alive:
+                async for aviso in cursor:
+                    if not alcanzada:
+                        alcanzada = aviso["_id"] == marca
+                    elif aviso["origen"] != ORIGEN and not aviso.get("marca"):
+                        aplicar(aviso["coleccion"], aviso.get("clave"), aviso.get("evento"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error escuchando invalidaciones: {str(e)}")
+        await asyncio.sleep(ESPERA_RECONEXION)
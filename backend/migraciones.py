@@ -0,0 +1,124 @@
+"""Migraciones de datos existentes
+
+    python migraciones.py    # añade `momento` (fecha BSON) a reservas y gastos antiguos
+                             # y `version` a los documentos anteriores a /api/sync
+                             # y `margen_stock` a los productos anteriores al índice de bajo stock
+                             # y lista los documentos que comparten clave natural (no los cambia)
+
+Cada migración procesa lotes de documentos que aún no están migrados, así que
+se puede interrumpir y volver a lanzar: continúa donde se quedó.
+"""
+from pymongo import UpdateOne
+import asyncio
+
+from database import db, versiones, CLAVES_NATURALES
+from fechas import momento_reserva, momento_gasto
+
+TAMANO_LOTE = 500
+
+
+async def migrar_momento(coleccion, campos: dict, calcular) -> int:
+    migrados = 0
+    while True:
+        pendientes = await coleccion.find(
+            {"momento": {"$exists": False}}, campos
+        ).limit(TAMANO_LOTE).to_list(length=None)
+        if not pendientes:
+            return migrados
+
+        operaciones = []
+        for documento in pendientes:
+            try:
+                momento = calcular(documento)
+            except (KeyError, TypeError, ValueError):
+                # Fecha ilegible: se marca para no volver a procesarla
+                momento = None
+            operaciones.append(UpdateOne({"_id": documento["_id"]}, {"$set": {"momento": momento}}))
+        await coleccion.bulk_write(operaciones, ordered=False)
+        migrados += len(operaciones)
+
+
+async def migrar_fechas():
+    reservas = await migrar_momento(
+        db.reservas, {"fecha": 1, "hora": 1},
+        lambda r: momento_reserva(r["fecha"], r["hora"])
+    )
+    gastos = await migrar_momento(
+        db.gastos, {"fecha": 1},
+        lambda g: momento_gasto(g["fecha"])
+    )
+    return {"reservas": reservas, "gastos": gastos}
+
+
+async def migrar_versiones():
+    """Da una `version` única a los documentos anteriores a la sincronización
+
+    Por cada lote se reserva un bloque de versiones en el contador global, de
+    modo que no quedan empates que rompan la paginación de /api/sync.
+    """
+    migrados = {}
+    for nombre in ("reservas", "proveedores", "gastos", "inventario", "empleados"):
+        migrados[nombre] = 0
+        while True:
+            pendientes = await db[nombre].find(
+                {"version": {"$exists": False}}, {"_id": 1}
+            ).limit(TAMANO_LOTE).to_list(length=None)
+            if not pendientes:
+                break
+
+            async with versiones(len(pendientes)) as primera:
+                await db[nombre].bulk_write([
+                    UpdateOne({"_id": d["_id"]}, {"$set": {"version": primera + i}})
+                    for i, d in enumerate(pendientes)
+                ], ordered=False)
+            migrados[nombre] += len(pendientes)
+    return migrados
+
+
+async def migrar_margen_stock() -> int:
+    """Calcula `margen_stock` de los productos que aún no lo tienen
+
+    Es una sola actualización con pipeline: MongoDB calcula el margen de cada
+    producto con su propio stock, sin leerlos desde aquí.
+    """
+    resultado = await db.inventario.update_many(
+        {"margen_stock": {"$exists": False}},
+        [{"$set": {"margen_stock": {"$subtract": ["$stock_actual", "$stock_minimo"]}}}]
+    )
+    return resultado.modified_count
+
+
+async def claves_duplicadas() -> dict:
+    """Grupos de documentos que comparten clave natural, por colección
+
+    Una importación CSV actualiza solo uno de ellos (cualquiera), así que
+    conviene renombrarlos o fusionarlos a mano antes de importar. No cambia
+    nada: solo informa.
+    """
+    duplicados = {}
+    for nombre, claves in CLAVES_NATURALES.items():
+        grupos = await db[nombre].aggregate([
+            {"$group": {
+                "_id": {clave: f"${clave}" for clave in claves},
+                "ids": {"$push": "$id"},
+                "total": {"$sum": 1}
+            }},
+            {"$match": {"total": {"$gt": 1}}}
+        ]).to_list(length=None)
+        duplicados[nombre] = [{"clave": g["_id"], "ids": g["ids"]} for g in grupos]
+    return duplicados
+
+
+async def main():
+    fechas = await migrar_fechas()
+    print(f"Reservas migradas: {fechas['reservas']}, gastos migrados: {fechas['gastos']}")
+    versiones = await migrar_versiones()
+    print(f"Documentos con versión inicial: {sum(versiones.values())}")
+    print(f"Productos con margen de stock: {await migrar_margen_stock()}")
+    for nombre, grupos in (await claves_duplicadas()).items():
+        for grupo in grupos:
+            print(f"Clave repetida en {nombre}: {grupo['clave']} -> {', '.join(map(str, grupo['ids']))}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+"""Paginación por clave (keyset) y listados en streaming
+
+Los listados se ordenan siempre por una clave compuesta que termina en `id`
+(único), así que el último documento de una página identifica sin ambigüedad
+dónde empieza la siguiente. El cursor que recibe el cliente son los valores de
+esa clave codificados en base64.
+
+Sin `limite`, el listado completo se envía en streaming según lo entrega el
+cursor de MongoDB: como JSON con la forma de siempre, o como NDJSON (un
+documento por línea) si el cliente envía `Accept: application/x-ndjson`.
+
+Los documentos se serializan con orjson directamente a bytes y se devuelven
+como Response ya construidas, sin pasar por `jsonable_encoder`: el cursor de
+MongoDB ya entrega la forma exacta que ve el cliente.
+"""
+from fastapi import HTTPException, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
+import base64
+import json
+import orjson
+
+MAX_LIMITE = 1000
+NDJSON = "application/x-ndjson"
+
+
+def codificar_cursor(documento: dict, orden: list) -> str:
+    valores = [documento.get(campo) for campo, _ in orden]
+    return base64.urlsafe_b64encode(json.dumps(valores, ensure_ascii=False).encode()).decode()
+
+
+def decodificar_cursor(token: str, orden: list) -> list:
+    """Valores de la clave de orden; ValueError si el token no es válido para `orden`"""
+    valores = json.loads(base64.urlsafe_b64decode(token.encode()))
+    if not isinstance(valores, list) or len(valores) != len(orden):
+        raise ValueError("Cursor no válido")
+    # Solo escalares: un objeto como {"$ne": null} acabaría en el filtro como operador
+    if not all(v is None or isinstance(v, (str, int, float, bool)) for v in valores):
+        raise ValueError("Cursor no válido")
+    return valores
+
+
+def filtro_keyset(orden: list, valores: list) -> dict:
+    """Documentos estrictamente posteriores a `valores` según `orden`"""
+    condiciones = []
+    for i, (campo, sentido) in enumerate(orden):
+        condicion = {c: v for (c, _), v in zip(orden[:i], valores[:i])}
+        condicion[campo] = {"$gt" if sentido == 1 else "$lt": valores[i]}
+        condiciones.append(condicion)
+    return {"$or": condiciones}
+
+
+def serializar(documento: dict) -> bytes:
+    return orjson.dumps(documento, default=str)
+
+
+async def lineas_ndjson(documentos):
+    async for documento in documentos:
+        yield serializar(documento) + b"\n"
+
+
+async def json_en_streaming(clave: str, documentos):
+    """Genera `{"<clave>": [...]}` documento a documento"""
+    yield b'{"' + clave.encode() + b'": ['
+    separador = b""
+    async for documento in documentos:
+        yield separador + serializar(documento)
+        separador = b","
+    yield b"]}"
+
+
+async def pagina(repo, orden: list, limite: int, filtro=None, despues=None, proyeccion=None):
+    """Una página de `limite` documentos y el cursor de la siguiente (None si no hay más)"""
+    if proyeccion:
+        # La clave de orden hace falta para construir el cursor
+        proyeccion = {**proyeccion, **{campo: 1 for campo, _ in orden}}
+    # Se pide un documento de más para saber si hay página siguiente
+    documentos = await repo.listar(
+        filtro, orden=orden, proyeccion=proyeccion, despues=despues, limite=limite + 1
+    )
+    siguiente = None
+    if len(documentos) > limite:
+        documentos = documentos[:limite]
+        siguiente = codificar_cursor(documentos[-1], orden)
+    return documentos, siguiente
+
+
+async def responder_listado(
+    request: Request,
+    repo,
+    clave: str,
+    orden: list,
+    filtro=None,
+    limite=None,
+    cursor=None
+):
+    if limite is not None and not 1 <= limite <= MAX_LIMITE:
+        raise HTTPException(status_code=400, detail=f"limite debe estar entre 1 y {MAX_LIMITE}")
+
+    try:
+        despues = decodificar_cursor(cursor, orden) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor no válido")
+
+    if NDJSON in request.headers.get("accept", ""):
+        documentos = repo.recorrer(filtro, orden=orden, despues=despues, limite=limite)
+        return StreamingResponse(lineas_ndjson(documentos), media_type=NDJSON)
+
+    if limite is None:
+        documentos = repo.recorrer(filtro, orden=orden, despues=despues)
+        return StreamingResponse(json_en_streaming(clave, documentos), media_type="application/json")
+
+    documentos, siguiente = await pagina(repo, orden, limite, filtro=filtro, despues=despues)
+    return ORJSONResponse({clave: documentos, "siguiente": siguiente})
@@ -0,0 +1,197 @@
+"""Informes de ocupación y previsión de demanda vectorizados con pandas/NumPy
+
+Las reservas no viajan una a una: MongoDB las agrega por (peluquero, servicio,
+estado, día de la semana, minuto de inicio) y, solo para las semanas de la
+previsión, también por semana. Como cada franja de un peluquero tiene como
+mucho una reserva activa, el número de grupos depende de la rejilla y de las
+semanas de la previsión, no del tamaño del rango. Todos los cálculos se hacen
+sobre arrays: cada grupo confirmado se expande en los slots que ocupa y se
+cuenta con np.bincount, ponderado por su número de reservas, sobre un índice
+plano (peluquero, día de la semana, slot).
+
+    python benchmark_ocupacion.py 300000    # mide carga e informe con datos sintéticos
+"""
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+from configuracion import PELUQUEROS
+from database import db, FILTRO_RESERVA_ACTIVA
+from disponibilidad import DIAS_SEMANA, SLOT_MINUTOS
+
+COLUMNAS = ("peluquero", "servicio", "estado", "dia", "minuto", "semana", "reservas")
+MS_DIA = 24 * 3600 * 1000
+
+
+def semana_epoca(fecha) -> int:
+    """Semana (de lunes a domingo) desde la época: el 1970-01-01 fue jueves"""
+    return (np.datetime64(fecha, "D").astype(np.int64) + 3) // 7
+
+
+def inicio_semana(semana: int) -> datetime:
+    return datetime(1970, 1, 1) + timedelta(days=int(semana) * 7 - 3)
+
+
+def pipeline_ocupacion(desde: datetime, hasta: datetime, semanas: int) -> list:
+    """Grupos del histórico (sin semana) y de las `semanas` previas a `hasta` (con semana)
+
+    La previsión no depende de `desde`: si el histórico empieza dentro de la
+    ventana de semanas, el $match inicial se abre hasta el inicio de la ventana
+    y `desde` solo se aplica al histórico.
+    """
+    clave = {c: f"${c}" for c in ("peluquero", "servicio", "estado", "dia", "minuto")}
+    dias = {"$floor": {"$divide": [{"$toLong": "$momento"}, MS_DIA]}}
+    inicio_prevision = inicio_semana(semana_epoca(hasta.date()) - semanas)
+    return [
+        {"$match": {"momento": {"$gte": min(desde, inicio_prevision), "$lt": hasta}}},
+        {"$project": {
+            "_id": 0,
+            "peluquero": 1,
+            "servicio": 1,
+            "estado": 1,
+            "momento": 1,
+            "dia": {"$subtract": [{"$isoDayOfWeek": "$momento"}, 1]},
+            "minuto": {"$add": [{"$multiply": [{"$hour": "$momento"}, 60]}, {"$minute": "$momento"}]}
+        }},
+        {"$facet": {
+            "historico": [
+                {"$match": {"momento": {"$gte": desde}}},
+                {"$group": {"_id": clave, "reservas": {"$sum": 1}}}
+            ],
+            "recientes": [
+                {"$match": {
+                    "momento": {"$gte": inicio_prevision},
+                    **FILTRO_RESERVA_ACTIVA
+                }},
+                {"$group": {
+                    "_id": {**clave, "semana": {"$floor": {"$divide": [{"$add": [dias, 3]}, 7]}}},
+                    "reservas": {"$sum": 1}
+                }}
+            ]
+        }}
+    ]
+
+
+def marco_grupos(grupos: list) -> pd.DataFrame:
+    """DataFrame columnar de los grupos agregados (semana -1 si no se agrupó por semana)"""
+    df = pd.DataFrame([{**g["_id"], "reservas": g["reservas"]} for g in grupos], columns=COLUMNAS)
+    df["semana"] = df["semana"].fillna(-1)
+    for c in ("dia", "minuto", "semana", "reservas"):
+        df[c] = df[c].astype(np.int64)
+    df["peluquero"] = pd.Categorical(df["peluquero"], categories=PELUQUEROS)
+    for c in ("servicio", "estado"):
+        df[c] = df[c].astype("category")
+    return df
+
+
+async def cargar_reservas(desde: datetime, hasta: datetime, semanas: int = 8, coleccion=None):
+    """(histórico, recientes): reservas con `momento` en [desde, hasta) agregadas en MongoDB"""
+    coleccion = db.reservas if coleccion is None else coleccion
+    resultado = await coleccion.aggregate(pipeline_ocupacion(desde, hasta, semanas)).to_list(length=None)
+    facetas = resultado[0] if resultado else {}
+    return marco_grupos(facetas.get("historico", [])), marco_grupos(facetas.get("recientes", []))
+
+
+def rejillas_por_dia(agenda):
+    """Minuto de apertura (-1 si cierra) y número de slots de cada día de la semana"""
+    inicios = np.full(7, -1, dtype=np.int64)
+    slots_dia = np.zeros(7, dtype=np.int64)
+    for dia, rejilla in agenda.rejillas.items():
+        inicios[dia] = rejilla.inicio
+        slots_dia[dia] = len(rejilla.horas)
+    return inicios, slots_dia
+
+
+def expandir_slots(df: pd.DataFrame, agenda):
+    """Arrays (peluquero, día, slot, semana, reservas) con una entrada por slot ocupado de cada grupo"""
+    inicios, slots_dia = rejillas_por_dia(agenda)
+    confirmadas = df[df["estado"] == FILTRO_RESERVA_ACTIVA["estado"]]
+
+    peluquero = confirmadas["peluquero"].cat.codes.to_numpy(np.int64)
+    dia = confirmadas["dia"].to_numpy(np.int64)
+    slot = (confirmadas["minuto"].to_numpy(np.int64) - inicios[dia]) // SLOT_MINUTOS
+    semana = confirmadas["semana"].to_numpy(np.int64)
+    reservas = confirmadas["reservas"].to_numpy(np.int64)
+    duracion = (
+        confirmadas["servicio"].astype(object).map(agenda.slots_servicio)
+        .fillna(1).to_numpy(np.int64)
+    )
+    validas = (peluquero >= 0) & (inicios[dia] >= 0) & (slot >= 0)
+
+    partes = []
+    for k in range(int(duracion.max(initial=0))):
+        sel = validas & (duracion > k) & (slot + k < slots_dia[dia])
+        partes.append((peluquero[sel], dia[sel], slot[sel] + k, semana[sel], reservas[sel]))
+    if not partes:
+        vacio = np.zeros(0, dtype=np.int64)
+        return vacio, vacio, vacio, vacio, vacio
+    return tuple(np.concatenate(columna) for columna in zip(*partes))
+
+
+def mapa_ocupacion(df: pd.DataFrame, agenda, desde: datetime, hasta: datetime) -> np.ndarray:
+    """Ocupación media (0-1) por peluquero × día de la semana × slot"""
+    _, slots_dia = rejillas_por_dia(agenda)
+    n_slots = int(slots_dia.max())
+    peluquero, dia, slot, _, reservas = expandir_slots(df, agenda)
+
+    plano = (peluquero * 7 + dia) * n_slots + slot
+    conteo = np.bincount(plano, weights=reservas, minlength=len(PELUQUEROS) * 7 * n_slots)
+    conteo = conteo.reshape(len(PELUQUEROS), 7, n_slots)
+
+    # Número de veces que aparece cada día de la semana en el rango
+    dias = np.arange(np.datetime64(desde.date()), np.datetime64(hasta.date()), dtype="datetime64[D]")
+    apariciones = np.bincount((dias.astype(np.int64) + 3) % 7, minlength=7)
+    return conteo / np.maximum(apariciones, 1)[None, :, None]
+
+
+def tasas_estado(df: pd.DataFrame) -> dict:
+    """Proporción de cada estado (confirmada, cancelada...) por peluquero"""
+    if df.empty:
+        return {}
+    tabla = pd.crosstab(
+        df["peluquero"], df["estado"].astype(object), values=df["reservas"], aggfunc="sum", normalize="index"
+    )
+    return {p: {e: round(float(v), 4) for e, v in fila.items()} for p, fila in tabla.iterrows()}
+
+
+def prevision_demanda(df: pd.DataFrame, agenda, hasta: datetime, semanas: int = 8, alfa: float = 0.5):
+    """Slots ocupados esperados la próxima semana (día × slot), media exponencial de las últimas `semanas`"""
+    _, slots_dia = rejillas_por_dia(agenda)
+    n_slots = int(slots_dia.max())
+    _, dia, slot, semana, reservas = expandir_slots(df, agenda)
+
+    ultima = semana_epoca(hasta.date()) - 1
+    desfase = ultima - semana
+    sel = (desfase >= 0) & (desfase < semanas)
+    plano = (desfase[sel] * 7 + dia[sel]) * n_slots + slot[sel]
+    conteo = np.bincount(plano, weights=reservas[sel], minlength=semanas * 7 * n_slots)
+    conteo = conteo.reshape(semanas, 7, n_slots)
+
+    # desfase 0 = semana más reciente, con el mayor peso
+    pesos = alfa * (1 - alfa) ** np.arange(semanas)
+    return np.tensordot(pesos / pesos.sum(), conteo, axes=1)
+
+
+def informe_ocupacion(
+    historico: pd.DataFrame, recientes: pd.DataFrame, agenda, desde: datetime, hasta: datetime, semanas: int = 8
+) -> dict:
+    """Informe a partir de los grupos de cargar_reservas"""
+    mapa = mapa_ocupacion(historico, agenda, desde, hasta)
+    prevision = prevision_demanda(recientes, agenda, hasta, semanas)
+    necesarios = np.minimum(np.ceil(prevision), len(PELUQUEROS)).astype(np.int64)
+
+    def por_dia(valores, convertir):
+        return {
+            DIAS_SEMANA[d]: {h: convertir(valores[d, i]) for i, h in enumerate(rejilla.horas)}
+            for d, rejilla in sorted(agenda.rejillas.items())
+        }
+
+    return {
+        "reservas_analizadas": int(historico["reservas"].sum()),
+        "ocupacion": {
+            p: por_dia(mapa[i], lambda v: round(float(v), 4)) for i, p in enumerate(PELUQUEROS)
+        },
+        "tasas_estado": tasas_estado(historico),
+        "prevision_semana": por_dia(prevision, lambda v: round(float(v), 2)),
+        "peluqueros_necesarios": por_dia(necesarios, int)
+    }
@@ -0,0 +1,159 @@
+"""Resúmenes materializados por día y por mes
+
+Cada documento de la colección `resumenes` acumula reservas, ingresos y gastos
+de un periodo (`_id` "dia:YYYY-MM-DD" o "mes:YYYY-MM"), con el desglose por
+peluquero. Los endpoints de escritura los mantienen con $inc; si alguna vez se
+desincronizan (o para cargar el histórico) se recalculan con:
+
+    python resumenes.py
+"""
+from pymongo import UpdateOne, ReplaceOne
+import asyncio
+
+from configuracion import PRECIOS
+from database import db, FILTRO_RESERVA_ACTIVA, notificar_escritura
+
+resumenes_collection = db.resumenes
+
+
+def periodos(fecha: str):
+    """Claves de los resúmenes (día y mes) a los que afecta un documento con `fecha`"""
+    return [("dia", fecha[:10]), ("mes", fecha[:7])]
+
+
+def resumen_vacio(tipo: str, periodo: str) -> dict:
+    return {
+        "_id": f"{tipo}:{periodo}",
+        "tipo": tipo,
+        "periodo": periodo,
+        "reservas": 0,
+        "ingresos": 0,
+        "gastos": 0,
+        "peluqueros": {}
+    }
+
+
+async def incrementar(pares):
+    """Aplica los incrementos de cada (fecha, incrementos) con un solo bulk_write
+
+    Los incrementos que caen en el mismo periodo se suman antes de escribir, así
+    que un lote de mil documentos del mismo mes son solo unas pocas operaciones.
+    """
+    acumulados = {}
+    for fecha, incrementos in pares:
+        for tipo, periodo in periodos(fecha):
+            suma = acumulados.setdefault((tipo, periodo), {})
+            for campo, valor in incrementos.items():
+                suma[campo] = suma.get(campo, 0) + valor
+    if not acumulados:
+        return
+
+    operaciones = [
+        UpdateOne(
+            {"_id": f"{tipo}:{periodo}"},
+            {"$inc": suma, "$setOnInsert": {"tipo": tipo, "periodo": periodo}},
+            upsert=True
+        )
+        for (tipo, periodo), suma in acumulados.items()
+    ]
+    try:
+        await resumenes_collection.bulk_write(operaciones, ordered=False)
+    except Exception as e:
+        # La escritura principal ya está hecha; el resumen se corrige reconstruyéndolo
+        print(f"Error actualizando resúmenes de {', '.join(sorted(p for _, p in acumulados))}: {str(e)}")
+    finally:
+        await notificar_escritura("resumenes")
+
+
+def incrementos_reserva(reserva: dict, signo: int = 1) -> dict:
+    precio = PRECIOS.get(reserva.get("servicio"), 0) * signo
+    peluquero = reserva.get("peluquero")
+    return {
+        "reservas": signo,
+        "ingresos": precio,
+        f"peluqueros.{peluquero}.reservas": signo,
+        f"peluqueros.{peluquero}.ingresos": precio
+    }
+
+
+async def registrar_reserva(reserva: dict, signo: int = 1):
+    """Suma (signo=1) o resta (signo=-1) una reserva confirmada a sus resúmenes"""
+    await registrar_reservas([reserva], signo)
+
+
+async def registrar_reservas(reservas: list, signo: int = 1):
+    await incrementar((r["fecha"], incrementos_reserva(r, signo)) for r in reservas)
+
+
+async def registrar_gasto(gasto: dict, signo: int = 1):
+    await registrar_gastos([gasto], signo)
+
+
+async def registrar_gastos(gastos: list, signo: int = 1):
+    await incrementar((g["fecha"], {"gastos": float(g.get("monto", 0)) * signo}) for g in gastos)
+
+
+async def obtener_resumenes(*claves: str) -> dict:
+    """Resúmenes por `_id`; los periodos sin actividad se devuelven vacíos"""
+    encontrados = {
+        r["_id"]: r async for r in resumenes_collection.find({"_id": {"$in": list(claves)}})
+    }
+    return {
+        clave: encontrados.get(clave) or resumen_vacio(*clave.split(":", 1))
+        for clave in claves
+    }
+
+
+async def reconstruir_resumenes() -> int:
+    """Recalcula todos los resúmenes a partir de reservas y gastos"""
+    acumulados = {}
+
+    def resumen(tipo, periodo):
+        clave = f"{tipo}:{periodo}"
+        if clave not in acumulados:
+            acumulados[clave] = resumen_vacio(tipo, periodo)
+        return acumulados[clave]
+
+    reservas = db.reservas.aggregate([
+        {"$match": FILTRO_RESERVA_ACTIVA},
+        {"$group": {
+            "_id": {"fecha": "$fecha", "peluquero": "$peluquero", "servicio": "$servicio"},
+            "total": {"$sum": 1}
+        }}
+    ])
+    async for grupo in reservas:
+        fecha = grupo["_id"].get("fecha")
+        if not isinstance(fecha, str):
+            continue
+        peluquero = grupo["_id"].get("peluquero")
+        ingresos = PRECIOS.get(grupo["_id"].get("servicio"), 0) * grupo["total"]
+        for tipo, periodo in periodos(fecha):
+            r = resumen(tipo, periodo)
+            r["reservas"] += grupo["total"]
+            r["ingresos"] += ingresos
+            por_peluquero = r["peluqueros"].setdefault(peluquero, {"reservas": 0, "ingresos": 0})
+            por_peluquero["reservas"] += grupo["total"]
+            por_peluquero["ingresos"] += ingresos
+
+    gastos = db.gastos.aggregate([
+        {"$group": {"_id": "$fecha", "total": {"$sum": "$monto"}}}
+    ])
+    async for grupo in gastos:
+        if not isinstance(grupo["_id"], str):
+            continue
+        for tipo, periodo in periodos(grupo["_id"]):
+            resumen(tipo, periodo)["gastos"] += grupo["total"]
+
+    if acumulados:
+        await resumenes_collection.bulk_write(
+            [ReplaceOne({"_id": clave}, r, upsert=True) for clave, r in acumulados.items()],
+            ordered=False
+        )
+    await resumenes_collection.delete_many({"_id": {"$nin": list(acumulados)}})
+    await notificar_escritura("resumenes")
+    return len(acumulados)
+
+
+if __name__ == "__main__":
+    total = asyncio.run(reconstruir_resumenes())
+    print(f"Resúmenes reconstruidos: {total}")
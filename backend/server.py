@@ -1,25 +1,94 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, File, HTTPException, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.encoders import jsonable_encoder
-from pydantic import BaseModel
-from pymongo import MongoClient
-from datetime import datetime, timedelta
+from pydantic import BaseModel, ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
 from typing import Optional, List
+import asyncio
 import os
 import uuid
 import json
 
-# Configuración de MongoDB
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017/')
-client = MongoClient(MONGO_URL)
-db = client.peluqueria
-reservas_collection = db.reservas
-proveedores_collection = db.proveedores
-gastos_collection = db.gastos
-inventario_collection = db.inventario
-empleados_collection = db.empleados
+from admision import ControlAdmision, MiddlewareAdmision
+from analitica import (
+    DIMENSIONES, sincronizar_catalogo, pipeline_analitica, capacidad, construir_serie
+)
+from cache import cache
+from configuracion import PELUQUEROS, SERVICIOS, HORARIOS
+from database import (
+    reservas_repo, proveedores_repo, gastos_repo, inventario_repo, empleados_repo,
+    movimientos_repo, FILTRO_RESERVA_ACTIVA, FILTRO_BAJO_STOCK, CLAVES_NATURALES, invalidaciones_collection,
+    versiones_confirmadas, cerrar_conexion
+)
+from disponibilidad import Agenda
+from eventos import flujo_eventos
+from etags import etag_coleccion, etag_contenido, no_modificado, respuesta_304, con_etag
+from exportacion import ESQUEMAS, FORMATOS, exportar
+from fechas import momento_reserva, momento_gasto, rango_mes
+from idempotencia import MiddlewareIdempotencia
+from importacion import importar_csv, importacion_exclusiva, ImportacionEnCurso
+from indices import asegurar_indices, IndiceNoCreado
+from invalidaciones import activar_canal, notificar_escritura
+from migraciones import migrar_fechas, migrar_versiones, migrar_margen_stock
+from paginacion import MAX_LIMITE, pagina, responder_listado
+from reportes import cargar_reservas, informe_ocupacion
+from resumenes import (
+    registrar_reserva, registrar_reservas, registrar_gasto, registrar_gastos,
+    obtener_resumenes, reconstruir_resumenes, resumenes_collection
+)
+from sincronizacion import cambios_desde
+from stock import (
+    CANAL, documento_movimiento, aplicar_movimiento, aplicar_lote, editar_producto, recuperar_movimientos,
+    avisar_umbral, avisar_recarga
+)
 
-app = FastAPI()
+# Procesos de uvicorn; los workers heredan la variable del proceso principal
+WORKERS = int(os.environ.get("WORKERS", "1"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        for r in await completar_franjas_reservas():
+            print(
+                f"Reserva {r['id']} ({r['fecha']} {r['hora']}, {r['peluquero']}) solapada con otra "
+                "anterior: queda fuera del índice de franjas, revísala"
+            )
+        await migrar_fechas()
+        await migrar_versiones()
+        await migrar_margen_stock()
+        await recuperar_movimientos()
+        await asegurar_indices()
+        await sincronizar_catalogo()
+        if not await resumenes_collection.estimated_document_count():
+            await reconstruir_resumenes()
+    except IndiceNoCreado:
+        # Sin los índices únicos la API aceptaría reservas dobles: no se arranca
+        raise
+    except Exception as e:
+        print(f"Error preparando la base de datos: {str(e)}")
+    # Con varios workers cada uno escucha las invalidaciones de los demás
+    escucha = await activar_canal(invalidaciones_collection) if WORKERS > 1 else None
+    yield
+    if escucha is not None:
+        escucha.cancel()
+    cerrar_conexion()
+
+# orjson para todas las respuestas; los listados grandes además devuelven la
+# Response ya construida para saltarse jsonable_encoder (ver paginacion.py)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# Reintentos con Idempotency-Key; por dentro de CORS para que sus respuestas
+# también lleven las cabeceras CORS
+app.add_middleware(MiddlewareIdempotencia)
+
+# Límites por cliente y tope de concurrencia, antes de cualquier trabajo (también
+# de la idempotencia, que consulta MongoDB); por dentro de CORS como la anterior
+admision = ControlAdmision(workers=WORKERS)
+app.add_middleware(MiddlewareAdmision, control=admision)
 
 # Configuración de CORS
 app.add_middleware(
@@ -51,6 +120,18 @@ class Reserva(BaseModel):
     hora: str
     estado: str = "confirmada"
     fecha_creacion: str
+    version: Optional[int] = None
+    actualizado: Optional[str] = None
+
+# Modelos de respuesta solo para la documentación OpenAPI (se declaran en
+# `responses`, no en `response_model`, para no volver a validar cada documento)
+class ReservaCreada(BaseModel):
+    message: str
+    reserva: Reserva
+
+class ListadoReservas(BaseModel):
+    reservas: List[Reserva]
+    siguiente: Optional[str] = None
 
 # Nuevos modelos para gestión completa
 class ProveedorCreate(BaseModel):
@@ -80,6 +161,24 @@ class ProductoInventario(BaseModel):
     proveedor_id: Optional[str] = None
     fecha_ultima_compra: Optional[str] = None
 
+class ProductoEdicion(BaseModel):
+    """Campos editables de un producto: el stock solo cambia con movimientos"""
+    nombre: str
+    categoria: str
+    stock_minimo: int
+    precio_compra: float
+    precio_venta: Optional[float] = None
+    proveedor_id: Optional[str] = None
+
+class MovimientoStock(BaseModel):
+    tipo: str  # venta, compra, ajuste (positivo o negativo)
+    cantidad: int
+    fecha: Optional[str] = None  # por defecto, hoy
+    nota: Optional[str] = None
+
+class MovimientoLote(MovimientoStock):
+    producto_id: str
+
 class EmpleadoCreate(BaseModel):
     nombre: str
     telefono: str
@@ -90,229 +189,607 @@ class EmpleadoCreate(BaseModel):
     horario: Optional[str] = None
     comision_porcentaje: Optional[float] = None
 
-# Datos de configuración
-PELUQUEROS = ["Andrés", "Alejandro", "Adrián"]
-SERVICIOS = [
-    {"nombre": "Corte de cabello", "duracion": 30, "precio": 15},
-    {"nombre": "Arreglo de barba", "duracion": 20, "precio": 10},
-    {"nombre": "Tinte", "duracion": 90, "precio": 45},
-    {"nombre": "Corte mujer", "duracion": 45, "precio": 25},
-    {"nombre": "Peinado", "duracion": 30, "precio": 20},
-    {"nombre": "Mechas", "duracion": 120, "precio": 60}
-]
-
-HORARIOS = {
-    "lunes": {"inicio": "10:00", "fin": "19:00"},
-    "martes": {"inicio": "10:00", "fin": "19:00"},
-    "miercoles": {"inicio": "10:00", "fin": "19:00"},
-    "jueves": {"inicio": "10:00", "fin": "19:00"},
-    "viernes": {"inicio": "10:00", "fin": "19:00"},
-    "sabado": {"inicio": "10:00", "fin": "14:00"}
-}
+agenda = Agenda(HORARIOS, SERVICIOS)
+
+ETAG_SERVICIOS = etag_contenido(SERVICIOS)
+ETAG_PELUQUEROS = etag_contenido(PELUQUEROS)
+
+# Tamaño máximo del rango que acepta /api/disponibilidad
+MAX_DIAS_DISPONIBILIDAD = 62
+
+# Orden de los listados: siempre termina en `id` para que la paginación por clave sea estable
+ORDEN_RESERVAS = [("fecha", 1), ("hora", 1), ("id", 1)]
+ORDEN_PROVEEDORES = [("nombre", 1), ("id", 1)]
+ORDEN_GASTOS = [("fecha", -1), ("id", -1)]
+ORDEN_INVENTARIO = [("nombre", 1), ("id", 1)]
+ORDEN_EMPLEADOS = [("nombre", 1), ("id", 1)]
+ORDEN_MOVIMIENTOS = [("fecha_creacion", -1), ("id", -1)]
+
+# Documentos por sección que devuelve /api/dashboard si no se indica otro límite
+LIMITE_DASHBOARD = 200
+
+# Elementos máximos por petición en los endpoints /lote
+MAX_LOTE = 1000
+
+# Rango máximo que acepta /api/analitica
+MAX_DIAS_ANALITICA = 731
+
+# Límites de /api/huecos-libres: huecos devueltos y días consultados por cada query
+MAX_HUECOS = 50
+DIAS_BLOQUE_BUSQUEDA = 7
+
+async def mascara_ocupacion(fecha: str, peluquero: str, rejilla):
+    """Mapa de bits de ocupación de un peluquero en una fecha (una sola consulta proyectada)
+
+    Se guarda en caché por (fecha, peluquero); crear o cancelar una reserva
+    invalida solo esa entrada.
+    """
+    async def calcular():
+        reservas = await reservas_repo.listar(
+            {"fecha": fecha, "peluquero": peluquero, **FILTRO_RESERVA_ACTIVA},
+            proyeccion={"hora": 1, "servicio": 1}
+        )
+        return agenda.mascara_ocupacion(rejilla, reservas)
+    return await cache.obtener(("ocupacion", fecha, peluquero), calcular)
+
+async def invalidar_ocupacion(fecha: str, peluquero: str, evento=None):
+    await notificar_escritura("reservas", ("ocupacion", fecha, peluquero), evento)
+
+def evento_franjas(tipo: str, reserva: dict) -> dict:
+    """Evento "ocupado"/"liberado" con las franjas de una reserva, para los suscriptores"""
+    return {
+        "tipo": tipo,
+        "fecha": reserva["fecha"],
+        "peluquero": reserva["peluquero"],
+        "hora": reserva["hora"],
+        "servicio": reserva.get("servicio"),
+        "franjas": reserva.get("franjas") or [reserva["hora"]]
+    }
+
+def documento_reserva(reserva: ReservaCreate) -> dict:
+    """Documento de una reserva nueva; ValueError con el motivo si no se puede crear"""
+    if reserva.peluquero not in PELUQUEROS:
+        raise ValueError("Peluquero no válido")
+    
+    if reserva.servicio not in agenda.slots_servicio:
+        raise ValueError("Servicio no válido")
+    
+    # El horario debe existir y el servicio terminar antes del cierre; la ocupación
+    # la comprueba el índice único al insertar, sin lectura previa
+    rejilla = agenda.rejilla(reserva.fecha)
+    franjas = agenda.franjas(rejilla, reserva.hora, agenda.slots(reserva.servicio)) if rejilla else None
+    if not franjas:
+        raise ValueError("Horario no disponible")
+    
+    # Solo datos simples sin objetos complejos
+    return {
+        "id": str(uuid.uuid4()),
+        "cliente_nombre": str(reserva.cliente_nombre),
+        "cliente_telefono": str(reserva.cliente_telefono),
+        "cliente_email": str(reserva.cliente_email) if reserva.cliente_email else None,
+        "servicio": str(reserva.servicio),
+        "peluquero": str(reserva.peluquero),
+        "fecha": str(reserva.fecha),
+        "hora": str(reserva.hora),
+        "estado": "confirmada",
+        "franjas": franjas,
+        "momento": momento_reserva(reserva.fecha, reserva.hora),
+        "fecha_creacion": datetime.now().isoformat()
+    }
+
+def documento_gasto(gasto: GastoCreate) -> dict:
+    """Documento de un gasto nuevo; ValueError si la fecha no es válida"""
+    try:
+        momento = momento_gasto(gasto.fecha)
+    except ValueError:
+        raise ValueError("Fecha no válida")
+    
+    return {
+        "id": str(uuid.uuid4()),
+        "concepto": str(gasto.concepto),
+        "categoria": str(gasto.categoria),
+        "monto": float(gasto.monto),
+        "fecha": str(gasto.fecha),
+        "proveedor_id": str(gasto.proveedor_id) if gasto.proveedor_id else None,
+        "descripcion": str(gasto.descripcion) if gasto.descripcion else None,
+        "metodo_pago": str(gasto.metodo_pago),
+        "momento": momento,
+        "fecha_creacion": datetime.now().isoformat()
+    }
+
+def documento_producto(producto: ProductoInventario) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "nombre": str(producto.nombre),
+        "categoria": str(producto.categoria),
+        "stock_actual": int(producto.stock_actual),
+        "stock_minimo": int(producto.stock_minimo),
+        "precio_compra": float(producto.precio_compra),
+        "precio_venta": float(producto.precio_venta) if producto.precio_venta else None,
+        "proveedor_id": str(producto.proveedor_id) if producto.proveedor_id else None,
+        "fecha_ultima_compra": str(producto.fecha_ultima_compra) if producto.fecha_ultima_compra else None,
+        "margen_stock": int(producto.stock_actual) - int(producto.stock_minimo),
+        "fecha_creacion": datetime.now().isoformat()
+    }
+
+def documento_proveedor(proveedor: ProveedorCreate) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "nombre": str(proveedor.nombre),
+        "contacto": str(proveedor.contacto),
+        "telefono": str(proveedor.telefono),
+        "email": str(proveedor.email) if proveedor.email else None,
+        "direccion": str(proveedor.direccion) if proveedor.direccion else None,
+        "categoria": str(proveedor.categoria),
+        "fecha_creacion": datetime.now().isoformat()
+    }
 
-def generar_horarios_disponibles(fecha: str, peluquero: str):
+def documento_empleado(empleado: EmpleadoCreate) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "nombre": str(empleado.nombre),
+        "telefono": str(empleado.telefono),
+        "email": str(empleado.email) if empleado.email else None,
+        "puesto": str(empleado.puesto),
+        "salario": float(empleado.salario),
+        "fecha_ingreso": str(empleado.fecha_ingreso),
+        "horario": str(empleado.horario) if empleado.horario else None,
+        "comision_porcentaje": float(empleado.comision_porcentaje) if empleado.comision_porcentaje else None,
+        "estado": "activo",
+        "fecha_creacion": datetime.now().isoformat()
+    }
+
+def validar_lote(items: list, modelo, construir, ordenado: bool):
+    """Valida cada elemento con `modelo` y construye su documento con `construir`
+
+    Devuelve los resultados ya conocidos (los inválidos) por índice y los
+    documentos válidos con su índice. Con `ordenado`, lo que sigue al primer
+    elemento inválido no se procesa.
+    """
+    if not 1 <= len(items) <= MAX_LOTE:
+        raise HTTPException(status_code=400, detail=f"El lote debe tener entre 1 y {MAX_LOTE} elementos")
+    
+    resultados = {}
+    validos = []
+    for indice, item in enumerate(items):
+        try:
+            validos.append((indice, construir(modelo.model_validate(item))))
+            continue
+        except ValidationError as e:
+            resultados[indice] = {
+                "indice": indice,
+                "estado": "invalido",
+                "detalle": e.errors(include_url=False, include_context=False)
+            }
+        except ValueError as e:
+            resultados[indice] = {"indice": indice, "estado": "invalido", "detalle": str(e)}
+        if ordenado:
+            for resto in range(indice + 1, len(items)):
+                resultados[resto] = {"indice": resto, "estado": "no_procesado"}
+            break
+    return resultados, validos
+
+async def insertar_lote(repo, resultados: dict, validos: list, ordenado: bool, duplicado: str):
+    """Inserta los documentos válidos en una sola operación y completa `resultados`
+
+    Devuelve los documentos insertados. Un error de clave duplicada (en las
+    reservas, una franja ya ocupada) se informa como "conflicto".
+    """
+    errores = await repo.insertar_lote([documento for _, documento in validos], ordenado)
+    primer_error = min(errores, default=None)
+    insertados = []
+    for posicion, (indice, documento) in enumerate(validos):
+        error = errores.get(posicion)
+        if error is not None:
+            conflicto = error.get("code") == 11000
+            resultados[indice] = {
+                "indice": indice,
+                "estado": "conflicto" if conflicto else "error",
+                "detalle": duplicado if conflicto else error.get("errmsg")
+            }
+        elif ordenado and primer_error is not None and posicion > primer_error:
+            resultados[indice] = {"indice": indice, "estado": "no_procesado"}
+        else:
+            resultados[indice] = {"indice": indice, "estado": "creado", "id": documento["id"]}
+            insertados.append(documento)
+    return insertados
+
+def respuesta_lote(resultados: dict) -> dict:
+    lista = [resultados[i] for i in sorted(resultados)]
+    return {
+        "creados": sum(r["estado"] == "creado" for r in lista),
+        "fallidos": sum(r["estado"] != "creado" for r in lista),
+        "resultados": lista
+    }
+
+async def reservas_por_dia(desde: str, hasta: str, peluqueros: list):
+    """Agrupa en una sola agregación las reservas de un rango por (fecha, peluquero)"""
+    grupos = await reservas_repo.agregar([
+        {"$match": {
+            "fecha": {"$gte": desde, "$lte": hasta},
+            "peluquero": {"$in": peluqueros},
+            **FILTRO_RESERVA_ACTIVA
+        }},
+        {"$group": {
+            "_id": {"fecha": "$fecha", "peluquero": "$peluquero"},
+            "reservas": {"$push": {"hora": "$hora", "servicio": "$servicio"}}
+        }}
+    ])
+    return {(g["_id"]["fecha"], g["_id"]["peluquero"]): g["reservas"] for g in grupos}
+
+async def generar_horarios_disponibles(fecha: str, peluquero: str, servicio: Optional[str] = None):
     """Genera horarios disponibles para una fecha y peluquero específico"""
     try:
-        fecha_obj = datetime.strptime(fecha, "%Y-%m-%d")
-        day_name = fecha_obj.strftime("%A").lower()
-        
-        # Mapear nombres de días al español
-        dias_semana = {
-            "monday": "lunes",
-            "tuesday": "martes", 
-            "wednesday": "miercoles",
-            "thursday": "jueves",
-            "friday": "viernes",
-            "saturday": "sabado",
-            "sunday": "domingo"
-        }
-        
-        dia_esp = dias_semana.get(day_name)
-        
-        if dia_esp not in HORARIOS:
+        rejilla = agenda.rejilla(fecha)
+        if rejilla is None:
             return []
         
-        horario = HORARIOS[dia_esp]
-        inicio = datetime.strptime(horario["inicio"], "%H:%M")
-        fin = datetime.strptime(horario["fin"], "%H:%M")
-        
-        # Generar slots cada 30 minutos
-        horarios = []
-        current = inicio
-        while current < fin:
-            horarios.append(current.strftime("%H:%M"))
-            current += timedelta(minutes=30)
-        
-        # Filtrar horarios ya ocupados
-        reservas_existentes = list(reservas_collection.find({
-            "fecha": fecha,
-            "peluquero": peluquero
-        }))
-        
-        horarios_ocupados = [r["hora"] for r in reservas_existentes]
-        horarios_disponibles = [h for h in horarios if h not in horarios_ocupados]
-        
-        return horarios_disponibles
+        mascara = await mascara_ocupacion(fecha, peluquero, rejilla)
+        return agenda.horas_libres(rejilla, mascara, agenda.slots(servicio))
         
     except Exception as e:
         return []
 
+async def completar_franjas_reservas() -> list:
+    """Rellena `franjas` en reservas antiguas para que queden cubiertas por el índice único
+
+    Antes del índice solo se bloqueaba la franja de inicio y se comprobaba antes
+    de insertar, así que puede haber reservas activas solapadas. De cada solape
+    se queda las franjas la reserva creada antes; las demás se dejan sin
+    `franjas` (fuera del índice) y se devuelven para revisarlas a mano.
+    """
+    operaciones = []
+    solapadas = []
+    clave_actual, ocupadas = None, set()
+    async for r in reservas_repo.recorrer(
+        {"franjas": {"$exists": False}},
+        orden=[("fecha", 1), ("peluquero", 1), ("fecha_creacion", 1), ("id", 1)],
+        proyeccion={"id": 1, "fecha": 1, "hora": 1, "servicio": 1, "peluquero": 1, "estado": 1}
+    ):
+        rejilla = agenda.rejilla(r.get("fecha", ""))
+        franjas = agenda.franjas(rejilla, r.get("hora"), agenda.slots(r.get("servicio"))) if rejilla else None
+        if not franjas:
+            continue
+        if r.get("estado") == FILTRO_RESERVA_ACTIVA["estado"]:
+            clave = (r.get("fecha"), r.get("peluquero"))
+            if clave != clave_actual:
+                # Franjas que ya tienen las reservas activas de ese día y peluquero
+                clave_actual, ocupadas = clave, {
+                    f for d in await reservas_repo.listar(
+                        {**FILTRO_RESERVA_ACTIVA, "fecha": clave[0], "peluquero": clave[1],
+                         "franjas": {"$exists": True}},
+                        proyeccion={"franjas": 1}
+                    ) for f in d["franjas"]
+                }
+            if ocupadas.intersection(franjas):
+                solapadas.append(r)
+                continue
+            ocupadas.update(franjas)
+        operaciones.append(UpdateOne({"id": r["id"]}, {"$set": {"franjas": franjas}}))
+        if len(operaciones) >= 500:
+            await reservas_repo.escribir_lote(operaciones, ordenado=False)
+            operaciones = []
+    if operaciones:
+        await reservas_repo.escribir_lote(operaciones, ordenado=False)
+    return solapadas
+
 @app.get("/api/")
 async def root():
     return {"message": "API Peluquería funcionando correctamente"}
 
 @app.get("/api/servicios")
-async def get_servicios():
-    return {"servicios": SERVICIOS}
+async def get_servicios(request: Request, response: Response):
+    if no_modificado(request, ETAG_SERVICIOS):
+        return respuesta_304(ETAG_SERVICIOS)
+    return con_etag({"servicios": SERVICIOS}, ETAG_SERVICIOS, response)
 
 @app.get("/api/peluqueros")
-async def get_peluqueros():
-    return {"peluqueros": PELUQUEROS}
+async def get_peluqueros(request: Request, response: Response):
+    if no_modificado(request, ETAG_PELUQUEROS):
+        return respuesta_304(ETAG_PELUQUEROS)
+    return con_etag({"peluqueros": PELUQUEROS}, ETAG_PELUQUEROS, response)
 
 @app.get("/api/horarios-disponibles/{fecha}/{peluquero}")
-async def get_horarios_disponibles(fecha: str, peluquero: str):
+async def get_horarios_disponibles(fecha: str, peluquero: str, servicio: Optional[str] = None):
     if peluquero not in PELUQUEROS:
         raise HTTPException(status_code=400, detail="Peluquero no válido")
     
-    horarios = generar_horarios_disponibles(fecha, peluquero)
+    if servicio is not None and servicio not in agenda.slots_servicio:
+        raise HTTPException(status_code=400, detail="Servicio no válido")
+    
+    horarios = await generar_horarios_disponibles(fecha, peluquero, servicio)
     return {"horarios": horarios}
 
-@app.post("/api/reservas")
-async def crear_reserva(reserva: ReservaCreate):
-    # Validaciones
-    if reserva.peluquero not in PELUQUEROS:
+@app.get("/api/horarios-disponibles/{fecha}/{peluquero}/eventos")
+async def eventos_horarios(request: Request, fecha: str, peluquero: str):
+    """Flujo SSE con las franjas que se ocupan ("ocupado") o liberan ("liberado") en el día"""
+    if peluquero not in PELUQUEROS:
+        raise HTTPException(status_code=400, detail="Peluquero no válido")
+
+    try:
+        date.fromisoformat(fecha)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha no válida")
+
+    return StreamingResponse(
+        flujo_eventos(request, (fecha, peluquero), {"fecha": fecha, "peluquero": peluquero}),
+        media_type="text/event-stream",
+        # Sin buffer en proxies (nginx) para que cada evento llegue al momento
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/disponibilidad")
+async def get_disponibilidad(
+    desde: str,
+    hasta: str,
+    peluquero: Optional[str] = None,
+    servicio: Optional[str] = None
+):
+    """Horarios libres de cada día del rango y cada peluquero con una sola consulta"""
+    if peluquero is not None and peluquero not in PELUQUEROS:
         raise HTTPException(status_code=400, detail="Peluquero no válido")
     
-    servicios_validos = [s["nombre"] for s in SERVICIOS]
-    if reserva.servicio not in servicios_validos:
+    if servicio is not None and servicio not in agenda.slots_servicio:
         raise HTTPException(status_code=400, detail="Servicio no válido")
     
-    # Verificar disponibilidad del horario
-    horarios_disponibles = generar_horarios_disponibles(reserva.fecha, reserva.peluquero)
-    if reserva.hora not in horarios_disponibles:
-        raise HTTPException(status_code=400, detail="Horario no disponible")
+    try:
+        fecha_desde = date.fromisoformat(desde)
+        fecha_hasta = date.fromisoformat(hasta)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha no válida")
     
-    # Crear la reserva - solo datos simples sin objetos complejos
-    reserva_id = str(uuid.uuid4())
-    nueva_reserva = {
-        "id": reserva_id,
-        "cliente_nombre": str(reserva.cliente_nombre),
-        "cliente_telefono": str(reserva.cliente_telefono),
-        "cliente_email": str(reserva.cliente_email) if reserva.cliente_email else None,
-        "servicio": str(reserva.servicio),
-        "peluquero": str(reserva.peluquero),
-        "fecha": str(reserva.fecha),
-        "hora": str(reserva.hora),
-        "estado": "confirmada",
-        "fecha_creacion": datetime.now().isoformat()
-    }
+    dias = (fecha_hasta - fecha_desde).days + 1
+    if dias < 1 or dias > MAX_DIAS_DISPONIBILIDAD:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El rango debe tener entre 1 y {MAX_DIAS_DISPONIBILIDAD} días"
+        )
+    
+    peluqueros = [peluquero] if peluquero else PELUQUEROS
+    slots = agenda.slots(servicio)
+    
+    try:
+        reservas = await reservas_por_dia(fecha_desde.isoformat(), fecha_hasta.isoformat(), peluqueros)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener disponibilidad: {str(e)}")
+    
+    disponibilidad = {}
+    for i in range(dias):
+        fecha = (fecha_desde + timedelta(days=i)).isoformat()
+        rejilla = agenda.rejilla(fecha)
+        disponibilidad[fecha] = {
+            p: agenda.horas_libres(
+                rejilla, agenda.mascara_ocupacion(rejilla, reservas.get((fecha, p), [])), slots
+            ) if rejilla else []
+            for p in peluqueros
+        }
+    
+    return {"disponibilidad": disponibilidad}
+
+@app.get("/api/huecos-libres")
+async def buscar_huecos_libres(
+    servicio: str,
+    n: int = 5,
+    desde: Optional[str] = None,
+    dias: int = 14,
+    peluquero: Optional[str] = None
+):
+    """Primeros `n` huecos donde cabe el servicio, con cualquier peluquero, dentro del horizonte"""
+    if servicio not in agenda.slots_servicio:
+        raise HTTPException(status_code=400, detail="Servicio no válido")
+    
+    if peluquero is not None and peluquero not in PELUQUEROS:
+        raise HTTPException(status_code=400, detail="Peluquero no válido")
+    
+    if not 1 <= n <= MAX_HUECOS or not 1 <= dias <= MAX_DIAS_DISPONIBILIDAD:
+        raise HTTPException(
+            status_code=400,
+            detail=f"n debe estar entre 1 y {MAX_HUECOS} y dias entre 1 y {MAX_DIAS_DISPONIBILIDAD}"
+        )
+    
+    ahora = datetime.now()
+    try:
+        inicio = date.fromisoformat(desde) if desde else ahora.date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha no válida")
+    # Los días pasados no tienen huecos reservables
+    inicio = max(inicio, ahora.date())
+    
+    peluqueros = [peluquero] if peluquero else PELUQUEROS
+    slots = agenda.slots(servicio)
+    huecos = []
+    
+    try:
+        # Se consulta por bloques de días y se para en cuanto hay `n` huecos
+        for bloque in range(0, dias, DIAS_BLOQUE_BUSQUEDA):
+            fechas = [
+                (inicio + timedelta(days=i)).isoformat()
+                for i in range(bloque, min(bloque + DIAS_BLOQUE_BUSQUEDA, dias))
+            ]
+            fechas = [f for f in fechas if agenda.rejilla(f) is not None]
+            if not fechas:
+                continue
+            
+            reservas = await reservas_por_dia(fechas[0], fechas[-1], peluqueros)
+            for fecha in fechas:
+                rejilla = agenda.rejilla(fecha)
+                permitidos = rejilla.completa
+                if fecha == ahora.date().isoformat():
+                    permitidos = agenda.desde_minuto(rejilla, ahora.hour * 60 + ahora.minute + 1)
+                
+                libres = {
+                    p: agenda.inicios_libres(
+                        rejilla, agenda.mascara_ocupacion(rejilla, reservas.get((fecha, p), [])), slots
+                    ) & permitidos
+                    for p in peluqueros
+                }
+                for i, hora in enumerate(rejilla.horas):
+                    for p in peluqueros:
+                        if libres[p] >> i & 1:
+                            huecos.append({"fecha": fecha, "hora": hora, "peluquero": p})
+                            if len(huecos) == n:
+                                return {"servicio": servicio, "huecos": huecos}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al buscar huecos libres: {str(e)}")
+    
+    return {"servicio": servicio, "huecos": huecos}
+
+@app.post("/api/reservas", responses={200: {"model": ReservaCreada}})
+async def crear_reserva(reserva: ReservaCreate):
+    try:
+        nueva_reserva = documento_reserva(reserva)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     try:
         # Insertar en MongoDB
-        result = reservas_collection.insert_one(nueva_reserva)
+        try:
+            result = await reservas_repo.insertar(nueva_reserva)
+        except Exception:
+            # También si otra reserva ganó la franja: la ocupación en caché ya no vale
+            await invalidar_ocupacion(nueva_reserva["fecha"], nueva_reserva["peluquero"])
+            raise
+        await invalidar_ocupacion(
+            nueva_reserva["fecha"], nueva_reserva["peluquero"], evento_franjas("ocupado", nueva_reserva)
+        )
         
         if result.inserted_id:
-            # Crear respuesta limpia sin ObjectId
-            reserva_respuesta = {
-                "id": reserva_id,
-                "cliente_nombre": nueva_reserva["cliente_nombre"],
-                "cliente_telefono": nueva_reserva["cliente_telefono"],
-                "cliente_email": nueva_reserva["cliente_email"],
-                "servicio": nueva_reserva["servicio"],
-                "peluquero": nueva_reserva["peluquero"],
-                "fecha": nueva_reserva["fecha"],
-                "hora": nueva_reserva["hora"],
-                "estado": nueva_reserva["estado"],
-                "fecha_creacion": nueva_reserva["fecha_creacion"]
-            }
+            await registrar_reserva(nueva_reserva)
             
             return {
                 "message": "Reserva creada exitosamente", 
-                "reserva": reserva_respuesta
+                "reserva": reservas_repo.publico(nueva_reserva)
             }
         else:
             raise HTTPException(status_code=500, detail="Error al crear la reserva")
             
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Horario no disponible")
     except Exception as e:
         print(f"Error creating reservation: {str(e)}")
         print(f"Reservation data: {nueva_reserva}")
         raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(e)[:100]}")
 
-@app.get("/api/reservas")
-async def get_reservas():
+@app.post("/api/reservas/lote")
+async def crear_reservas_lote(items: List[dict], ordenado: bool = False):
+    """Crea varias reservas con una sola escritura e informa del resultado de cada una
+
+    Una franja ya ocupada (en la base de datos o por otra reserva del mismo
+    lote) se devuelve como "conflicto".
+    """
+    resultados, validos = validar_lote(items, ReservaCreate, documento_reserva, ordenado)
+    insertadas = []
     try:
-        reservas = list(reservas_collection.find({}, {"_id": 0}).sort("fecha", 1).sort("hora", 1))
-        return {"reservas": reservas}
+        insertadas = await insertar_lote(
+            reservas_repo, resultados, validos, ordenado, "Horario no disponible"
+        )
+        await registrar_reservas(insertadas)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(e)[:100]}")
+    finally:
+        # Toda la ocupación tocada por el lote deja de valer, haya ido bien o no
+        pendientes = {(d["fecha"], d["peluquero"]) for _, d in validos}
+        for reserva in insertadas:
+            await invalidar_ocupacion(
+                reserva["fecha"], reserva["peluquero"], evento_franjas("ocupado", reserva)
+            )
+            pendientes.discard((reserva["fecha"], reserva["peluquero"]))
+        for fecha, peluquero in pendientes:
+            await invalidar_ocupacion(fecha, peluquero)
+    
+    return respuesta_lote(resultados)
+
+@app.get("/api/reservas", responses={200: {"model": ListadoReservas}})
+async def get_reservas(
+    request: Request,
+    response: Response,
+    limite: Optional[int] = None,
+    cursor: Optional[str] = None
+):
+    etiqueta = etag_coleccion("reservas", request, await versiones_confirmadas())
+    if no_modificado(request, etiqueta):
+        return respuesta_304(etiqueta)
+    
+    try:
+        return con_etag(await responder_listado(
+            request, reservas_repo, "reservas", ORDEN_RESERVAS, limite=limite, cursor=cursor
+        ), etiqueta, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener reservas: {str(e)}")
 
 @app.get("/api/reservas/{fecha}")
 async def get_reservas_fecha(fecha: str):
     try:
-        reservas = list(reservas_collection.find({"fecha": fecha}, {"_id": 0}).sort("hora", 1))
-        return {"reservas": reservas}
+        reservas = await reservas_repo.listar({"fecha": fecha}, orden=[("hora", 1)])
+        return ORJSONResponse({"reservas": reservas})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener reservas: {str(e)}")
 
 # ========== ENDPOINTS PARA PROVEEDORES ==========
 @app.post("/api/proveedores")
 async def crear_proveedor(proveedor: ProveedorCreate):
-    proveedor_id = str(uuid.uuid4())
-    nuevo_proveedor = {
-        "id": proveedor_id,
-        "nombre": str(proveedor.nombre),
-        "contacto": str(proveedor.contacto),
-        "telefono": str(proveedor.telefono),
-        "email": str(proveedor.email) if proveedor.email else None,
-        "direccion": str(proveedor.direccion) if proveedor.direccion else None,
-        "categoria": str(proveedor.categoria),
-        "fecha_creacion": datetime.now().isoformat()
-    }
+    nuevo_proveedor = documento_proveedor(proveedor)
     
     try:
-        result = proveedores_collection.insert_one(nuevo_proveedor)
+        result = await proveedores_repo.insertar(nuevo_proveedor)
         if result.inserted_id:
-            proveedor_respuesta = {key: value for key, value in nuevo_proveedor.items()}
-            return {"message": "Proveedor creado exitosamente", "proveedor": proveedor_respuesta}
+            # insertar() guarda una copia: el dict no ha recibido _id
+            return {"message": "Proveedor creado exitosamente", "proveedor": nuevo_proveedor}
         else:
             raise HTTPException(status_code=500, detail="Error al crear el proveedor")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(e)}")
 
 @app.get("/api/proveedores")
-async def get_proveedores():
+async def get_proveedores(
+    request: Request,
+    response: Response,
+    limite: Optional[int] = None,
+    cursor: Optional[str] = None
+):
+    etiqueta = etag_coleccion("proveedores", request, await versiones_confirmadas())
+    if no_modificado(request, etiqueta):
+        return respuesta_304(etiqueta)
+    
     try:
-        proveedores = list(proveedores_collection.find({}, {"_id": 0}).sort("nombre", 1))
-        return {"proveedores": proveedores}
+        return con_etag(await responder_listado(
+            request, proveedores_repo, "proveedores", ORDEN_PROVEEDORES, limite=limite, cursor=cursor
+        ), etiqueta, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener proveedores: {str(e)}")
 
 @app.put("/api/proveedores/{proveedor_id}")
 async def actualizar_proveedor(proveedor_id: str, proveedor: ProveedorCreate):
     try:
-        resultado = proveedores_collection.update_one(
-            {"id": proveedor_id},
-            {"$set": {
+        resultado = await proveedores_repo.actualizar(
+            proveedor_id,
+            {
                 "nombre": str(proveedor.nombre),
                 "contacto": str(proveedor.contacto),
                 "telefono": str(proveedor.telefono),
                 "email": str(proveedor.email) if proveedor.email else None,
                 "direccion": str(proveedor.direccion) if proveedor.direccion else None,
                 "categoria": str(proveedor.categoria)
-            }}
+            }
         )
         
         if resultado.matched_count == 0:
             raise HTTPException(status_code=404, detail="Proveedor no encontrado")
         
         return {"message": "Proveedor actualizado exitosamente"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al actualizar proveedor: {str(e)}")
 
 @app.delete("/api/proveedores/{proveedor_id}")
 async def eliminar_proveedor(proveedor_id: str):
     try:
-        resultado = proveedores_collection.delete_one({"id": proveedor_id})
+        resultado = await proveedores_repo.eliminar(proveedor_id)
         
         if resultado.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Proveedor no encontrado")
@@ -324,134 +801,258 @@ async def eliminar_proveedor(proveedor_id: str):
 # ========== ENDPOINTS PARA GASTOS ==========
 @app.post("/api/gastos")
 async def crear_gasto(gasto: GastoCreate):
-    gasto_id = str(uuid.uuid4())
-    nuevo_gasto = {
-        "id": gasto_id,
-        "concepto": str(gasto.concepto),
-        "categoria": str(gasto.categoria),
-        "monto": float(gasto.monto),
-        "fecha": str(gasto.fecha),
-        "proveedor_id": str(gasto.proveedor_id) if gasto.proveedor_id else None,
-        "descripcion": str(gasto.descripcion) if gasto.descripcion else None,
-        "metodo_pago": str(gasto.metodo_pago),
-        "fecha_creacion": datetime.now().isoformat()
-    }
+    try:
+        nuevo_gasto = documento_gasto(gasto)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     try:
-        result = gastos_collection.insert_one(nuevo_gasto)
+        result = await gastos_repo.insertar(nuevo_gasto)
         if result.inserted_id:
-            gasto_respuesta = {key: value for key, value in nuevo_gasto.items()}
-            return {"message": "Gasto registrado exitosamente", "gasto": gasto_respuesta}
+            await registrar_gasto(nuevo_gasto)
+            return {"message": "Gasto registrado exitosamente", "gasto": gastos_repo.publico(nuevo_gasto)}
         else:
             raise HTTPException(status_code=500, detail="Error al registrar el gasto")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(e)}")
 
+@app.post("/api/gastos/lote")
+async def crear_gastos_lote(items: List[dict], ordenado: bool = False):
+    """Registra varios gastos con una sola escritura e informa del resultado de cada uno"""
+    resultados, validos = validar_lote(items, GastoCreate, documento_gasto, ordenado)
+    try:
+        insertados = await insertar_lote(gastos_repo, resultados, validos, ordenado, "Gasto duplicado")
+        await registrar_gastos(insertados)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(e)}")
+    return respuesta_lote(resultados)
+
 @app.get("/api/gastos")
-async def get_gastos():
+async def get_gastos(
+    request: Request,
+    response: Response,
+    limite: Optional[int] = None,
+    cursor: Optional[str] = None
+):
+    etiqueta = etag_coleccion("gastos", request, await versiones_confirmadas())
+    if no_modificado(request, etiqueta):
+        return respuesta_304(etiqueta)
+    
     try:
-        gastos = list(gastos_collection.find({}, {"_id": 0}).sort("fecha", -1))
-        return {"gastos": gastos}
+        return con_etag(await responder_listado(
+            request, gastos_repo, "gastos", ORDEN_GASTOS, limite=limite, cursor=cursor
+        ), etiqueta, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener gastos: {str(e)}")
 
 @app.get("/api/gastos/{mes}")
 async def get_gastos_mes(mes: str):
+    # mes formato YYYY-MM
     try:
-        # mes formato YYYY-MM
-        gastos = list(gastos_collection.find(
-            {"fecha": {"$regex": f"^{mes}"}}, 
-            {"_id": 0}
-        ).sort("fecha", -1))
-        return {"gastos": gastos}
+        rango = rango_mes(mes)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Mes no válido, formato YYYY-MM")
+    
+    try:
+        gastos = await gastos_repo.listar(
+            {"momento": rango},
+            orden=[("momento", -1)]
+        )
+        return ORJSONResponse({"gastos": gastos})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener gastos del mes: {str(e)}")
 
 @app.delete("/api/gastos/{gasto_id}")
 async def eliminar_gasto(gasto_id: str):
     try:
-        resultado = gastos_collection.delete_one({"id": gasto_id})
+        gasto = await gastos_repo.extraer(gasto_id)
         
-        if resultado.deleted_count == 0:
+        if gasto is None:
             raise HTTPException(status_code=404, detail="Gasto no encontrado")
         
+        await registrar_gasto(gasto, -1)
         return {"message": "Gasto eliminado exitosamente"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al eliminar gasto: {str(e)}")
 
 # ========== ENDPOINTS PARA INVENTARIO ==========
 @app.post("/api/inventario")
 async def crear_producto(producto: ProductoInventario):
-    producto_id = str(uuid.uuid4())
-    nuevo_producto = {
-        "id": producto_id,
-        "nombre": str(producto.nombre),
-        "categoria": str(producto.categoria),
-        "stock_actual": int(producto.stock_actual),
-        "stock_minimo": int(producto.stock_minimo),
-        "precio_compra": float(producto.precio_compra),
-        "precio_venta": float(producto.precio_venta) if producto.precio_venta else None,
-        "proveedor_id": str(producto.proveedor_id) if producto.proveedor_id else None,
-        "fecha_ultima_compra": str(producto.fecha_ultima_compra) if producto.fecha_ultima_compra else None,
-        "fecha_creacion": datetime.now().isoformat()
-    }
+    nuevo_producto = documento_producto(producto)
     
     try:
-        result = inventario_collection.insert_one(nuevo_producto)
+        result = await inventario_repo.insertar(nuevo_producto)
         if result.inserted_id:
-            producto_respuesta = {key: value for key, value in nuevo_producto.items()}
-            return {"message": "Producto añadido al inventario", "producto": producto_respuesta}
+            await avisar_umbral(nuevo_producto)
+            return {"message": "Producto añadido al inventario", "producto": inventario_repo.publico(nuevo_producto)}
         else:
             raise HTTPException(status_code=500, detail="Error al añadir producto")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(e)}")
 
+@app.post("/api/inventario/lote")
+async def crear_productos_lote(items: List[dict], ordenado: bool = False):
+    """Añade varios productos con una sola escritura e informa del resultado de cada uno"""
+    resultados, validos = validar_lote(items, ProductoInventario, documento_producto, ordenado)
+    try:
+        for producto in await insertar_lote(inventario_repo, resultados, validos, ordenado, "Producto duplicado"):
+            await avisar_umbral(producto)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(e)}")
+    return respuesta_lote(resultados)
+
 @app.get("/api/inventario")
-async def get_inventario():
+async def get_inventario(
+    request: Request,
+    response: Response,
+    limite: Optional[int] = None,
+    cursor: Optional[str] = None
+):
+    etiqueta = etag_coleccion("inventario", request, await versiones_confirmadas())
+    if no_modificado(request, etiqueta):
+        return respuesta_304(etiqueta)
+    
     try:
-        productos = list(inventario_collection.find({}, {"_id": 0}).sort("nombre", 1))
-        return {"inventario": productos}
+        return con_etag(await responder_listado(
+            request, inventario_repo, "inventario", ORDEN_INVENTARIO, limite=limite, cursor=cursor
+        ), etiqueta, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener inventario: {str(e)}")
 
 @app.get("/api/inventario/bajo-stock")
 async def get_productos_bajo_stock():
     try:
-        productos = list(inventario_collection.find(
-            {"$expr": {"$lte": ["$stock_actual", "$stock_minimo"]}},
-            {"_id": 0}
-        ).sort("stock_actual", 1))
+        productos = await cache.obtener(
+            ("bajo_stock",),
+            lambda: inventario_repo.listar(FILTRO_BAJO_STOCK, orden=[("stock_actual", 1)]),
+            dependencias=("inventario",)
+        )
         return {"productos_bajo_stock": productos}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener productos con bajo stock: {str(e)}")
 
-@app.put("/api/inventario/{producto_id}")
-async def actualizar_producto(producto_id: str, producto: ProductoInventario):
-    try:
-        resultado = inventario_collection.update_one(
-            {"id": producto_id},
-            {"$set": {
-                "nombre": str(producto.nombre),
-                "categoria": str(producto.categoria),
-                "stock_actual": int(producto.stock_actual),
-                "stock_minimo": int(producto.stock_minimo),
-                "precio_compra": float(producto.precio_compra),
-                "precio_venta": float(producto.precio_venta) if producto.precio_venta else None,
-                "proveedor_id": str(producto.proveedor_id) if producto.proveedor_id else None
-            }}
+@app.get("/api/inventario/bajo-stock/eventos")
+async def eventos_bajo_stock(request: Request):
+    """Flujo SSE con los productos que bajan de su stock mínimo ("bajo_stock") o lo recuperan ("repuesto")"""
+    return StreamingResponse(
+        flujo_eventos(request, tuple(CANAL), {"canal": CANAL}),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/inventario/movimientos")
+async def registrar_movimientos_lote(items: List[dict]):
+    """Aplica varios movimientos de stock con un $inc neto por producto
+
+    Si un producto no existe o se quedaría sin stock tras alguno de sus
+    movimientos (en el orden del lote), ninguno de ellos se aplica.
+    """
+    resultados, validos = validar_lote(
+        items,
+        MovimientoLote,
+        lambda m: documento_movimiento(m.producto_id, m.tipo, m.cantidad, m.fecha, m.nota),
+        ordenado=False
+    )
+    try:
+        resultado = await aplicar_lote([movimiento for _, movimiento in validos])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al registrar movimientos: {str(e)}")
+    
+    # Un producto que falla no anula los ya aplicados: el lote responde 200 con
+    # el estado de cada movimiento (un 500 llevaría al cliente a repetirlo entero)
+    for indice, movimiento in validos:
+        producto_id = movimiento["producto_id"]
+        if producto_id in resultado["fallidos"]:
+            resultados[indice] = {
+                "indice": indice, "estado": "error",
+                "detalle": f"Error al registrar movimiento: {str(resultado['fallidos'][producto_id])}"
+            }
+        elif producto_id in resultado["rechazados"]:
+            resultados[indice] = {
+                "indice": indice, "estado": "rechazado", "detalle": resultado["rechazados"][producto_id]
+            }
+        else:
+            resultados[indice] = {"indice": indice, "estado": "creado", "id": movimiento["id"]}
+    return respuesta_lote(resultados)
+
+@app.post("/api/inventario/{producto_id}/movimientos")
+async def registrar_movimiento(producto_id: str, movimiento: MovimientoStock):
+    """Venta, compra o ajuste de stock aplicado con un $inc atómico"""
+    try:
+        nuevo = documento_movimiento(
+            producto_id, movimiento.tipo, movimiento.cantidad, movimiento.fecha, movimiento.nota
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        producto, registrado = await aplicar_movimiento(nuevo)
+        if producto is None:
+            if not await inventario_repo.contar({"id": producto_id}):
+                raise HTTPException(status_code=404, detail="Producto no encontrado")
+            raise HTTPException(status_code=409, detail="Stock insuficiente")
         
-        if resultado.matched_count == 0:
+        return {
+            "message": "Movimiento registrado exitosamente",
+            "movimiento": movimientos_repo.publico(registrado),
+            "producto": producto
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al registrar movimiento: {str(e)}")
+
+@app.get("/api/inventario/{producto_id}/movimientos")
+async def get_movimientos(
+    request: Request,
+    producto_id: str,
+    limite: Optional[int] = None,
+    cursor: Optional[str] = None
+):
+    """Registro de movimientos de un producto, del más reciente al más antiguo"""
+    try:
+        return await responder_listado(
+            request, movimientos_repo, "movimientos", ORDEN_MOVIMIENTOS,
+            filtro={"producto_id": producto_id}, limite=limite, cursor=cursor
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener movimientos: {str(e)}")
+
+@app.put("/api/inventario/{producto_id}")
+async def actualizar_producto(producto_id: str, producto: ProductoEdicion):
+    """Edita los datos de un producto; `stock_actual` se ignora (ver /api/inventario/{id}/movimientos)"""
+    cambios = {
+        "nombre": str(producto.nombre),
+        "categoria": str(producto.categoria),
+        "stock_minimo": int(producto.stock_minimo),
+        "precio_compra": float(producto.precio_compra),
+        "precio_venta": float(producto.precio_venta) if producto.precio_venta else None,
+        "proveedor_id": str(producto.proveedor_id) if producto.proveedor_id else None
+    }
+    try:
+        if await editar_producto(producto_id, cambios) is None:
             raise HTTPException(status_code=404, detail="Producto no encontrado")
         
         return {"message": "Producto actualizado exitosamente"}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al actualizar producto: {str(e)}")
 
 @app.delete("/api/inventario/{producto_id}")
 async def eliminar_producto(producto_id: str):
     try:
-        resultado = inventario_collection.delete_one({"id": producto_id})
+        resultado = await inventario_repo.eliminar(producto_id)
         
         if resultado.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Producto no encontrado")
@@ -463,45 +1064,43 @@ async def eliminar_producto(producto_id: str):
 # ========== ENDPOINTS PARA EMPLEADOS ==========
 @app.post("/api/empleados")
 async def crear_empleado(empleado: EmpleadoCreate):
-    empleado_id = str(uuid.uuid4())
-    nuevo_empleado = {
-        "id": empleado_id,
-        "nombre": str(empleado.nombre),
-        "telefono": str(empleado.telefono),
-        "email": str(empleado.email) if empleado.email else None,
-        "puesto": str(empleado.puesto),
-        "salario": float(empleado.salario),
-        "fecha_ingreso": str(empleado.fecha_ingreso),
-        "horario": str(empleado.horario) if empleado.horario else None,
-        "comision_porcentaje": float(empleado.comision_porcentaje) if empleado.comision_porcentaje else None,
-        "estado": "activo",
-        "fecha_creacion": datetime.now().isoformat()
-    }
+    nuevo_empleado = documento_empleado(empleado)
     
     try:
-        result = empleados_collection.insert_one(nuevo_empleado)
+        result = await empleados_repo.insertar(nuevo_empleado)
         if result.inserted_id:
-            empleado_respuesta = {key: value for key, value in nuevo_empleado.items()}
-            return {"message": "Empleado registrado exitosamente", "empleado": empleado_respuesta}
+            return {"message": "Empleado registrado exitosamente", "empleado": nuevo_empleado}
         else:
             raise HTTPException(status_code=500, detail="Error al registrar empleado")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(e)}")
 
 @app.get("/api/empleados")
-async def get_empleados():
+async def get_empleados(
+    request: Request,
+    response: Response,
+    limite: Optional[int] = None,
+    cursor: Optional[str] = None
+):
+    etiqueta = etag_coleccion("empleados", request, await versiones_confirmadas())
+    if no_modificado(request, etiqueta):
+        return respuesta_304(etiqueta)
+    
     try:
-        empleados = list(empleados_collection.find({}, {"_id": 0}).sort("nombre", 1))
-        return {"empleados": empleados}
+        return con_etag(await responder_listado(
+            request, empleados_repo, "empleados", ORDEN_EMPLEADOS, limite=limite, cursor=cursor
+        ), etiqueta, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener empleados: {str(e)}")
 
 @app.put("/api/empleados/{empleado_id}")
 async def actualizar_empleado(empleado_id: str, empleado: EmpleadoCreate):
     try:
-        resultado = empleados_collection.update_one(
-            {"id": empleado_id},
-            {"$set": {
+        resultado = await empleados_repo.actualizar(
+            empleado_id,
+            {
                 "nombre": str(empleado.nombre),
                 "telefono": str(empleado.telefono),
                 "email": str(empleado.email) if empleado.email else None,
@@ -510,22 +1109,24 @@ async def actualizar_empleado(empleado_id: str, empleado: EmpleadoCreate):
                 "fecha_ingreso": str(empleado.fecha_ingreso),
                 "horario": str(empleado.horario) if empleado.horario else None,
                 "comision_porcentaje": float(empleado.comision_porcentaje) if empleado.comision_porcentaje else None
-            }}
+            }
         )
         
         if resultado.matched_count == 0:
             raise HTTPException(status_code=404, detail="Empleado no encontrado")
         
         return {"message": "Empleado actualizado exitosamente"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al actualizar empleado: {str(e)}")
 
 @app.delete("/api/empleados/{empleado_id}")
 async def eliminar_empleado(empleado_id: str):
     try:
-        resultado = empleados_collection.update_one(
-            {"id": empleado_id},
-            {"$set": {"estado": "inactivo"}}
+        resultado = await empleados_repo.actualizar(
+            empleado_id,
+            {"estado": "inactivo"}
         )
         
         if resultado.matched_count == 0:
@@ -538,64 +1139,297 @@ async def eliminar_empleado(empleado_id: str):
 @app.delete("/api/reservas/{reserva_id}")
 async def cancelar_reserva(reserva_id: str):
     try:
-        resultado = reservas_collection.update_one(
-            {"id": reserva_id},
-            {"$set": {"estado": "cancelada"}}
+        anterior = await reservas_repo.modificar(
+            reserva_id,
+            {"estado": "cancelada"},
+            condicion=FILTRO_RESERVA_ACTIVA
         )
         
-        if resultado.matched_count == 0:
-            raise HTTPException(status_code=404, detail="Reserva no encontrada")
+        if anterior is None:
+            # No existe, o ya estaba cancelada y no hay que descontarla otra vez
+            if not await reservas_repo.contar({"id": reserva_id}):
+                raise HTTPException(status_code=404, detail="Reserva no encontrada")
+        else:
+            await invalidar_ocupacion(
+                anterior["fecha"], anterior["peluquero"], evento_franjas("liberado", anterior)
+            )
+            await registrar_reserva(anterior, -1)
         
         return {"message": "Reserva cancelada exitosamente"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al cancelar reserva: {str(e)}")
 
+@app.get("/api/cache")
+async def get_estadisticas_cache():
+    """Aciertos y fallos de la caché de lecturas de este proceso"""
+    return cache.estadisticas()
+
+@app.get("/api/admision")
+async def get_estadisticas_admision():
+    """Peticiones en curso, admitidas y rechazadas (por motivo y grupo de rutas) de este proceso"""
+    return admision.estadisticas()
+
+# ========== SINCRONIZACIÓN INCREMENTAL ==========
+@app.get("/api/sync")
+async def sincronizar(since: Optional[str] = None):
+    """Cambios y eliminaciones posteriores al token `since` (sin token: todo)"""
+    try:
+        desde = int(since) if since else -1
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Token de sincronización no válido")
+    
+    try:
+        return ORJSONResponse(await cambios_desde({
+            "reservas": reservas_repo,
+            "proveedores": proveedores_repo,
+            "gastos": gastos_repo,
+            "inventario": inventario_repo,
+            "empleados": empleados_repo
+        }, desde))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al sincronizar: {str(e)}")
+
 # ========== ENDPOINTS PARA ESTADÍSTICAS ==========
+async def calcular_resumen():
+    hoy = datetime.now().strftime("%Y-%m-%d")
+    # Cualquier escritura en las colecciones que resume invalida la entrada
+    return await cache.obtener(
+        ("resumen", hoy),
+        lambda: leer_resumen(hoy),
+        dependencias=("resumenes", "inventario", "empleados")
+    )
+
+async def leer_resumen(hoy: str):
+    mes_actual = hoy[:7]
+    
+    # Lecturas O(1): dos resúmenes materializados y dos conteos indexados
+    resumenes, productos_bajo_stock, empleados_activos = await asyncio.gather(
+        obtener_resumenes(f"dia:{hoy}", f"mes:{mes_actual}"),
+        inventario_repo.contar(FILTRO_BAJO_STOCK),
+        empleados_repo.contar({"estado": "activo"})
+    )
+    dia = resumenes[f"dia:{hoy}"]
+    mes = resumenes[f"mes:{mes_actual}"]
+    
+    return {
+        "reservas_hoy": dia["reservas"],
+        "ingresos_hoy": dia["ingresos"],
+        "gastos_mes": mes["gastos"],
+        "productos_bajo_stock": productos_bajo_stock,
+        "empleados_activos": empleados_activos,
+        "ganancia_mes": mes["ingresos"] - mes["gastos"]
+    }
+
 @app.get("/api/estadisticas/resumen")
 async def get_estadisticas_resumen():
     try:
-        hoy = datetime.now().strftime("%Y-%m-%d")
-        mes_actual = datetime.now().strftime("%Y-%m")
-        
-        # Reservas del día
-        reservas_hoy = reservas_collection.count_documents({"fecha": hoy})
-        
-        # Ingresos del día
-        reservas_hoy_data = list(reservas_collection.find({"fecha": hoy}, {"_id": 0}))
-        precios = {
-            'Corte de cabello': 15, 'Arreglo de barba': 10, 'Tinte': 45,
-            'Corte mujer': 25, 'Peinado': 20, 'Mechas': 60
-        }
-        ingresos_hoy = sum(precios.get(r.get('servicio', ''), 0) for r in reservas_hoy_data)
-        
-        # Gastos del mes
-        gastos_mes = list(gastos_collection.find(
-            {"fecha": {"$regex": f"^{mes_actual}"}}, {"_id": 0}
-        ))
-        total_gastos_mes = sum(g.get('monto', 0) for g in gastos_mes)
-        
-        # Productos bajo stock
-        productos_bajo_stock = inventario_collection.count_documents(
-            {"$expr": {"$lte": ["$stock_actual", "$stock_minimo"]}}
-        )
-        
-        # Total empleados activos
-        empleados_activos = empleados_collection.count_documents({"estado": "activo"})
-        
-        return {
-            "reservas_hoy": reservas_hoy,
-            "ingresos_hoy": ingresos_hoy,
-            "gastos_mes": total_gastos_mes,
-            "productos_bajo_stock": productos_bajo_stock,
-            "empleados_activos": empleados_activos,
-            "ganancia_mes": sum(precios.get(r.get('servicio', ''), 0) 
-                               for r in reservas_collection.find(
-                                   {"fecha": {"$regex": f"^{mes_actual}"}}, {"_id": 0}
-                               )) - total_gastos_mes
-        }
+        return await calcular_resumen()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener estadísticas: {str(e)}")
 
+# ========== DASHBOARD ==========
+def parsear_lista(valor: Optional[str]):
+    return [v.strip() for v in valor.split(",") if v.strip()] if valor else []
+
+@app.get("/api/dashboard")
+async def get_dashboard(
+    secciones: Optional[str] = None,
+    limite: int = LIMITE_DASHBOARD,
+    limites: Optional[str] = None,
+    campos: Optional[str] = None
+):
+    """Todas las secciones del panel en una sola petición, leídas concurrentemente
+
+    - secciones: lista separada por comas (por defecto todas)
+    - limite: documentos por sección; limites: excepciones "reservas:50,gastos:20"
+    - campos: campos a devolver por sección, "reservas.fecha,reservas.hora,gastos.monto"
+    """
+    listados = {
+        "reservas": (reservas_repo, ORDEN_RESERVAS),
+        "proveedores": (proveedores_repo, ORDEN_PROVEEDORES),
+        "gastos": (gastos_repo, ORDEN_GASTOS),
+        "inventario": (inventario_repo, ORDEN_INVENTARIO),
+        "empleados": (empleados_repo, ORDEN_EMPLEADOS)
+    }
+    validas = [*listados, "estadisticas"]
+    pedidas = parsear_lista(secciones) or validas
+    invalidas = [x for x in pedidas if x not in validas]
+    if invalidas:
+        raise HTTPException(status_code=400, detail=f"Secciones no válidas: {', '.join(invalidas)}")
+    
+    try:
+        limite_seccion = {x: limite for x in listados}
+        for par in parsear_lista(limites):
+            seccion, valor = par.split(":")
+            limite_seccion[seccion] = int(valor)
+        proyecciones = {}
+        for campo in parsear_lista(campos):
+            seccion, nombre = campo.split(".", 1)
+            proyecciones.setdefault(seccion, {})[nombre] = 1
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de limites o campos no válido")
+    
+    if any(x not in listados for x in [*limite_seccion, *proyecciones]):
+        raise HTTPException(status_code=400, detail="limites y campos solo admiten secciones de listado")
+    if not all(1 <= n <= MAX_LIMITE for n in limite_seccion.values()):
+        raise HTTPException(status_code=400, detail=f"Los límites deben estar entre 1 y {MAX_LIMITE}")
+    
+    tareas = {}
+    for seccion in pedidas:
+        if seccion == "estadisticas":
+            tareas[seccion] = calcular_resumen()
+        else:
+            repo, orden = listados[seccion]
+            tareas[seccion] = pagina(
+                repo, orden, limite_seccion[seccion], proyeccion=proyecciones.get(seccion)
+            )
+    
+    try:
+        resultados = await asyncio.gather(*tareas.values())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener el dashboard: {str(e)}")
+    
+    respuesta = {}
+    for seccion, resultado in zip(tareas, resultados):
+        if seccion == "estadisticas":
+            respuesta[seccion] = resultado
+        else:
+            documentos, siguiente = resultado
+            respuesta[seccion] = {"datos": documentos, "siguiente": siguiente}
+    return ORJSONResponse(respuesta)
+
+# ========== IMPORTACIÓN ==========
+# Colección -> (repositorio, modelo, constructor, clave natural, campos que solo se fijan al crear)
+IMPORTABLES = {
+    "proveedores": (
+        proveedores_repo, ProveedorCreate, documento_proveedor, CLAVES_NATURALES["proveedores"],
+        ("id", "fecha_creacion")
+    ),
+    "inventario": (
+        inventario_repo, ProductoInventario, documento_producto, CLAVES_NATURALES["inventario"],
+        ("id", "fecha_creacion")
+    ),
+    # Reimportar un empleado dado de baja no lo vuelve a activar
+    "empleados": (
+        empleados_repo, EmpleadoCreate, documento_empleado, CLAVES_NATURALES["empleados"],
+        ("id", "fecha_creacion", "estado")
+    )
+}
+
+@app.post("/api/importar/{coleccion}")
+async def importar_coleccion(coleccion: str, archivo: UploadFile = File(...)):
+    """Crea o actualiza proveedores, productos o empleados desde un CSV con cabecera
+
+    Las columnas son los campos del alta correspondiente; las filas se emparejan
+    con los documentos existentes por su clave natural (nombre, o nombre y
+    teléfono para empleados). Devuelve los totales y los errores por fila; 409
+    si ya hay otra importación de la misma colección en curso.
+    """
+    if coleccion not in IMPORTABLES:
+        raise HTTPException(status_code=400, detail=f"Colección no importable: {coleccion}")
+    repo, modelo, construir, clave, solo_al_crear = IMPORTABLES[coleccion]
+    
+    try:
+        async with importacion_exclusiva(coleccion):
+            return await importar_csv(archivo.file, repo, modelo, construir, clave, solo_al_crear)
+    except ImportacionEnCurso as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        # Los lotes anteriores al error ya están guardados
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al importar {coleccion}: {str(e)}")
+    finally:
+        if coleccion == "inventario":
+            # La importación no lee el stock anterior de cada producto
+            await avisar_recarga()
+
+# ========== EXPORTACIÓN ==========
+@app.get("/api/exportar/{coleccion}")
+async def exportar_coleccion(
+    coleccion: str,
+    formato: str = "csv",
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None
+):
+    """Descarga reservas o gastos del rango [desde, hasta] en CSV o Parquet, en streaming"""
+    if coleccion not in ESQUEMAS:
+        raise HTTPException(status_code=400, detail=f"Colección no exportable: {coleccion}")
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail=f"Formato no válido: {', '.join(FORMATOS)}")
+    
+    try:
+        contenido = exportar(coleccion, formato, desde, hasta)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha no válida, formato YYYY-MM-DD")
+    
+    nombre = "_".join(filter(None, [coleccion, desde, hasta]))
+    return StreamingResponse(
+        contenido,
+        media_type=FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}.{formato}"'}
+    )
+
+# ========== ENDPOINTS PARA ANALÍTICA ==========
+@app.get("/api/analitica/{dimension}")
+async def get_analitica(dimension: str, desde: str, hasta: str):
+    """Serie de reservas, ingresos y ocupación agrupada por `dimension` en MongoDB"""
+    if dimension not in DIMENSIONES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Dimensión no válida, opciones: {', '.join(DIMENSIONES)}"
+        )
+    
+    try:
+        fecha_desde = date.fromisoformat(desde)
+        fecha_hasta = date.fromisoformat(hasta)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha no válida")
+    
+    dias = (fecha_hasta - fecha_desde).days + 1
+    if dias < 1 or dias > MAX_DIAS_ANALITICA:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El rango debe tener entre 1 y {MAX_DIAS_ANALITICA} días"
+        )
+    
+    try:
+        grupos = await reservas_repo.agregar(pipeline_analitica(dimension, fecha_desde, fecha_hasta))
+        serie = construir_serie(
+            dimension, grupos, capacidad(agenda, dimension, fecha_desde, fecha_hasta)
+        )
+        return {"dimension": dimension, "desde": desde, "hasta": hasta, "serie": serie}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular analítica: {str(e)}")
+
+@app.get("/api/reportes/ocupacion")
+async def get_reporte_ocupacion(desde: str, hasta: str, semanas: int = 8):
+    """Mapa de ocupación día × slot por peluquero, tasas por estado y previsión de demanda"""
+    try:
+        inicio = datetime.combine(date.fromisoformat(desde), datetime.min.time())
+        fin = datetime.combine(date.fromisoformat(hasta), datetime.min.time()) + timedelta(days=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha no válida")
+    
+    if not timedelta(days=1) <= fin - inicio <= timedelta(days=MAX_DIAS_ANALITICA) or not 1 <= semanas <= 52:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El rango debe tener entre 1 y {MAX_DIAS_ANALITICA} días y semanas entre 1 y 52"
+        )
+    
+    try:
+        historico, recientes = await cargar_reservas(inicio, fin, semanas)
+        # El cálculo es CPU puro: se saca del event loop
+        return await asyncio.to_thread(informe_ocupacion, historico, recientes, agenda, inicio, fin, semanas)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al generar el informe: {str(e)}")
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    if WORKERS > 1:
+        # Con varios procesos uvicorn necesita la aplicación como cadena importable
+        uvicorn.run("server:app", host="0.0.0.0", port=8001, workers=WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
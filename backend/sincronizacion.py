@@ -0,0 +1,63 @@
+"""Sincronización incremental para el dashboard
+
+Cada escritura hecha con un Repositorio guarda en el documento una `version`
+tomada de un contador global, y cada borrado deja una lápida con su propia
+versión. Un cliente que recuerda la última versión que vio solo necesita pedir
+los documentos y lápidas con una versión mayor.
+
+Las versiones se reservan antes de escribir, así que pueden terminar en
+desorden: la v10 puede guardarse después que la v11. Por eso solo se entregan
+cambios hasta versiones_confirmadas(), la versión anterior a la primera
+escritura aún en curso; lo posterior llega en la siguiente sincronización.
+"""
+import asyncio
+
+from database import eliminados_collection, versiones_confirmadas
+
+MAX_CAMBIOS = 1000
+
+
+async def cambios_desde(repos: dict, desde: int, limite: int = MAX_CAMBIOS) -> dict:
+    """Documentos modificados y lápidas con `version` > desde, como mucho `limite` por colección
+
+    Si alguna colección tiene más cambios de los que caben, el token devuelto es
+    la versión más baja en la que hubo que cortar y todo lo posterior se descarta;
+    el cliente vuelve a pedir desde ese token hasta recibir `completo`.
+    """
+    # Se lee antes que los documentos: todo lo que quede por debajo ya está escrito
+    confirmada = await versiones_confirmadas()
+    if confirmada <= desde:
+        return {
+            "token": str(desde),
+            "completo": True,
+            "cambios": {c: [] for c in repos},
+            "eliminados": {c: [] for c in repos}
+        }
+    filtro = {"version": {"$gt": desde, "$lte": confirmada}}
+    orden = [("version", 1)]
+    listas = await asyncio.gather(
+        *(repo.listar(filtro, orden=orden, limite=limite + 1) for repo in repos.values()),
+        eliminados_collection.find(filtro, {"_id": 0}).sort(orden).limit(limite + 1).to_list(length=None)
+    )
+    lapidas = listas.pop()
+    cambios = dict(zip(repos, listas))
+
+    cortes = [docs[limite - 1]["version"] for docs in [*listas, lapidas] if len(docs) > limite]
+    if cortes:
+        token = min(cortes)
+        cambios = {c: [d for d in docs if d["version"] <= token] for c, docs in cambios.items()}
+        lapidas = [l for l in lapidas if l["version"] <= token]
+    else:
+        # Las versiones sin documento (sobrescritas o borradas) también quedan atrás
+        token = confirmada
+
+    eliminados = {c: [] for c in repos}
+    for lapida in lapidas:
+        eliminados.setdefault(lapida["coleccion"], []).append(lapida["id"])
+
+    return {
+        "token": str(token),
+        "completo": not cortes,
+        "cambios": cambios,
+        "eliminados": eliminados
+    }
@@ -0,0 +1,266 @@
+"""Movimientos de stock: ventas, compras y ajustes
+
+Cada movimiento cambia `stock_actual` con un $inc atómico (sin leer el
+producto antes, así que dos movimientos simultáneos nunca se pisan) y queda
+registrado en la colección `movimientos`. Una venta o un ajuste negativo solo
+se aplica si hay stock suficiente (en un lote, movimiento a movimiento y en su
+orden); una compra actualiza además `fecha_ultima_compra`. La edición de un
+producto no toca `stock_actual`: el stock solo cambia con movimientos.
+
+Los lotes agrupan los movimientos por producto y aplican un único $inc neto
+por producto, con un find_one_and_update por producto lanzados a la vez: cada
+uno devuelve el producto tal como lo dejó su propia escritura, así que el
+resultado, el `stock_resultante` y el margen anterior no dependen de lo que
+escriban otros a la vez.
+
+La misma escritura que cambia el stock guarda los movimientos en
+`movimientos_pendientes` del producto; después se insertan en `movimientos` y
+se retiran de ahí. Si el proceso cae entre medias, recuperar_movimientos los
+registra al arrancar, de modo que ningún cambio de stock queda sin su entrada.
+
+Todas las escrituras del inventario mantienen `margen_stock` (stock_actual -
+stock_minimo) en la misma operación que cambia el stock: el alta y la edición
+lo fijan junto al stock y los movimientos le aplican el mismo $inc. El índice
+parcial sobre FILTRO_BAJO_STOCK hace que consultar el bajo stock no recorra el
+catálogo. Cuando un producto cruza su stock mínimo se emite un evento
+"bajo_stock" o "repuesto" en el canal ["stock"] de eventos.py.
+"""
+from datetime import datetime
+import asyncio
+import uuid
+
+from database import inventario_repo, movimientos_repo
+from fechas import momento_gasto
+from invalidaciones import notificar_escritura
+
+TIPOS = ("venta", "compra", "ajuste")
+INTENTOS_EDICION = 3
+CANAL = ["stock"]
+
+
+def delta_movimiento(tipo: str, cantidad: int) -> int:
+    """Variación de stock de un movimiento; ValueError si no es válido"""
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de movimiento no válido: {', '.join(TIPOS)}")
+    if tipo == "ajuste":
+        if cantidad == 0:
+            raise ValueError("Un ajuste no puede ser de 0 unidades")
+        return cantidad
+    if cantidad <= 0:
+        raise ValueError("La cantidad debe ser positiva")
+    return -cantidad if tipo == "venta" else cantidad
+
+
+def documento_movimiento(producto_id: str, tipo: str, cantidad: int, fecha=None, nota=None) -> dict:
+    """Entrada del registro de movimientos; ValueError si el movimiento o la fecha no son válidos"""
+    delta = delta_movimiento(tipo, cantidad)
+    fecha = fecha or datetime.now().strftime("%Y-%m-%d")
+    try:
+        momento = momento_gasto(fecha)
+    except ValueError:
+        raise ValueError("Fecha no válida")
+    return {
+        "id": str(uuid.uuid4()),
+        "producto_id": producto_id,
+        "tipo": tipo,
+        "cantidad": cantidad,
+        "delta": delta,
+        "fecha": fecha,
+        "nota": nota,
+        "momento": momento,
+        "fecha_creacion": datetime.now().isoformat()
+    }
+
+
+def margen_stock(producto: dict) -> int:
+    return producto["stock_actual"] - producto["stock_minimo"]
+
+
+def evento_umbral(producto: dict, margen_anterior=None):
+    """Evento "bajo_stock" o "repuesto" si el producto ha cruzado su stock mínimo, o None
+
+    Sin `margen_anterior` (producto nuevo) solo se avisa si ya nace en bajo stock.
+    """
+    bajo = margen_stock(producto) <= 0
+    if bajo == (margen_anterior is not None and margen_anterior <= 0):
+        return None
+    return {
+        "tipo": "bajo_stock" if bajo else "repuesto",
+        "canal": CANAL,
+        "producto_id": producto["id"],
+        "nombre": producto["nombre"],
+        "stock_actual": producto["stock_actual"],
+        "stock_minimo": producto["stock_minimo"]
+    }
+
+
+async def avisar_umbral(producto: dict, margen_anterior=None):
+    evento = evento_umbral(producto, margen_anterior)
+    if evento is not None:
+        await notificar_escritura("inventario", ("bajo_stock",), evento)
+
+
+async def avisar_recarga():
+    """Pide a los suscriptores que vuelvan a leer el bajo stock (escrituras sin estado anterior)"""
+    await notificar_escritura("inventario", ("bajo_stock",), {"tipo": "recargar", "canal": CANAL})
+
+
+def operacion_stock(movimientos: list):
+    """Condición y actualización de un producto para aplicar sus `movimientos`"""
+    delta = sum(m["delta"] for m in movimientos)
+    actualizacion = {"$inc": {"stock_actual": delta, "margen_stock": delta}}
+    compras = [m["fecha"] for m in movimientos if m["tipo"] == "compra"]
+    if compras:
+        # $max: un movimiento con fecha atrasada no retrocede la última compra
+        actualizacion["$max"] = {"fecha_ultima_compra": max(compras)}
+    # El stock no puede quedar negativo tras ningún movimiento, no solo al final:
+    # se exige el que necesita el punto más bajo de la secuencia
+    acumulado = minimo = 0
+    for movimiento in movimientos:
+        acumulado += movimiento["delta"]
+        minimo = min(minimo, acumulado)
+    condicion = {"stock_actual": {"$gte": -minimo}} if minimo < 0 else {}
+    return condicion, actualizacion
+
+
+async def aplicar_producto(producto_id: str, movimientos: list):
+    """Aplica los `movimientos` de un producto en una sola escritura; devuelve el producto o None"""
+    condicion, actualizacion = operacion_stock(movimientos)
+    actualizacion["$push"] = {"movimientos_pendientes": {"$each": movimientos}}
+    return await inventario_repo.transformar(producto_id, actualizacion, condicion)
+
+
+async def registrar(filas: list):
+    """Inserta las entradas del registro y las retira de `movimientos_pendientes`
+
+    Una entrada que ya estaba registrada (id duplicado) también se retira; con
+    cualquier otro error se queda pendiente para recuperar_movimientos.
+    """
+    errores = await movimientos_repo.insertar_lote(filas)
+    registrados = [
+        fila["id"] for i, fila in enumerate(filas)
+        if i not in errores or errores[i].get("code") == 11000
+    ]
+    if registrados:
+        await inventario_repo.actualizar_ocultos(
+            {"movimientos_pendientes.id": {"$in": registrados}},
+            {"$pull": {"movimientos_pendientes": {"id": {"$in": registrados}}}}
+        )
+
+
+def filas_registro(producto: dict, movimientos: list) -> list:
+    """Entradas del registro con el stock que dejó cada movimiento, partiendo del producto ya actualizado"""
+    stock = producto["stock_actual"] - sum(m["delta"] for m in movimientos)
+    filas = []
+    for movimiento in movimientos:
+        stock += movimiento["delta"]
+        filas.append({**movimiento, "stock_resultante": stock})
+    return filas
+
+
+async def aplicar_movimiento(movimiento: dict):
+    """Aplica un movimiento y lo registra; devuelve (producto actualizado, entrada del registro)
+
+    (None, None) significa que el producto no existe o que no hay stock suficiente.
+    """
+    resultado = await aplicar_lote([movimiento])
+    for error in resultado["fallidos"].values():
+        raise error
+    if resultado["rechazados"]:
+        return None, None
+    producto = resultado["productos"][movimiento["producto_id"]]
+    return producto, resultado["registrados"][0]
+
+
+async def aplicar_lote(movimientos: list) -> dict:
+    """Aplica los movimientos agrupados por producto
+
+    Devuelve {"rechazados": {producto_id: motivo}, "fallidos": {producto_id:
+    excepción}, "productos": {producto_id: producto actualizado},
+    "registrados": entradas del registro}. Los movimientos de un producto
+    rechazado o fallido no se aplican ni se registran; los demás productos sí,
+    así que un error en uno no se convierte en un error del lote entero (que el
+    cliente reintentaría, repitiendo los ya aplicados).
+    """
+    por_producto = {}
+    for movimiento in movimientos:
+        por_producto.setdefault(movimiento["producto_id"], []).append(movimiento)
+
+    resultados = await asyncio.gather(*(
+        aplicar_producto(producto_id, suyos) for producto_id, suyos in por_producto.items()
+    ), return_exceptions=True)
+    productos = {}
+    fallidos = {}
+    sin_aplicar = []
+    filas = []
+    for (producto_id, suyos), producto in zip(por_producto.items(), resultados):
+        if isinstance(producto, Exception):
+            fallidos[producto_id] = producto
+        elif isinstance(producto, BaseException):
+            raise producto
+        elif producto is None:
+            sin_aplicar.append(producto_id)
+        else:
+            productos[producto_id] = producto
+            filas.extend(filas_registro(producto, suyos))
+
+    if filas:
+        try:
+            await registrar(filas)
+        except Exception as e:
+            # El stock ya cambió y los movimientos siguen en movimientos_pendientes:
+            # recuperar_movimientos los registrará
+            print(f"Error registrando movimientos de stock: {str(e)}")
+    for producto_id, producto in productos.items():
+        delta = sum(m["delta"] for m in por_producto[producto_id])
+        await avisar_umbral(producto, margen_stock(producto) - delta)
+
+    rechazados = {}
+    if sin_aplicar:
+        # La escritura no distingue por qué no se aplicó: basta saber qué productos existen
+        existentes = {
+            p["id"] for p in await inventario_repo.listar({"id": {"$in": sin_aplicar}}, proyeccion={"id": 1})
+        }
+        rechazados = {
+            producto_id: "Stock insuficiente" if producto_id in existentes else "Producto no encontrado"
+            for producto_id in sin_aplicar
+        }
+    return {"rechazados": rechazados, "fallidos": fallidos, "productos": productos, "registrados": filas}
+
+
+async def editar_producto(producto_id: str, cambios: dict):
+    """Aplica `cambios` (sin `stock_actual`) a un producto; devuelve el producto actualizado o None si no existe
+
+    Cambiar `stock_minimo` mueve `margen_stock` con un $inc, condicionado a que
+    `stock_minimo` siga siendo el leído: así no se pisa un movimiento
+    simultáneo. ValueError si otra edición cambia `stock_minimo` en cada intento.
+    """
+    for _ in range(INTENTOS_EDICION):
+        actual = await inventario_repo.listar({"id": producto_id}, proyeccion={"stock_minimo": 1}, limite=1)
+        if not actual:
+            return None
+        minimo = actual[0]["stock_minimo"]
+        producto = await inventario_repo.transformar(
+            producto_id,
+            {"$set": cambios, "$inc": {"margen_stock": minimo - cambios["stock_minimo"]}},
+            {"stock_minimo": minimo}
+        )
+        if producto is not None:
+            await avisar_umbral(producto, producto["stock_actual"] - minimo)
+            return producto
+    raise ValueError("El producto ha cambiado mientras se editaba, inténtalo de nuevo")
+
+
+async def recuperar_movimientos() -> int:
+    """Registra los movimientos que cambiaron el stock pero no llegaron al registro (proceso caído)
+
+    Su `stock_resultante` ya no se puede saber y queda a None.
+    """
+    filas = []
+    async for producto in inventario_repo.recorrer(
+        {"movimientos_pendientes.0": {"$exists": True}}, proyeccion={"movimientos_pendientes": 1}
+    ):
+        filas.extend({**m, "stock_resultante": None} for m in producto["movimientos_pendientes"])
+    if filas:
+        await registrar(filas)
+    return len(filas)
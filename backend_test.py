@@ -207,7 +207,7 @@ class HairSalonAPITest:
             json=reserva_data
         )
         
-        if not self.assert_equal(response.status_code, 400, "Double booking should return 400"):
+        if not self.assert_equal(response.status_code, 409, "Double booking should return 409"):
             return False
             
         data = response.json()
@@ -38,36 +38,46 @@ const AdminDashboard = () => {
     cargarDatos();
   }, []);
 
+  const LIMITE_PAGINA = 1000;
+
+  // Sigue el cursor `siguiente` de una sección hasta tener todos sus documentos
+  const completarSeccion = async (seccion, pagina) => {
+    const datos = [...(pagina?.datos || [])];
+    let siguiente = pagina?.siguiente;
+    while (siguiente) {
+      const response = await fetch(
+        `${BACKEND_URL}/api/${seccion}?limite=${LIMITE_PAGINA}&cursor=${encodeURIComponent(siguiente)}`
+      );
+      if (!response.ok) throw new Error(`Error ${response.status} cargando ${seccion}`);
+      const data = await response.json();
+      datos.push(...(data[seccion] || []));
+      siguiente = data.siguiente;
+    }
+    return datos;
+  };
+
   const cargarDatos = async () => {
     try {
       setLoading(true);
       
-      const [
-        reservasRes, proveedoresRes, gastosRes, 
-        inventarioRes, empleadosRes, estadisticasRes
-      ] = await Promise.all([
-        fetch(`${BACKEND_URL}/api/reservas`),
-        fetch(`${BACKEND_URL}/api/proveedores`),
-        fetch(`${BACKEND_URL}/api/gastos`),
-        fetch(`${BACKEND_URL}/api/inventario`),
-        fetch(`${BACKEND_URL}/api/empleados`),
-        fetch(`${BACKEND_URL}/api/estadisticas/resumen`)
-      ]);
-
-      const [
-        reservasData, proveedoresData, gastosData,
-        inventarioData, empleadosData, estadisticasData
-      ] = await Promise.all([
-        reservasRes.json(), proveedoresRes.json(), gastosRes.json(),
-        inventarioRes.json(), empleadosRes.json(), estadisticasRes.json()
-      ]);
-
-      setReservas(reservasData.reservas || []);
-      setProveedores(proveedoresData.proveedores || []);
-      setGastos(gastosData.gastos || []);
-      setInventario(inventarioData.inventario || []);
-      setEmpleados(empleadosData.empleados || []);
-      setEstadisticas(estadisticasData);
+      // La primera página de todas las secciones llega en una sola petición (el backend
+      // las lee en paralelo); las secciones con más documentos siguen su cursor
+      const response = await fetch(`${BACKEND_URL}/api/dashboard?limite=${LIMITE_PAGINA}`);
+      const data = await response.json();
+
+      const [reservasCompletas, proveedoresCompletos, gastosCompletos, inventarioCompleto, empleadosCompletos] =
+        await Promise.all(
+          ['reservas', 'proveedores', 'gastos', 'inventario', 'empleados'].map(
+            seccion => completarSeccion(seccion, data[seccion])
+          )
+        );
+
+      setReservas(reservasCompletas);
+      setProveedores(proveedoresCompletos);
+      setGastos(gastosCompletos);
+      setInventario(inventarioCompleto);
+      setEmpleados(empleadosCompletos);
+      setEstadisticas(data.estadisticas);
     } catch (error) {
       console.error('Error cargando datos:', error);
     } finally {
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Link } from 'react-router-dom';
 
 function ClientReservation() {
@@ -19,6 +19,8 @@ function ClientReservation() {
   const [loading, setLoading] = useState(false);
   const [showConfirmation, setShowConfirmation] = useState(false);
   const [reservaCreada, setReservaCreada] = useState(null);
+  // Clave de idempotencia del envío: se reutiliza al reintentar los mismos datos
+  const envio = useRef({ datos: null, clave: null });
 
   const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8000';
 
@@ -44,15 +46,19 @@ function ClientReservation() {
     cargarDatos();
   }, [BACKEND_URL]);
 
-  // Cargar horarios disponibles cuando se selecciona fecha y peluquero
+  // Horas libres donde cabe el servicio elegido (los de 90 o 120 minutos ocupan varias franjas)
+  const urlHorarios = () => {
+    const url = `${BACKEND_URL}/api/horarios-disponibles/${formData.fecha}/${formData.peluquero}`;
+    return formData.servicio ? `${url}?servicio=${encodeURIComponent(formData.servicio)}` : url;
+  };
+
+  // Cargar horarios disponibles cuando se selecciona servicio, fecha y peluquero
   useEffect(() => {
     const cargarHorarios = async () => {
       if (formData.fecha && formData.peluquero) {
         setLoading(true);
         try {
-          const response = await fetch(
-            `${BACKEND_URL}/api/horarios-disponibles/${formData.fecha}/${formData.peluquero}`
-          );
+          const response = await fetch(urlHorarios());
           const data = await response.json();
           setHorariosDisponibles(data.horarios || []);
         } catch (error) {
@@ -64,7 +70,38 @@ function ClientReservation() {
     };
     
     cargarHorarios();
-  }, [formData.fecha, formData.peluquero, BACKEND_URL]);
+  }, [formData.fecha, formData.peluquero, formData.servicio, BACKEND_URL]);
+
+  // Escuchar en tiempo real las franjas que se ocupan o liberan en el día elegido
+  useEffect(() => {
+    if (!formData.fecha || !formData.peluquero) return;
+
+    const eventos = new EventSource(
+      `${BACKEND_URL}/api/horarios-disponibles/${formData.fecha}/${formData.peluquero}/eventos`
+    );
+    const recargarHorarios = async () => {
+      try {
+        const response = await fetch(urlHorarios());
+        const data = await response.json();
+        setHorariosDisponibles(data.horarios || []);
+      } catch (error) {
+        console.error('Error recargando horarios:', error);
+      }
+    };
+    const ocupado = (event) => {
+      const { franjas } = JSON.parse(event.data);
+      setHorariosDisponibles(prev => prev.filter(hora => !franjas.includes(hora)));
+      // Si la hora elegida acaba de ocuparse, hay que escoger otra
+      setFormData(prev => franjas.includes(prev.hora) ? { ...prev, hora: '' } : prev);
+      // Un servicio de varias franjas que empezaba antes tampoco cabe ya: se recalcula
+      recargarHorarios();
+    };
+
+    eventos.addEventListener('ocupado', ocupado);
+    eventos.addEventListener('liberado', recargarHorarios);
+    eventos.addEventListener('recargar', recargarHorarios);
+    return () => eventos.close();
+  }, [formData.fecha, formData.peluquero, formData.servicio, BACKEND_URL]);
 
   const handleInputChange = (field, value) => {
     setFormData(prev => ({
@@ -83,13 +120,18 @@ function ClientReservation() {
 
   const handleSubmit = async () => {
     setLoading(true);
+    const datos = JSON.stringify(formData);
+    if (envio.current.datos !== datos) {
+      envio.current = { datos, clave: crypto.randomUUID() };
+    }
     try {
       const response = await fetch(`${BACKEND_URL}/api/reservas`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Idempotency-Key': envio.current.clave,
         },
-        body: JSON.stringify(formData)
+        body: datos
       });
       
       if (response.ok) {
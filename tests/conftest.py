@@ -0,0 +1,13 @@
+"""Los módulos del backend se importan por su nombre, como hace server.py
+
+Las pruebas no necesitan un MongoDB: el cliente de Motor se sustituye por
+mongomock_motor antes de que database.py lo cree.
+"""
+import os
+import sys
+
+import mongomock_motor
+import motor.motor_asyncio
+
+motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
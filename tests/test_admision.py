@@ -0,0 +1,102 @@
+import asyncio
+
+import admision
+from admision import (
+    CuboTokens, ControlAdmision, MiddlewareAdmision, grupo_ruta,
+    MAX_CONCURRENTES, RESERVADAS_PRIORITARIAS
+)
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+def test_cubo_gasta_la_rafaga_y_repone_al_ritmo(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(admision.time, "monotonic", reloj)
+    cubo = CuboTokens(ritmo=2, rafaga=3)
+    assert [cubo.tomar() for _ in range(3)] == [0, 0, 0]
+    assert cubo.tomar() == 0.5
+    reloj.ahora += 0.5
+    assert cubo.tomar() == 0
+    # Nunca acumula más que la ráfaga
+    reloj.ahora += 60
+    assert [cubo.tomar() for _ in range(3)] == [0, 0, 0]
+    assert cubo.tomar() > 0
+
+
+def test_grupo_ruta():
+    assert grupo_ruta("POST", "/api/reservas")[0] == "reservas"
+    assert grupo_ruta("GET", "/api/reservas")[0] == "api"
+    assert grupo_ruta("GET", "/api/horarios-disponibles")[0] == "horarios"
+    assert grupo_ruta("GET", "/api/disponibilidad/eventos")[0] == "disponibilidad"
+    assert grupo_ruta("GET", "/docs") is None
+
+
+def ejecutar(middleware, metodo, ruta, cliente="1.2.3.4"):
+    """Pasa una petición por el middleware; devuelve (status, cabeceras, plazas ocupadas dentro de la app)"""
+    dentro = []
+    enviados = []
+
+    async def app(scope, receive, send):
+        dentro.append(middleware.control.en_curso)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(mensaje):
+        enviados.append(mensaje)
+
+    middleware.app = app
+    scope = {"type": "http", "method": metodo, "path": ruta, "client": (cliente, 1234), "headers": []}
+    asyncio.run(middleware(scope, receive, send))
+    inicio = enviados[0]
+    return inicio["status"], dict(inicio["headers"]), dentro[0] if dentro else None
+
+
+def test_plazas_reservadas_para_crear_reservas():
+    control = ControlAdmision()
+    middleware = MiddlewareAdmision(None, control)
+    control.en_curso = MAX_CONCURRENTES - RESERVADAS_PRIORITARIAS
+
+    status, cabeceras, _ = ejecutar(middleware, "GET", "/api/reservas")
+    assert status == 503
+    assert cabeceras[b"retry-after"] == b"1"
+    status, _, dentro = ejecutar(middleware, "POST", "/api/reservas")
+    assert status == 200
+    assert dentro == MAX_CONCURRENTES - RESERVADAS_PRIORITARIAS + 1
+    assert control.en_curso == MAX_CONCURRENTES - RESERVADAS_PRIORITARIAS
+
+    control.en_curso = MAX_CONCURRENTES
+    assert ejecutar(middleware, "POST", "/api/reservas")[0] == 503
+    assert control.rechazadas["saturacion"] == {"api": 1, "reservas": 1}
+
+
+def test_flujos_de_eventos_no_ocupan_plaza():
+    control = ControlAdmision()
+    middleware = MiddlewareAdmision(None, control)
+    control.en_curso = MAX_CONCURRENTES
+
+    status, _, dentro = ejecutar(middleware, "GET", "/api/disponibilidad/eventos")
+    assert status == 200
+    assert dentro == MAX_CONCURRENTES
+    assert control.en_curso == MAX_CONCURRENTES
+
+
+def test_limite_por_cliente_responde_429():
+    control = ControlAdmision()
+    middleware = MiddlewareAdmision(None, control)
+    # Ráfaga de 5 reservas por cliente
+    assert [ejecutar(middleware, "POST", "/api/reservas")[0] for _ in range(5)] == [200] * 5
+    status, cabeceras, _ = ejecutar(middleware, "POST", "/api/reservas")
+    assert status == 429
+    assert int(cabeceras[b"retry-after"]) >= 1
+    # Otro cliente tiene su propio cubo
+    assert ejecutar(middleware, "POST", "/api/reservas", cliente="5.6.7.8")[0] == 200
+    assert control.rechazadas["limite"] == {"reservas": 1}
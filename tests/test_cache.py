@@ -0,0 +1,86 @@
+import asyncio
+
+from cache import CacheTTL
+
+
+def test_calculos_concurrentes_se_comparten():
+    async def escenario():
+        cache = CacheTTL()
+        llamadas = 0
+
+        async def calcular():
+            nonlocal llamadas
+            llamadas += 1
+            await asyncio.sleep(0.01)
+            return "valor"
+
+        resultados = await asyncio.gather(*(cache.obtener("k", calcular) for _ in range(5)))
+        assert resultados == ["valor"] * 5
+        assert llamadas == 1
+        assert cache.leer("k") == "valor"
+
+    asyncio.run(escenario())
+
+
+def test_invalidar_durante_el_calculo_no_guarda_el_resultado():
+    async def escenario():
+        cache = CacheTTL()
+        empezado = asyncio.Event()
+        seguir = asyncio.Event()
+
+        async def calcular_viejo():
+            empezado.set()
+            await seguir.wait()
+            return "viejo"
+
+        async def calcular_nuevo():
+            return "nuevo"
+
+        tarea = asyncio.create_task(cache.obtener("k", calcular_viejo, dependencias=("reservas",)))
+        await empezado.wait()
+        # Una escritura mientras se calcula: el cálculo pudo leer datos anteriores
+        cache.invalidar_dependientes("reservas")
+        seguir.set()
+
+        assert await tarea == "viejo"
+        assert cache.leer("k") is None
+        assert await cache.obtener("k", calcular_nuevo) == "nuevo"
+        assert cache.leer("k") == "nuevo"
+
+    asyncio.run(escenario())
+
+
+def test_tras_invalidar_no_se_une_al_calculo_huerfano():
+    async def escenario():
+        cache = CacheTTL()
+        seguir = asyncio.Event()
+
+        async def calcular_viejo():
+            await seguir.wait()
+            return "viejo"
+
+        async def calcular_nuevo():
+            return "nuevo"
+
+        viejo = asyncio.create_task(cache.obtener("k", calcular_viejo))
+        await asyncio.sleep(0)
+        cache.invalidar("k")
+        assert await cache.obtener("k", calcular_nuevo) == "nuevo"
+        seguir.set()
+        assert await viejo == "viejo"
+        # El cálculo huérfano no pisa el valor nuevo al terminar
+        assert cache.leer("k") == "nuevo"
+
+    asyncio.run(escenario())
+
+
+def test_capacidad_y_caducidad():
+    cache = CacheTTL(capacidad=2, ttl=60)
+    cache.guardar("a", 1)
+    cache.guardar("b", 2)
+    cache.leer("a")
+    cache.guardar("c", 3)
+    assert cache.leer("b") is None
+    assert cache.leer("a") == 1 and cache.leer("c") == 3
+    cache.guardar("d", 4, ttl=-1)
+    assert cache.leer("d", "caducado") == "caducado"
@@ -0,0 +1,77 @@
+from configuracion import HORARIOS, SERVICIOS
+from disponibilidad import Agenda, a_minutos
+
+agenda = Agenda(HORARIOS, SERVICIOS)
+LUNES = "2025-06-02"
+SABADO = "2025-06-07"
+
+
+def bits(mascara: int):
+    return [i for i in range(mascara.bit_length()) if mascara >> i & 1]
+
+
+def test_rejilla_por_dia_de_la_semana():
+    rejilla = agenda.rejilla(LUNES)
+    assert rejilla.horas[0] == "10:00" and rejilla.horas[-1] == "18:30"
+    assert len(rejilla.horas) == 18
+    assert len(agenda.rejilla(SABADO).horas) == 8
+    assert agenda.rejilla("2025-06-08") is None  # domingo
+    assert agenda.rejilla("no-es-fecha") is None
+
+
+def test_slots_de_cada_servicio():
+    assert agenda.slots("Corte de cabello") == 1
+    assert agenda.slots("Arreglo de barba") == 1
+    assert agenda.slots("Corte mujer") == 2
+    assert agenda.slots("Tinte") == 3
+    assert agenda.slots("Mechas") == 4
+    assert agenda.slots("Desconocido") == 1
+
+
+def test_mascara_ocupacion_recorta_al_cierre():
+    rejilla = agenda.rejilla(LUNES)
+    mascara = agenda.mascara_ocupacion(rejilla, [
+        {"hora": "11:00", "servicio": "Corte mujer"},
+        {"hora": "18:30", "servicio": "Tinte"},
+        {"hora": "sin hora"},
+    ])
+    assert bits(mascara) == [2, 3, 17]
+
+
+def test_inicios_libres_sin_ocupacion():
+    rejilla = agenda.rejilla(LUNES)
+    assert bits(agenda.inicios_libres(rejilla, 0, 1)) == list(range(18))
+    # Unas mechas (4 slots) tienen que terminar antes de cerrar: la última empieza a las 17:00
+    assert agenda.horas_libres(rejilla, 0, 4)[-1] == "17:00"
+    assert bits(agenda.inicios_libres(rejilla, 0, 4)) == list(range(15))
+    assert agenda.inicios_libres(rejilla, 0, 19) == 0
+
+
+def test_inicios_libres_respeta_los_huecos():
+    rejilla = agenda.rejilla(SABADO)  # 10:00 a 14:00, 8 slots
+    ocupado = agenda.mascara_ocupacion(rejilla, [{"hora": "12:00", "servicio": "Corte de cabello"}])
+    assert bits(ocupado) == [4]
+    assert agenda.horas_libres(rejilla, ocupado, 1) == [
+        "10:00", "10:30", "11:00", "11:30", "12:30", "13:00", "13:30"
+    ]
+    # Con 3 slots no vale ningún inicio que pise las 12:00 ni que termine después de las 14:00
+    assert agenda.horas_libres(rejilla, ocupado, 3) == ["10:00", "10:30", "12:30"]
+
+
+def test_desde_minuto():
+    rejilla = agenda.rejilla(LUNES)
+    assert agenda.desde_minuto(rejilla, 0) == rejilla.completa
+    assert agenda.desde_minuto(rejilla, a_minutos("10:00")) == rejilla.completa
+    # Un minuto a media franja deja fuera la franja ya empezada
+    assert bits(agenda.desde_minuto(rejilla, a_minutos("10:45"))) == list(range(2, 18))
+    assert bits(agenda.desde_minuto(rejilla, a_minutos("18:30"))) == [17]
+    assert agenda.desde_minuto(rejilla, a_minutos("19:00")) == 0
+
+
+def test_franjas_de_un_servicio():
+    rejilla = agenda.rejilla(LUNES)
+    assert agenda.franjas(rejilla, "10:00") == ["10:00"]
+    assert agenda.franjas(rejilla, "17:00", 4) == ["17:00", "17:30", "18:00", "18:30"]
+    assert agenda.franjas(rejilla, "17:30", 4) is None
+    assert agenda.franjas(rejilla, "18:30", 3) is None
+    assert agenda.franjas(rejilla, "10:15") is None
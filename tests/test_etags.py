@@ -0,0 +1,27 @@
+from starlette.requests import Request
+
+from etags import etag_coleccion, no_modificado
+
+
+def peticion(query="", cabeceras=None):
+    return Request({
+        "type": "http", "method": "GET", "path": "/api/reservas", "query_string": query.encode(),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (cabeceras or {}).items()],
+    })
+
+
+def test_etag_solo_depende_de_la_version_y_la_peticion():
+    # Sin estado del proceso: otro worker con la misma versión confirmada da el mismo ETag
+    etiqueta = etag_coleccion("reservas", peticion("limite=10"), 7)
+    assert etag_coleccion("reservas", peticion("limite=10"), 7) == etiqueta
+    assert etag_coleccion("reservas", peticion("limite=10"), 8) != etiqueta
+    assert etag_coleccion("reservas", peticion("limite=20"), 7) != etiqueta
+    assert etag_coleccion("reservas", peticion("limite=10", {"Accept": "text/csv"}), 7) != etiqueta
+
+
+def test_no_modificado_compara_con_if_none_match():
+    etiqueta = etag_coleccion("gastos", peticion(), 3)
+    assert not no_modificado(peticion(), etiqueta)
+    assert no_modificado(peticion(cabeceras={"If-None-Match": f'"otro", {etiqueta}'}), etiqueta)
+    assert no_modificado(peticion(cabeceras={"If-None-Match": "*"}), etiqueta)
+    assert not no_modificado(peticion(cabeceras={"If-None-Match": etag_coleccion("gastos", peticion(), 2)}), etiqueta)
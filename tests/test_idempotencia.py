@@ -0,0 +1,91 @@
+import asyncio
+
+import orjson
+import pytest
+
+import idempotencia
+from idempotencia import MiddlewareIdempotencia
+
+
+class App:
+    """App ASGI que cuenta las ejecuciones y responde con el status pedido"""
+
+    def __init__(self, status=201):
+        self.status = status
+        self.ejecuciones = 0
+
+    async def __call__(self, scope, receive, send):
+        self.ejecuciones += 1
+        cuerpo = (await receive())["body"]
+        respuesta = orjson.dumps({"ejecucion": self.ejecuciones, "recibido": cuerpo.decode()})
+        await send({"type": "http.response.start", "status": self.status,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": respuesta})
+
+
+def post(middleware, cuerpo: bytes, clave=b"clave-1", ruta="/api/reservas"):
+    """Devuelve (status, cabeceras, cuerpo JSON) de un POST con Idempotency-Key"""
+    enviados = []
+
+    async def receive():
+        return {"type": "http.request", "body": cuerpo, "more_body": False}
+
+    async def send(mensaje):
+        enviados.append(mensaje)
+
+    scope = {"type": "http", "method": "POST", "path": ruta, "query_string": b"",
+             "headers": [(b"idempotency-key", clave)]}
+    asyncio.run(middleware(scope, receive, send))
+    return enviados[0]["status"], dict(enviados[0]["headers"]), orjson.loads(enviados[1]["body"])
+
+
+@pytest.fixture(autouse=True)
+def limpiar():
+    asyncio.run(idempotencia.idempotencia_collection.delete_many({}))
+    idempotencia.respuestas.vaciar()
+    yield
+    idempotencia.respuestas.vaciar()
+
+
+def test_reintento_recibe_la_misma_respuesta_sin_ejecutar():
+    app = App()
+    middleware = MiddlewareIdempotencia(app)
+    primera = post(middleware, b'{"a": 1}')
+    assert primera[0] == 201
+    assert b"idempotent-replayed" not in primera[1]
+
+    # Desde la caché en memoria y, tras vaciarla, desde MongoDB
+    for _ in range(2):
+        status, cabeceras, cuerpo = post(middleware, b'{"a": 1}')
+        assert (status, cuerpo) == (201, primera[2])
+        assert cabeceras[b"idempotent-replayed"] == b"true"
+        idempotencia.respuestas.vaciar()
+    assert app.ejecuciones == 1
+
+    # Otra clave es otra petición
+    assert post(middleware, b'{"a": 1}', clave=b"clave-2")[2]["ejecucion"] == 2
+
+
+def test_misma_clave_con_otro_cuerpo_da_422():
+    app = App()
+    middleware = MiddlewareIdempotencia(app)
+    post(middleware, b'{"a": 1}')
+    status, _, cuerpo = post(middleware, b'{"a": 2}')
+    assert status == 422
+    assert "otra petición" in cuerpo["detail"]
+    assert app.ejecuciones == 1
+
+
+def test_respuestas_5xx_no_se_guardan():
+    app = App(status=500)
+    middleware = MiddlewareIdempotencia(app)
+    assert post(middleware, b'{"a": 1}')[0] == 500
+    assert asyncio.run(idempotencia.idempotencia_collection.count_documents({})) == 0
+
+    # El reintento vuelve a ejecutarse y su respuesta correcta sí se guarda
+    app.status = 201
+    status, cabeceras, cuerpo = post(middleware, b'{"a": 1}')
+    assert (status, cuerpo["ejecucion"]) == (201, 2)
+    assert b"idempotent-replayed" not in cabeceras
+    assert post(middleware, b'{"a": 1}')[1][b"idempotent-replayed"] == b"true"
+    assert app.ejecuciones == 2
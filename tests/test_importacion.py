@@ -0,0 +1,98 @@
+import asyncio
+import io
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+
+from importacion import ImportacionEnCurso, importacion_exclusiva, importar_csv
+
+
+class Producto(BaseModel):
+    nombre: str
+    stock_actual: int
+    precio_venta: Optional[float] = None
+
+
+def construir(producto: Producto) -> dict:
+    if producto.stock_actual < 0:
+        raise ValueError("El stock no puede ser negativo")
+    return producto.model_dump()
+
+
+class RepoFalso:
+    """Guarda los documentos por clave como lo haría el upsert de fusionar_lote"""
+
+    def __init__(self, existentes=(), fallan=()):
+        self.documentos = {d["nombre"]: d for d in existentes}
+        self.fallan = set(fallan)
+        self.lotes = []
+
+    async def fusionar_lote(self, documentos, clave, solo_al_crear):
+        self.lotes.append(len(documentos))
+        creados, errores = [], {}
+        for indice, documento in enumerate(documentos):
+            if documento["nombre"] in self.fallan:
+                errores[indice] = {"errmsg": "fallo de escritura"}
+                continue
+            if documento["nombre"] not in self.documentos:
+                creados.append(indice)
+            self.documentos[documento["nombre"]] = documento
+        return creados, errores
+
+
+def importar(texto: str, repo, tamano=1000):
+    archivo = io.BytesIO(texto.encode("utf-8"))
+    return asyncio.run(importar_csv(archivo, repo, Producto, construir, ("nombre",), tamano=tamano))
+
+
+def test_crea_actualiza_e_informa_por_fila():
+    repo = RepoFalso(existentes=[{"nombre": "champú", "stock_actual": 1}], fallan={"laca"})
+    informe = importar(
+        "nombre,stock_actual,precio_venta\n"
+        " champú ,4,\n"          # 2: actualiza el existente (espacios fuera, celda vacía a None)
+        "tinte,x,\n"             # 3: no valida
+        "cera,-1,\n"             # 4: construir la rechaza
+        "gomina,2,3.5\n"         # 5: sustituida por la 6
+        "gomina,3,3.5\n"         # 6
+        "laca,1,\n",             # 7: falla al escribir
+        repo
+    )
+    assert {k: informe[k] for k in ("filas", "creados", "actualizados")} == {"filas": 6, "creados": 1, "actualizados": 1}
+    assert [(e["fila"], e["detalle"]) for e in informe["errores"] if e["fila"] != 3] == [
+        (4, "El stock no puede ser negativo"),
+        (5, "sustituida por la fila 6 con la misma clave"),
+        (7, "fallo de escritura"),
+    ]
+    assert informe["errores"][0]["fila"] == 3
+    assert informe["errores"][0]["detalle"][0]["loc"] == ("stock_actual",)
+    assert repo.documentos["champú"] == {"nombre": "champú", "stock_actual": 4, "precio_venta": None}
+    assert repo.documentos["gomina"]["stock_actual"] == 3
+
+
+def test_lotes_y_numeros_de_fila():
+    repo = RepoFalso()
+    filas = "".join(f"p{i},{i}\n" for i in range(5)) + "p1,9\n"
+    informe = importar("nombre,stock_actual\n" + filas, repo, tamano=2)
+    assert repo.lotes == [2, 2, 2]
+    # Entre lotes la misma clave se actualiza en lugar de sustituirse
+    assert informe["creados"] == 5 and informe["actualizados"] == 1 and informe["errores"] == []
+
+
+def test_csv_no_valido():
+    with pytest.raises(ValueError, match="CSV no válido cerca de la fila 2"):
+        asyncio.run(importar_csv(io.BytesIO(b"nombre\n\xff\xfe\n"), RepoFalso(), Producto, construir, ("nombre",)))
+
+
+def test_una_importacion_por_coleccion():
+    async def escenario():
+        async with importacion_exclusiva("inventario"):
+            with pytest.raises(ImportacionEnCurso):
+                async with importacion_exclusiva("inventario"):
+                    pass
+            async with importacion_exclusiva("proveedores"):
+                pass
+        async with importacion_exclusiva("inventario"):
+            pass
+
+    asyncio.run(escenario())
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+import invalidaciones
+
+
+class CanalFalso:
+    name = "invalidaciones"
+
+    def __init__(self, error):
+        self.error = error
+        self.database = self
+
+    async def create_collection(self, nombre, **opciones):
+        raise self.error
+
+
+@pytest.mark.parametrize("error", [CollectionInvalid("ya existe"), OperationFailure("ya existe", code=48)])
+def test_activar_canal_ya_creado_por_otro_worker(monkeypatch, error):
+    monkeypatch.setattr(invalidaciones, "canal", None)
+
+    async def escuchar():
+        pass
+
+    monkeypatch.setattr(invalidaciones, "escuchar", escuchar)
+    coleccion = CanalFalso(error)
+
+    async def escenario():
+        await (await invalidaciones.activar_canal(coleccion))
+
+    asyncio.run(escenario())
+    assert invalidaciones.canal is coleccion
+
+
+def test_activar_canal_propaga_otros_errores(monkeypatch):
+    monkeypatch.setattr(invalidaciones, "canal", None)
+    with pytest.raises(OperationFailure):
+        asyncio.run(invalidaciones.activar_canal(CanalFalso(OperationFailure("sin permiso", code=13))))
@@ -0,0 +1,73 @@
+import base64
+import json
+
+import pytest
+
+from paginacion import codificar_cursor, decodificar_cursor, filtro_keyset
+
+ORDEN = [("fecha", -1), ("hora", 1), ("id", 1)]
+
+
+def cumple(documento: dict, filtro: dict) -> bool:
+    """Evalúa en Python los filtros que genera filtro_keyset"""
+    def condicion(campo, valor):
+        if isinstance(valor, dict):
+            operador, referencia = next(iter(valor.items()))
+            return documento[campo] > referencia if operador == "$gt" else documento[campo] < referencia
+        return documento[campo] == valor
+
+    return any(all(condicion(c, v) for c, v in alternativa.items()) for alternativa in filtro["$or"])
+
+
+def ordenados(documentos: list) -> list:
+    for campo, sentido in reversed(ORDEN):
+        documentos = sorted(documentos, key=lambda d: d[campo], reverse=sentido == -1)
+    return documentos
+
+
+def test_filtro_keyset():
+    assert filtro_keyset(ORDEN, ["2025-06-02", "10:00", "b"]) == {"$or": [
+        {"fecha": {"$lt": "2025-06-02"}},
+        {"fecha": "2025-06-02", "hora": {"$gt": "10:00"}},
+        {"fecha": "2025-06-02", "hora": "10:00", "id": {"$gt": "b"}},
+    ]}
+
+
+def test_cursor_ida_y_vuelta():
+    documento = {"fecha": "2025-06-02", "hora": "10:00", "id": "ñ-1", "otro": 1}
+    assert decodificar_cursor(codificar_cursor(documento, ORDEN), ORDEN) == ["2025-06-02", "10:00", "ñ-1"]
+    with pytest.raises(ValueError):
+        decodificar_cursor(codificar_cursor(documento, ORDEN[:2]), ORDEN)
+
+
+@pytest.mark.parametrize("valores", [
+    [{"$ne": None}, "10:00", "a"],
+    ["2025-06-02", ["10:00"], "a"],
+    "no es una lista",
+])
+def test_cursor_con_valores_no_escalares(valores):
+    token = base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+    with pytest.raises(ValueError):
+        decodificar_cursor(token, ORDEN)
+
+
+def test_recorrer_por_paginas_con_empates():
+    documentos = [
+        {"fecha": f"2025-06-0{d}", "hora": h, "id": f"{d}{h}{i}"}
+        for d in (1, 2, 3) for h in ("10:00", "10:30") for i in "ab"
+    ]
+    esperado = ordenados(documentos)
+
+    vistos = []
+    cursor = None
+    while True:
+        restantes = esperado
+        if cursor is not None:
+            restantes = [d for d in esperado if cumple(d, filtro_keyset(ORDEN, decodificar_cursor(cursor, ORDEN)))]
+        pagina = restantes[:5]
+        vistos.extend(pagina)
+        if len(restantes) <= 5:
+            break
+        cursor = codificar_cursor(pagina[-1], ORDEN)
+
+    assert vistos == esperado
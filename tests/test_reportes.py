@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from configuracion import HORARIOS, SERVICIOS
+from disponibilidad import Agenda, a_minutos
+from reportes import expandir_slots, inicio_semana, marco_grupos, pipeline_ocupacion, semana_epoca
+
+agenda = Agenda(HORARIOS, SERVICIOS)
+
+
+def grupo(peluquero, servicio, hora, dia=0, estado="confirmada", reservas=1, semana=None):
+    clave = {
+        "peluquero": peluquero, "servicio": servicio, "estado": estado,
+        "dia": dia, "minuto": a_minutos(hora)
+    }
+    if semana is not None:
+        clave["semana"] = semana
+    return {"_id": clave, "reservas": reservas}
+
+
+def filas(df):
+    return sorted(zip(*(columna.tolist() for columna in expandir_slots(df, agenda))))
+
+
+def test_expande_cada_grupo_en_sus_slots():
+    df = marco_grupos([
+        grupo("Andrés", "Tinte", "10:00", reservas=2),
+        grupo("Adrián", "Corte de cabello", "12:30", dia=5, semana=7),
+    ])
+    assert filas(df) == [
+        (0, 0, 0, -1, 2), (0, 0, 1, -1, 2), (0, 0, 2, -1, 2),
+        (2, 5, 5, 7, 1),
+    ]
+
+
+def test_recorta_al_cierre_y_descarta_lo_que_no_cuenta():
+    df = marco_grupos([
+        # Mechas (4 slots) a las 17:30 de un lunes: solo caben 17:30, 18:00 y 18:30
+        grupo("Alejandro", "Mechas", "17:30"),
+        grupo("Alejandro", "Tinte", "10:00", estado="cancelada"),
+        grupo("Alejandro", "Corte de cabello", "10:00", dia=6),  # domingo, cerrado
+        grupo("Alejandro", "Corte de cabello", "09:00"),         # antes de abrir
+        grupo("Alejandro", "Servicio retirado", "11:00"),        # cuenta como un slot
+    ])
+    assert filas(df) == [(1, 0, 2, -1, 1), (1, 0, 15, -1, 1), (1, 0, 16, -1, 1), (1, 0, 17, -1, 1)]
+
+
+def test_sin_grupos():
+    assert filas(marco_grupos([])) == []
+
+
+def test_la_prevision_no_depende_de_desde():
+    hasta = datetime(2025, 6, 4)
+    inicio_prevision = inicio_semana(semana_epoca(hasta.date()) - 8)
+    # `desde` dentro de la ventana de 8 semanas de la previsión
+    corto = pipeline_ocupacion(datetime(2025, 5, 20), hasta, 8)
+    largo = pipeline_ocupacion(datetime(2024, 1, 1), hasta, 8)
+
+    assert corto[0] == {"$match": {"momento": {"$gte": inicio_prevision, "$lt": hasta}}}
+    assert corto[2]["$facet"]["recientes"] == largo[2]["$facet"]["recientes"]
+    assert corto[2]["$facet"]["historico"][0] == {"$match": {"momento": {"$gte": datetime(2025, 5, 20)}}}
+    assert largo[0] == {"$match": {"momento": {"$gte": datetime(2024, 1, 1), "$lt": hasta}}}
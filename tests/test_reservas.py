@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from database import db
+from indices import INDICES, asegurar_indices
+
+LUNES = "2030-01-07"
+
+
+def reserva(hora, servicio="Corte de cabello", peluquero="Andrés"):
+    return {
+        "cliente_nombre": "Ana", "cliente_telefono": "600000000",
+        "servicio": servicio, "peluquero": peluquero, "fecha": LUNES, "hora": hora
+    }
+
+
+def libres(cliente):
+    return cliente.get(f"/api/horarios-disponibles/{LUNES}/Andrés").json()["horarios"]
+
+
+INDICE_FRANJAS = next(i.document for i in INDICES["reservas"] if i.document["name"] == "reserva_franja_unica")
+
+
+async def quitar_indice_franjas():
+    if INDICE_FRANJAS["name"] in await db.reservas.index_information():
+        await db.reservas.drop_index(INDICE_FRANJAS["name"])
+
+
+async def indice_franjas():
+    """mongomock no guarda partialFilterExpression desde create_indexes: se crea con create_index"""
+    await quitar_indice_franjas()
+    await db.reservas.create_index(
+        list(INDICE_FRANJAS["key"].items()), name=INDICE_FRANJAS["name"], unique=True,
+        partialFilterExpression=INDICE_FRANJAS["partialFilterExpression"]
+    )
+
+
+@pytest.fixture
+def cliente():
+    asyncio.run(db.reservas.delete_many({}))
+    # Lo crea el arranque de la API; mongomock lo daría por distinto del de la prueba anterior
+    asyncio.run(quitar_indice_franjas())
+    # Las pruebas crean más reservas de las que permite la ráfaga de un cliente
+    server.admision.cubos.clear()
+    with TestClient(server.app) as cliente:
+        cliente.portal.call(indice_franjas)
+        yield cliente
+
+
+def test_franja_ocupada_da_409(cliente):
+    assert cliente.post("/api/reservas", json=reserva("10:00", "Mechas")).status_code == 200
+    respuesta = cliente.post("/api/reservas", json=reserva("10:00", "Mechas"))
+    assert respuesta.status_code == 409
+    assert respuesta.json() == {"detail": "Horario no disponible"}
+    # El mismo horario con otro peluquero sí está libre
+    assert cliente.post("/api/reservas", json=reserva("10:00", "Mechas", "Adrián")).status_code == 200
+
+
+def test_cancelar_libera_las_franjas(cliente):
+    creada = cliente.post("/api/reservas", json=reserva("15:00", "Tinte")).json()["reserva"]
+    assert cliente.post("/api/reservas", json=reserva("15:00", "Tinte")).status_code == 409
+    assert "15:30" not in libres(cliente)
+
+    assert cliente.delete(f"/api/reservas/{creada['id']}").status_code == 200
+    assert {"15:00", "15:30", "16:00"} <= set(libres(cliente))
+    assert cliente.post("/api/reservas", json=reserva("15:00", "Tinte")).status_code == 200
+
+
+def test_reservas_antiguas_solapadas_quedan_fuera_del_indice():
+    async def escenario():
+        await db.reservas.delete_many({})
+        await quitar_indice_franjas()
+        antiguas = [
+            {"id": "a", "fecha": LUNES, "hora": "10:00", "servicio": "Mechas", "fecha_creacion": "2024-01-01T10:00"},
+            {"id": "b", "fecha": LUNES, "hora": "10:30", "servicio": "Corte de cabello",
+             "fecha_creacion": "2024-01-01T11:00"},
+            {"id": "c", "fecha": LUNES, "hora": "10:30", "servicio": "Corte de cabello",
+             "fecha_creacion": "2024-01-01T12:00", "estado": "cancelada"},
+        ]
+        await db.reservas.insert_many([{**r, "peluquero": "Andrés", "estado": "confirmada", **r} for r in antiguas])
+
+        solapadas = await server.completar_franjas_reservas()
+        assert [r["id"] for r in solapadas] == ["b"]
+        franjas = {r["id"]: r.get("franjas") for r in await db.reservas.find({}).to_list(length=None)}
+        assert franjas == {"a": ["10:00", "10:30", "11:00", "11:30"], "b": None, "c": ["10:30"]}
+        await asegurar_indices()
+        await indice_franjas()
+
+    asyncio.run(escenario())
@@ -0,0 +1,87 @@
+import asyncio
+
+import sincronizacion
+
+
+class RepoFalso:
+    def __init__(self, versiones):
+        self.documentos = [{"id": f"d{v}", "version": v} for v in versiones]
+
+    async def listar(self, filtro, orden=None, limite=None):
+        rango = filtro["version"]
+        documentos = sorted(
+            (d for d in self.documentos if rango["$gt"] < d["version"] <= rango["$lte"]),
+            key=lambda d: d["version"]
+        )
+        return documentos[:limite]
+
+
+class EliminadosFalsos:
+    def __init__(self, lapidas):
+        self.lapidas = lapidas
+
+    def find(self, filtro, proyeccion):
+        self.filtro = filtro
+        return self
+
+    def sort(self, orden):
+        return self
+
+    def limit(self, limite):
+        self.limite = limite
+        return self
+
+    async def to_list(self, length=None):
+        rango = self.filtro["version"]
+        lapidas = [l for l in self.lapidas if rango["$gt"] < l["version"] <= rango["$lte"]]
+        return sorted(lapidas, key=lambda l: l["version"])[:self.limite]
+
+
+def preparar(monkeypatch, confirmada, lapidas=()):
+    async def versiones_confirmadas():
+        return confirmada
+
+    monkeypatch.setattr(sincronizacion, "versiones_confirmadas", versiones_confirmadas)
+    monkeypatch.setattr(sincronizacion, "eliminados_collection", EliminadosFalsos(list(lapidas)))
+
+
+def test_corta_en_la_version_mas_baja_y_continua(monkeypatch):
+    preparar(monkeypatch, 9, [{"coleccion": "gastos", "id": "g", "version": 8}])
+    repos = {"reservas": RepoFalso([1, 2, 3, 4, 5]), "gastos": RepoFalso([6, 7, 9])}
+
+    primera = asyncio.run(sincronizacion.cambios_desde(repos, 0, limite=2))
+    assert primera["token"] == "2"
+    assert not primera["completo"]
+    assert [d["version"] for d in primera["cambios"]["reservas"]] == [1, 2]
+    assert primera["cambios"]["gastos"] == []
+
+    vistos = {"reservas": [1, 2], "gastos": []}
+    eliminados = []
+    token = primera["token"]
+    while True:
+        respuesta = asyncio.run(sincronizacion.cambios_desde(repos, int(token), limite=2))
+        for coleccion, documentos in respuesta["cambios"].items():
+            vistos[coleccion].extend(d["version"] for d in documentos)
+        eliminados.extend(respuesta["eliminados"]["gastos"])
+        token = respuesta["token"]
+        if respuesta["completo"]:
+            break
+
+    assert vistos == {"reservas": [1, 2, 3, 4, 5], "gastos": [6, 7, 9]}
+    assert eliminados == ["g"]
+    assert token == "9"
+
+
+def test_no_entrega_versiones_sin_confirmar(monkeypatch):
+    preparar(monkeypatch, 3)
+    repos = {"reservas": RepoFalso([1, 2, 3, 5])}
+
+    respuesta = asyncio.run(sincronizacion.cambios_desde(repos, 0))
+    assert respuesta["token"] == "3"
+    assert respuesta["completo"]
+    assert [d["version"] for d in respuesta["cambios"]["reservas"]] == [1, 2, 3]
+
+    # Nada confirmado por encima del token: el token no avanza
+    respuesta = asyncio.run(sincronizacion.cambios_desde(repos, 3))
+    assert respuesta["token"] == "3"
+    assert respuesta["cambios"] == {"reservas": []}
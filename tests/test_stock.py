@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+import stock
+from stock import delta_movimiento, evento_umbral, filas_registro, operacion_stock
+
+
+def producto(stock_actual, stock_minimo=5):
+    return {"id": "p1", "nombre": "Champú", "stock_actual": stock_actual, "stock_minimo": stock_minimo}
+
+
+def test_evento_umbral_al_cruzar_el_minimo():
+    assert evento_umbral(producto(5), margen_anterior=2)["tipo"] == "bajo_stock"
+    assert evento_umbral(producto(6), margen_anterior=0)["tipo"] == "repuesto"
+    evento = evento_umbral(producto(4), margen_anterior=3)
+    assert evento == {
+        "tipo": "bajo_stock",
+        "canal": ["stock"],
+        "producto_id": "p1",
+        "nombre": "Champú",
+        "stock_actual": 4,
+        "stock_minimo": 5
+    }
+
+
+def test_evento_umbral_sin_cruce():
+    assert evento_umbral(producto(8), margen_anterior=1) is None
+    assert evento_umbral(producto(3), margen_anterior=-1) is None
+
+
+def test_evento_umbral_producto_nuevo():
+    assert evento_umbral(producto(2))["tipo"] == "bajo_stock"
+    assert evento_umbral(producto(9)) is None
+
+
+def test_delta_movimiento():
+    assert delta_movimiento("venta", 3) == -3
+    assert delta_movimiento("compra", 3) == 3
+    assert delta_movimiento("ajuste", -2) == -2
+    for tipo, cantidad in (("venta", 0), ("compra", -1), ("ajuste", 0), ("regalo", 1)):
+        with pytest.raises(ValueError):
+            delta_movimiento(tipo, cantidad)
+
+
+def test_filas_registro_con_el_stock_de_cada_movimiento():
+    movimientos = [{"id": "a", "delta": -4}, {"id": "b", "delta": 10}, {"id": "c", "delta": -1}]
+    filas = filas_registro(producto(15), movimientos)
+    assert [f["stock_resultante"] for f in filas] == [6, 16, 15]
+
+
+def test_operacion_stock_exige_stock_en_cada_movimiento():
+    venta = {"tipo": "venta", "delta": -5, "fecha": "2025-06-02"}
+    compra = {"tipo": "compra", "delta": 10, "fecha": "2025-06-01"}
+    # Con stock 0, vender 5 antes de comprar 10 dejaría el stock en -5 por el camino
+    condicion, actualizacion = operacion_stock([venta, compra])
+    assert condicion == {"stock_actual": {"$gte": 5}}
+    assert actualizacion == {
+        "$inc": {"stock_actual": 5, "margen_stock": 5},
+        "$max": {"fecha_ultima_compra": "2025-06-01"}
+    }
+    assert operacion_stock([compra, venta])[0] == {}
+    assert operacion_stock([venta, venta, compra])[0] == {"stock_actual": {"$gte": 10}}
+
+
+def test_aplicar_lote_con_un_producto_que_falla(monkeypatch):
+    async def aplicar_producto(producto_id, movimientos):
+        if producto_id == "roto":
+            raise RuntimeError("sin conexión")
+        return None if producto_id == "agotado" else producto(20)
+
+    registrados = []
+
+    async def registrar(filas):
+        registrados.extend(filas)
+
+    async def avisar_umbral(producto, margen_anterior=None):
+        pass
+
+    async def existentes(filtro, proyeccion=None):
+        return [{"id": "agotado"}]
+
+    monkeypatch.setattr(stock, "aplicar_producto", aplicar_producto)
+    monkeypatch.setattr(stock, "registrar", registrar)
+    monkeypatch.setattr(stock, "avisar_umbral", avisar_umbral)
+    monkeypatch.setattr(stock.inventario_repo, "listar", existentes)
+
+    movimientos = [
+        {"id": "1", "producto_id": "p1", "delta": -2},
+        {"id": "2", "producto_id": "roto", "delta": -1},
+        {"id": "3", "producto_id": "agotado", "delta": -9},
+    ]
+    resultado = asyncio.run(stock.aplicar_lote(movimientos))
+    assert list(resultado["productos"]) == ["p1"]
+    assert [f["id"] for f in registrados] == ["1"]
+    assert resultado["rechazados"] == {"agotado": "Stock insuficiente"}
+    assert str(resultado["fallidos"]["roto"]) == "sin conexión"
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(stock.aplicar_movimiento(movimientos[1]))